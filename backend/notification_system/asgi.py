@@ -8,23 +8,34 @@ using Django Channels.
 The application is configured to:
 1. Handle HTTP requests through Django's standard ASGI application
 2. Route WebSocket connections through the notification system's consumers
-3. Apply authentication middleware to all connections
+3. Serve the Server-Sent Events stream ahead of Django, which would hold a
+   worker thread for as long as each stream is open
+4. Authenticate WebSocket and stream connections by ``?access_token=``,
+   ``?token=`` or session
 """
 
 import os
 from django.core.asgi import get_asgi_application
+from django.urls import re_path
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from notifications.routing import websocket_urlpatterns
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'notification_system.settings')
 
+# Initialise Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from notifications.middleware import TokenAuthMiddlewareStack  # noqa: E402
+from notifications.routing import http_urlpatterns, websocket_urlpatterns  # noqa: E402
+
 application = ProtocolTypeRouter({
-    # Handle regular HTTP requests
-    "http": get_asgi_application(),
+    # Handle the notification stream, then regular HTTP requests
+    "http": URLRouter([
+        *http_urlpatterns,
+        re_path(r'', django_asgi_app),
+    ]),
     
     # Handle WebSocket connections
-    "websocket": AuthMiddlewareStack(
+    "websocket": TokenAuthMiddlewareStack(
         URLRouter(
             # Use the WebSocket URL patterns from the notifications app
             websocket_urlpatterns
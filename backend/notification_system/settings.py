@@ -154,15 +154,102 @@ CACHES = {
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'notifications.authentication.SignedTokenAuthentication',
+        'notifications.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'notifications.renderers.CodecJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'notifications.renderers.CodecJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Number of notifications per inbox page (REST list and WebSocket fetch)
+NOTIFICATIONS_PAGE_SIZE = config('NOTIFICATIONS_PAGE_SIZE', default=20, cast=int)
+
+# Read-through inbox cache: how many leading pages per user are cached and for how long
+NOTIFICATIONS_INBOX_CACHE_PAGES = config('NOTIFICATIONS_INBOX_CACHE_PAGES', default=3, cast=int)
+NOTIFICATIONS_INBOX_CACHE_TIMEOUT = config('NOTIFICATIONS_INBOX_CACHE_TIMEOUT', default=300, cast=int)
+
+# Maximum number of outbox events the dispatcher claims per transaction
+NOTIFICATIONS_OUTBOX_BATCH_SIZE = config('NOTIFICATIONS_OUTBOX_BATCH_SIZE', default=100, cast=int)
+
+# Opt-in monthly range partitioning of the notifications table (PostgreSQL only).
+# Applied by migration 0006 or later via `manage.py manage_partitions --convert`.
+NOTIFICATIONS_PARTITIONING = config('NOTIFICATIONS_PARTITIONING', default=False, cast=bool)
+NOTIFICATIONS_PARTITION_PREMAKE_MONTHS = config('NOTIFICATIONS_PARTITION_PREMAKE_MONTHS', default=3, cast=int)
+# Months of notifications kept attached by manage_partitions (0 keeps everything)
+NOTIFICATIONS_RETENTION_MONTHS = config('NOTIFICATIONS_RETENTION_MONTHS', default=0, cast=int)
+
+# Inbox change log: entries returned per sync request and days kept before compaction
+NOTIFICATIONS_CHANGES_PAGE_SIZE = config('NOTIFICATIONS_CHANGES_PAGE_SIZE', default=500, cast=int)
+NOTIFICATIONS_CHANGELOG_RETENTION_DAYS = config('NOTIFICATIONS_CHANGELOG_RETENTION_DAYS', default=7, cast=int)
+
+# WebSocket burst coalescing: how long non-HIGH notifications are buffered (0 disables)
+# and how many may be buffered before they are flushed early
+NOTIFICATIONS_COALESCE_WINDOW_MS = config('NOTIFICATIONS_COALESCE_WINDOW_MS', default=25, cast=int)
+NOTIFICATIONS_COALESCE_MAX_EVENTS = config('NOTIFICATIONS_COALESCE_MAX_EVENTS', default=50, cast=int)
+
+# Reconnect replay: events kept per user, and where. Without a Redis URL each
+# process keeps its own buffers, which suits the InMemory channel layer only.
+NOTIFICATIONS_REPLAY_BUFFER_SIZE = config('NOTIFICATIONS_REPLAY_BUFFER_SIZE', default=100, cast=int)
+NOTIFICATIONS_REPLAY_REDIS_URL = config('NOTIFICATIONS_REPLAY_REDIS_URL', default='')
+NOTIFICATIONS_REPLAY_TTL = config('NOTIFICATIONS_REPLAY_TTL', default=86400, cast=int)
+
+# Per-connection outbound WebSocket queue: maximum queued frames and what happens when
+# it is full (drop_oldest, coalesce or close; see notifications/backpressure.py)
+NOTIFICATIONS_OUTBOUND_QUEUE_SIZE = config('NOTIFICATIONS_OUTBOUND_QUEUE_SIZE', default=200, cast=int)
+NOTIFICATIONS_OUTBOUND_POLICY = config('NOTIFICATIONS_OUTBOUND_POLICY', default='drop_oldest')
+
+# Presence registry: how long a connection counts as online without a heartbeat, how
+# long after disconnecting, and where (without a Redis URL, per process like replay,
+# which only the InMemory channel layer allows)
+NOTIFICATIONS_PRESENCE_TTL = config('NOTIFICATIONS_PRESENCE_TTL', default=60, cast=int)
+NOTIFICATIONS_PRESENCE_GRACE = config('NOTIFICATIONS_PRESENCE_GRACE', default=30, cast=int)
+NOTIFICATIONS_PRESENCE_REDIS_URL = config('NOTIFICATIONS_PRESENCE_REDIS_URL', default='')
+
+# Dotted path to a callable sending one queued push delivery (see notifications/external.py);
+# while unset, push is neither queued nor enabled for new preferences
+NOTIFICATIONS_PUSH_SENDER = config('NOTIFICATIONS_PUSH_SENDER', default='')
+
+# Token authentication cache (REST and WebSocket): entries and seconds kept in each
+# process, seconds kept in the shared cache, and seconds unknown keys are remembered
+NOTIFICATIONS_AUTH_CACHE_SIZE = config('NOTIFICATIONS_AUTH_CACHE_SIZE', default=10000, cast=int)
+NOTIFICATIONS_AUTH_CACHE_LOCAL_TTL = config('NOTIFICATIONS_AUTH_CACHE_LOCAL_TTL', default=5, cast=int)
+NOTIFICATIONS_AUTH_CACHE_TIMEOUT = config('NOTIFICATIONS_AUTH_CACHE_TIMEOUT', default=300, cast=int)
+NOTIFICATIONS_AUTH_CACHE_NEGATIVE_TIMEOUT = config('NOTIFICATIONS_AUTH_CACHE_NEGATIVE_TIMEOUT', default=5, cast=int)
+
+# Signed access/refresh token lifetimes, and how often each process reloads the
+# revocation denylist (seconds; see notifications/tokens.py)
+NOTIFICATIONS_ACCESS_TOKEN_TTL = config('NOTIFICATIONS_ACCESS_TOKEN_TTL', default=300, cast=int)
+NOTIFICATIONS_REFRESH_TOKEN_TTL = config('NOTIFICATIONS_REFRESH_TOKEN_TTL', default=604800, cast=int)
+NOTIFICATIONS_DENYLIST_REFRESH = config('NOTIFICATIONS_DENYLIST_REFRESH', default=5, cast=int)
+
+# JSON codec for API responses, WebSocket frames and cached payloads: auto, orjson,
+# msgspec or json (see notifications/codec.py)
+NOTIFICATIONS_JSON_CODEC = config('NOTIFICATIONS_JSON_CODEC', default='auto')
+
+# Server-Sent Events stream: buffered messages are written every flush
+# interval (0 writes each at once) and a keepalive comment every heartbeat
+NOTIFICATIONS_SSE_FLUSH_MS = config('NOTIFICATIONS_SSE_FLUSH_MS', default=25, cast=int)
+NOTIFICATIONS_SSE_HEARTBEAT = config('NOTIFICATIONS_SSE_HEARTBEAT', default=15, cast=int)
+
+# Rows read and encoded at a time by the streaming history export
+NOTIFICATIONS_EXPORT_CHUNK_SIZE = config('NOTIFICATIONS_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Notifications rolled up per transaction by rollup_notifications, and how
+# old (in seconds) a notification must be before it is rolled up
+NOTIFICATIONS_ROLLUP_BATCH_SIZE = config('NOTIFICATIONS_ROLLUP_BATCH_SIZE', default=10000, cast=int)
+NOTIFICATIONS_ROLLUP_LAG = config('NOTIFICATIONS_ROLLUP_LAG', default=60, cast=int)
+
 # Static files configuration
 STATIC_URL = config('STATIC_URL', default='static/')
 
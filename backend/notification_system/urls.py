@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.authtoken import views as token_views
 from django.contrib.auth import views as auth_views
+from notifications import views as notification_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,4 +28,8 @@ urlpatterns = [
     path('api/auth/login/', auth_views.LoginView.as_view(), name='login'),
     path('api/auth/logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('api/auth/token/', token_views.obtain_auth_token, name='token'),  # For token authentication
+    # Signed access/refresh tokens, verified without the database
+    path('api/auth/token/pair/', notification_views.obtain_token_pair, name='token-pair'),
+    path('api/auth/token/refresh/', notification_views.refresh_token_pair, name='token-refresh'),
+    path('api/auth/token/revoke/', notification_views.revoke_token, name='token-revoke'),
 ]
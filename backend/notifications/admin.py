@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db.models import Q
 from .models import NotificationType, Notifications, UserPreferences
+from . import search
 
 @admin.register(NotificationType)
 class NotificationTypeAdmin(admin.ModelAdmin):
@@ -27,7 +30,7 @@ class NotificationsAdmin(admin.ModelAdmin):
     
     Features:
         - List display shows key notification information
-        - Search capability across multiple fields
+        - Full-text search of title and message, plus recipient username
         - Filtering by type, read status, priority, and dates
         - Read-only fields for created timestamp
     """
@@ -50,6 +53,26 @@ class NotificationsAdmin(admin.ModelAdmin):
         """
         return super().get_queryset(request).select_related('recipient')
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Searches title and message through the ``search_vector`` GIN index
+        (see ``notifications.search``) instead of ``ILIKE`` scans, and
+        matches the recipient's username exactly.
+
+        ``search_fields`` is kept so the admin shows its search box.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        # Resolving the recipient first leaves two conditions on the
+        # notifications table, which the planner ORs from the GIN and the
+        # recipient index; a subquery would force a sequential scan
+        recipients = list(User.objects.filter(username=search_term).values_list('pk', flat=True))
+        queryset = queryset.filter(
+            Q(search.matches(search_term)) | Q(recipient_id__in=recipients)
+        )
+        return queryset, False
+
 @admin.register(UserPreferences)
 class UserPreferencesAdmin(admin.ModelAdmin):
     """
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notifications'
+
+    def ready(self):
+        # Connects the receivers that do the bookkeeping and delivery of
+        # notification writes and those that invalidate cached tokens
+        from . import authentication, lifecycle  # noqa: F401
+        from . import search
+
+        # The search column is not a model field; see notifications.search
+        post_migrate.connect(search.ensure_search_vector, sender=self)
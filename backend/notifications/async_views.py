@@ -0,0 +1,127 @@
+"""
+Async request handling for DRF viewsets served under ASGI.
+
+DRF dispatches every request synchronously, so under
+``notification_system/asgi.py`` Django runs each API request in a worker
+thread from authentication to rendering. ``AsyncViewSetMixin`` turns a
+viewset's ``dispatch`` into a coroutine: handlers written as ``async def``
+run on the event loop and use Django's async ORM and cache API, while the
+other handlers run, together with authentication, in a thread through
+``sync_to_async`` exactly as before.
+
+Requests carrying a signed ``Bearer`` token are authenticated on the event
+loop as well, since verifying one needs no query once the denylist is
+loaded (see ``notifications.tokens``); database tokens and sessions may
+query and are authenticated in a thread. JSON responses are rendered on
+the event loop too, as Django would otherwise render them in a thread.
+
+``notifications/utils/benchmark_async_views.py`` measures the difference.
+"""
+
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.decorators import classonlymethod
+from rest_framework.authentication import get_authorization_header
+from rest_framework.renderers import JSONRenderer
+
+from . import tokens
+from .authentication import SignedTokenAuthentication
+
+# Reload the denylist this long before it goes stale, so the check made
+# while verifying a token on the event loop never has to query
+DENYLIST_MARGIN = 1
+
+
+class AsyncViewSetMixin:
+    """
+    Lets a DRF viewset mix ``async def`` and plain handlers.
+
+    Must come before the viewset class in the bases.
+    """
+
+    @classonlymethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        # Keeps cls, actions, initkwargs and csrf_exempt for the router
+        return functools.update_wrapper(async_view, view)
+
+    def get_handler(self, request):
+        method = request.method.lower()
+        if method not in self.http_method_names:
+            return self.http_method_not_allowed
+        return getattr(self, method, self.http_method_not_allowed)
+
+    def authenticates_offline(self, request):
+        """
+        Returns True if authenticating ``request`` cannot query the database.
+        """
+        if not request.authenticators or not isinstance(
+                request.authenticators[0], SignedTokenAuthentication):
+            return False
+        auth = get_authorization_header(request).split()
+        return bool(auth) and auth[0].lower() == SignedTokenAuthentication.keyword.lower().encode()
+
+    async def initial_async(self, request, *args, **kwargs):
+        """
+        Runs ``initial`` (authentication, permissions, throttling) for an
+        async handler, on the event loop when it cannot query.
+        """
+        if self.authenticates_offline(request):
+            if tokens.denylist.stale(margin=DENYLIST_MARGIN):
+                await sync_to_async(tokens.denylist.load)()
+            self.initial(request, *args, **kwargs)
+        else:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+    def handle_sync(self, handler, request, *args, **kwargs):
+        self.initial(request, *args, **kwargs)
+        return handler(request, *args, **kwargs)
+
+    async def dispatch(self, request, *args, **kwargs):
+        """
+        Async counterpart of ``APIView.dispatch``.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            handler = self.get_handler(request)
+            if asyncio.iscoroutinefunction(handler):
+                await self.initial_async(request, *args, **kwargs)
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(self.handle_sync)(
+                    handler, request, *args, **kwargs
+                )
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.rendered(self.response)
+
+    def rendered(self, response):
+        """
+        Renders a JSON response now and returns it as a plain ``HttpResponse``.
+
+        Django renders responses that still have a ``render`` method in a
+        thread. ``data`` is kept, as on DRF's ``Response``, for tests.
+        Other renderers (the browsable API) may query and are left to Django.
+        """
+        if not isinstance(getattr(response, 'accepted_renderer', None), JSONRenderer):
+            return response
+        response.render()
+        plain = HttpResponse(
+            response.content, status=response.status_code, headers=dict(response.items())
+        )
+        plain.data = response.data
+        return plain
@@ -0,0 +1,240 @@
+"""
+Cached token authentication shared by the REST API and WebSockets.
+
+Resolving a token normally costs a ``Token`` + ``User`` query per request
+and per WebSocket connect, which turns a reconnect storm into a database
+storm. ``lookup`` puts two cache layers in front of that query:
+
+1. An in-process LRU of ``NOTIFICATIONS_AUTH_CACHE_SIZE`` entries kept for
+   ``NOTIFICATIONS_AUTH_CACHE_LOCAL_TTL`` seconds, which needs no network
+   round trip at all.
+2. The shared Django cache (Redis), kept for
+   ``NOTIFICATIONS_AUTH_CACHE_TIMEOUT`` seconds.
+
+Only what authorization needs is cached: the user's ID, username and
+``is_active``/``is_staff`` flags, never the ``User`` row with its password
+hash. Each lookup builds a fresh ``User`` from them, like
+``tokens.claims_user`` does for signed tokens; code needing anything else
+of the user (its email, say) reads the row. Unknown keys are remembered
+for ``NOTIFICATIONS_AUTH_CACHE_NEGATIVE_TIMEOUT`` seconds so guessing or
+replaying stale keys does not reach the database either.
+
+Entries are dropped when a token is saved or deleted or its user is saved
+(which covers deactivation). The shared layer is cleared for every process;
+other processes' local layers expire on their own, so keep the local TTL
+short.
+
+``CachedTokenAuthentication`` is the DRF authentication class and
+``notifications.middleware.TokenAuthMiddleware`` uses ``lookup`` for
+WebSocket connects.
+
+``SignedTokenAuthentication`` accepts the stateless access tokens of
+``notifications.tokens`` (``Authorization: Bearer <token>``) and needs no
+lookup at all.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from . import tokens
+
+
+class LocalCache:
+    """Thread-safe LRU with a per-entry expiry."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        return data
+
+    def set(self, key, data, ttl=None):
+        if ttl is None:
+            ttl = settings.NOTIFICATIONS_AUTH_CACHE_LOCAL_TTL
+        expires_at = time.monotonic() + ttl
+        with self.lock:
+            self.entries[key] = (expires_at, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.NOTIFICATIONS_AUTH_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalCache()
+
+
+# Cached in place of an entry for keys that match no token
+UNKNOWN = 'unknown'
+
+# Fields of a cached entry, in the order of ``_ENTRY_QUERY``
+ENTRY_FIELDS = ('user_id', 'username', 'is_active', 'is_staff')
+
+_ENTRY_QUERY = ('user_id', 'user__username', 'user__is_active', 'user__is_staff')
+
+
+def _cache_key(token_key):
+    return f'auth:token:{token_key}'
+
+
+def _entry(token_key):
+    """
+    Returns the cached entry of ``token_key``: a dict of ``ENTRY_FIELDS``,
+    or ``UNKNOWN``.
+    """
+    entry = local_cache.get(token_key)
+    if entry is not None:
+        return entry
+
+    entry = cache.get(_cache_key(token_key))
+    if entry is None:
+        row = Token.objects.filter(key=token_key).values_list(*_ENTRY_QUERY).first()
+        if row is None:
+            entry = UNKNOWN
+            cache.set(_cache_key(token_key), entry, settings.NOTIFICATIONS_AUTH_CACHE_NEGATIVE_TIMEOUT)
+        else:
+            entry = dict(zip(ENTRY_FIELDS, row))
+            cache.set(_cache_key(token_key), entry, settings.NOTIFICATIONS_AUTH_CACHE_TIMEOUT)
+
+    if entry == UNKNOWN:
+        local_cache.set(token_key, entry, min(
+            settings.NOTIFICATIONS_AUTH_CACHE_LOCAL_TTL,
+            settings.NOTIFICATIONS_AUTH_CACHE_NEGATIVE_TIMEOUT
+        ))
+    else:
+        local_cache.set(token_key, entry)
+    return entry
+
+
+def _token(token_key, entry):
+    # A fresh instance per lookup, so requests never share a User
+    user = User(
+        id=entry['user_id'], username=entry['username'],
+        is_active=entry['is_active'], is_staff=entry['is_staff']
+    )
+    user._state.adding = False
+    user._state.db = 'default'
+    token = Token(key=token_key, user=user)
+    token._state.adding = False
+    token._state.db = 'default'
+    return token
+
+
+def lookup(token_key):
+    """
+    Returns the ``Token`` with key ``token_key``.
+
+    Only the key and the user's ``id``, ``username``, ``is_active`` and
+    ``is_staff`` are populated.
+
+    Returns:
+        The token, or None if it does not exist or its user is inactive
+    """
+    entry = _entry(token_key)
+    if entry == UNKNOWN or not entry['is_active']:
+        return None
+    return _token(token_key, entry)
+
+
+def _drop(token_key):
+    local_cache.delete(token_key)
+    cache.delete(_cache_key(token_key))
+
+
+def invalidate(token_key):
+    """
+    Drops ``token_key`` from this process's and the shared cache.
+
+    Done again once the current transaction commits, so a concurrent
+    request cannot put back the state from before the change.
+    """
+    _drop(token_key)
+    transaction.on_commit(lambda: _drop(token_key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    ``TokenAuthentication`` resolving tokens through ``lookup``.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = _entry(key)
+        if entry == UNKNOWN:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not entry['is_active']:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        token = _token(key, entry)
+        return (token.user, token)
+
+
+class SignedTokenAuthentication(TokenAuthentication):
+    """
+    Authenticates ``Authorization: Bearer <access token>`` headers.
+
+    The token is verified by signature and expiry alone; the request user
+    is built from its claims, so no query runs.
+    """
+
+    keyword = 'Bearer'
+
+    def authenticate_credentials(self, key):
+        try:
+            claims = tokens.verify_access(key)
+        except tokens.InvalidToken:
+            raise exceptions.AuthenticationFailed(_('Invalid or expired token.'))
+        return (tokens.claims_user(claims), claims)
+
+
+@receiver(post_delete, sender=Token, dispatch_uid='invalidate_deleted_token')
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Forgets tokens as soon as they are deleted."""
+    invalidate(instance.key)
+
+
+@receiver(post_save, sender=Token, dispatch_uid='invalidate_saved_token')
+def invalidate_saved_token(sender, instance, raw=False, **kwargs):
+    """Forgets a negative entry for the key of a new token."""
+    if not raw:
+        invalidate(instance.key)
+
+
+@receiver(post_save, sender=User, dispatch_uid='invalidate_saved_user_tokens')
+def invalidate_saved_user_tokens(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Forgets a user's token whenever the user changes, and revokes their
+    signed tokens when they are deactivated.
+    """
+    if created or raw:
+        return
+    if not instance.is_active:
+        tokens.revoke_user(instance.pk)
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        invalidate(key)
@@ -0,0 +1,258 @@
+"""
+Bounded outbound queues for WebSocket connections.
+
+``NotificationsConsumer`` does not write frames to the socket from its
+event handlers. It puts them on an ``OutboundQueue`` drained by one writer
+task per connection. When a client reads slower than notifications arrive,
+the queue fills and ``NOTIFICATIONS_OUTBOUND_POLICY`` decides what gives:
+
+``drop_oldest``
+    Discard the oldest queued LOW priority notification to make room.
+``coalesce``
+    Discard the incoming notification and count it; once the queue drains
+    the client is sent a single ``notifications_skipped`` frame with the
+    count, and can catch up through the change log.
+``close``
+    Close the connection with ``RESYNC_CLOSE_CODE``. The client reconnects
+    with its ``last_event_id`` and is replayed what it missed.
+
+Frames that are not notifications (replies to client requests) are never
+dropped; if one does not fit, or a policy cannot make room, the connection
+is closed. Either way memory per connection stays bounded.
+
+The queue only fills if writing to a slow client takes time. Servers such
+as uvicorn and hypercorn make ``send`` wait while their write buffer is
+full. Daphne does not: ``websocket.send`` returns at once and the frame is
+appended to the Twisted transport's buffer, which grows without limit.
+Under Daphne ``TransportBackpressure`` registers with the transport as a
+push producer, so Twisted tells it when its buffer passes ``bufferSize``
+(64 KiB) and when it has drained, and the writer waits in between. Other
+servers are trusted to apply backpressure in ``send`` themselves.
+"""
+
+import asyncio
+import functools
+import sys
+from collections import deque
+
+from . import metrics
+
+# Close code telling the client to reconnect and resync
+RESYNC_CLOSE_CODE = 4409
+
+PRIORITY_RANK = {'LOW': 0, 'MEDIUM': 1, 'HIGH': 2}
+
+QUEUED_GAUGE = 'ws_outbound_queued_frames'
+DEPTH_MAX = 'ws_outbound_queue_depth'
+DROPPED_COUNTER = 'ws_outbound_dropped_frames'
+SKIPPED_COUNTER = 'ws_outbound_coalesced_frames'
+CLOSED_COUNTER = 'ws_outbound_overflow_closes'
+
+
+class EncodedFrame:
+    """
+    A frame whose JSON text was produced upstream and is written as is.
+
+    Args:
+        type: The frame's ``type``, as it appears in ``text``
+        text: The encoded frame
+        priority: Notification priority, or None if the frame is not droppable
+    """
+
+    __slots__ = ('type', 'text', 'priority')
+
+    def __init__(self, type, text, priority=None):
+        self.type = type
+        self.text = text
+        self.priority = priority
+
+
+class TransportBackpressure:
+    """
+    Tracks whether the server can take more data for one connection.
+
+    Registered as a streaming (push) producer with the connection's Twisted
+    transport, which pauses it when its send buffer fills up and resumes it
+    once the buffer has been written out. Created by
+    ``transport_backpressure``.
+    """
+
+    def __init__(self, consumer):
+        self.consumer = consumer
+        self.writable = asyncio.Event()
+        self.writable.set()
+        consumer.registerProducer(self, True)
+
+    @property
+    def paused(self):
+        return not self.writable.is_set()
+
+    def pauseProducing(self):
+        self.writable.clear()
+
+    def resumeProducing(self):
+        self.writable.set()
+
+    def stopProducing(self):
+        # The connection is going away; nothing should wait on it any more
+        self.writable.set()
+
+    async def wait(self):
+        """Waits until the transport's send buffer has drained."""
+        await self.writable.wait()
+
+    def release(self):
+        """Unregisters from the transport."""
+        if self.consumer is not None:
+            self.consumer.unregisterProducer()
+            self.consumer = None
+        self.writable.set()
+
+
+def _daphne_protocol(send):
+    # Daphne hands applications partial(Server.handle_reply, protocol), which
+    # Channels' session middleware wraps in a bound method of an object
+    # keeping the original as real_send
+    # Not imported here: importing it installs Twisted's reactor
+    daphne_server = sys.modules.get('daphne.server')
+    if daphne_server is None:
+        return None
+    while not isinstance(send, functools.partial):
+        send = getattr(getattr(send, '__self__', None), 'real_send', None)
+        if send is None:
+            return None
+    if send.args and isinstance(getattr(send.func, '__self__', None), daphne_server.Server):
+        return send.args[0]
+    return None
+
+
+def transport_backpressure(send):
+    """
+    Returns a ``TransportBackpressure`` for the connection the ASGI ``send``
+    callable writes to, or None if the server is not Daphne.
+    """
+    protocol = _daphne_protocol(send)
+    transport = getattr(protocol, 'transport', None)
+    if transport is None:
+        return None
+    # The HTTP channel stays registered with the transport for the whole
+    # connection, including after a WebSocket upgrade, and passes pauses on
+    # to one producer registered with it
+    consumer = getattr(transport, 'producer', None)
+    if consumer is None:
+        consumer = transport
+    return TransportBackpressure(consumer)
+
+
+class QueueOverflow(Exception):
+    """Raised by ``OutboundQueue.put`` when the connection must be closed."""
+
+
+def frame_priority(frame):
+    """
+    Returns the priority of an outbound frame, or None if it is not droppable.
+
+    A batch frame takes the highest priority among its notifications.
+    """
+    if isinstance(frame, EncodedFrame):
+        return frame.priority
+    if frame.get('type') == 'notification':
+        return frame['notification'].get('priority', 'MEDIUM')
+    if frame.get('type') == 'announcement':
+        return frame['announcement'].get('priority', 'MEDIUM')
+    if frame.get('type') == 'notifications_batch':
+        priorities = [n.get('priority', 'MEDIUM') for n in frame['notifications']]
+        return max(priorities, key=PRIORITY_RANK.get, default='MEDIUM')
+    return None
+
+
+class OutboundQueue:
+    """
+    A bounded FIFO of frames written to one connection by a background task.
+
+    Args:
+        send: Coroutine function writing one frame to the socket
+        maxsize: Maximum number of queued frames
+        policy: ``drop_oldest``, ``coalesce`` or ``close``
+        backpressure: ``TransportBackpressure`` to wait on before each
+            write, for servers whose ``send`` does not wait
+    """
+
+    def __init__(self, send, maxsize, policy, backpressure=None):
+        self.send = send
+        self.maxsize = maxsize
+        self.policy = policy
+        self.backpressure = backpressure
+        self.frames = deque()
+        self.skipped = 0
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.ensure_future(self.run())
+
+    def __len__(self):
+        return len(self.frames)
+
+    def put(self, frame):
+        """
+        Queues ``frame`` for sending, applying the overflow policy if full.
+
+        Raises:
+            QueueOverflow: If the frame cannot be queued and the connection
+                should be closed
+        """
+        priority = frame_priority(frame)
+        if len(self.frames) >= self.maxsize and not self.make_room(priority):
+            return
+        self.frames.append((frame, priority))
+        metrics.adjust_gauge(QUEUED_GAUGE, 1)
+        metrics.observe_max(DEPTH_MAX, len(self.frames))
+        self.wakeup.set()
+
+    def make_room(self, priority):
+        """Applies the policy; returns True if the incoming frame should be queued."""
+        if priority is not None and self.policy == 'coalesce':
+            self.skipped += 1
+            metrics.increment(SKIPPED_COUNTER)
+            return False
+
+        if priority is not None and self.policy == 'drop_oldest':
+            for position, (_, queued_priority) in enumerate(self.frames):
+                if queued_priority == 'LOW':
+                    del self.frames[position]
+                    metrics.adjust_gauge(QUEUED_GAUGE, -1)
+                    metrics.increment(DROPPED_COUNTER)
+                    return True
+            if priority == 'LOW':
+                metrics.increment(DROPPED_COUNTER)
+                return False
+
+        metrics.increment(CLOSED_COUNTER)
+        raise QueueOverflow()
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.frames:
+                await self.writable()
+                frame, _ = self.frames.popleft()
+                metrics.adjust_gauge(QUEUED_GAUGE, -1)
+                await self.send(frame)
+            if self.skipped:
+                await self.writable()
+                skipped, self.skipped = self.skipped, 0
+                await self.send({'type': 'notifications_skipped', 'count': skipped})
+
+    async def writable(self):
+        # Frames stay queued, where the policy can see them, until the
+        # server can take them
+        if self.backpressure is not None:
+            await self.backpressure.wait()
+
+    def close(self):
+        """Stops the writer and discards anything still queued."""
+        self.task.cancel()
+        if self.backpressure is not None:
+            self.backpressure.release()
+            self.backpressure = None
+        metrics.adjust_gauge(QUEUED_GAUGE, -len(self.frames))
+        self.frames.clear()
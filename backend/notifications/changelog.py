@@ -0,0 +1,168 @@
+"""
+Append-only inbox change log for delta sync.
+
+Every write that changes what a user's inbox looks like also appends an
+``InboxChange`` with the next number from that user's ``InboxSequence``.
+Sequence numbers are taken under the sequence row's lock, which is held
+until the writing transaction commits, so each user's entries become
+visible in sequence order without gaps. A client that remembers the last
+sequence number it applied asks for ``changes_since`` that number and
+receives only what happened while it was away.
+
+``compact`` deletes old entries and raises the user's ``floor``; a client
+whose sequence number is below the floor is told to re-download its inbox.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import InboxChange, InboxSequence
+
+# Upper bound on entries deleted per compaction statement
+COMPACT_BATCH_SIZE = 10000
+
+
+def _allocate(counts):
+    """
+    Reserves sequence numbers for several users in one statement.
+
+    Args:
+        counts: Mapping of user ID to the number of entries to reserve
+
+    Returns:
+        A dict of user ID to the first reserved sequence number
+    """
+    rows = sorted(counts.items())
+    table = connection.ops.quote_name(InboxSequence._meta.db_table)
+    params = []
+    for user_id, count in rows:
+        params.extend([user_id, count])
+    values = ', '.join(['(%s, %s, 0)'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, last_seq, floor) VALUES {values} '
+            f'ON CONFLICT (user_id) '
+            f'DO UPDATE SET last_seq = {table}.last_seq + EXCLUDED.last_seq '
+            f'RETURNING user_id, last_seq',
+            params
+        )
+        return {user_id: last - counts[user_id] + 1 for user_id, last in cursor.fetchall()}
+
+
+def record_many(entries):
+    """
+    Appends entries to the change logs of one or more users.
+
+    Must be called inside the transaction making the changes.
+
+    Args:
+        entries: Iterable of ``(user_id, action, notification_id, data)``
+    """
+    entries = list(entries)
+    if not entries:
+        return []
+
+    next_seq = _allocate(Counter(user_id for user_id, _, _, _ in entries))
+    changes = []
+    for user_id, action, notification_id, data in entries:
+        changes.append(InboxChange(
+            user_id=user_id,
+            seq=next_seq[user_id],
+            action=action,
+            notification_id=notification_id,
+            data=data
+        ))
+        next_seq[user_id] += 1
+    return InboxChange.objects.bulk_create(changes)
+
+
+def record(user_id, action, notification_id=None, data=None):
+    """Appends a single entry to a user's change log."""
+    return record_many([(user_id, action, notification_id, data)])[0]
+
+
+def serialize_change(change):
+    """Returns the wire representation of an ``InboxChange``."""
+    return {
+        'seq': change.seq,
+        'action': change.action,
+        'notification_id': change.notification_id,
+        'data': change.data,
+        'created_at': change.created_at.isoformat(),
+    }
+
+
+def changes_since(user, since, limit=None):
+    """
+    Returns the changes a client at sequence ``since`` has not seen yet.
+
+    Args:
+        user: Owner of the inbox
+        since: Last sequence number the client applied (0 for none)
+        limit: Maximum number of entries to return
+
+    Returns:
+        A dict with ``changes``, ``latest`` (the sequence number to pass as
+        ``since`` next time), ``has_more`` and ``resync``. When ``resync`` is
+        True the entries the client needs were compacted away: it should
+        re-download its inbox and continue from ``latest``.
+    """
+    limit = limit or settings.NOTIFICATIONS_CHANGES_PAGE_SIZE
+    sequence = InboxSequence.objects.filter(user=user).values_list('last_seq', 'floor').first()
+    last_seq, floor = sequence or (0, 0)
+    if since < floor or since > last_seq:
+        return {'changes': [], 'latest': last_seq, 'has_more': False, 'resync': True}
+
+    changes = list(
+        InboxChange.objects.filter(user=user, seq__gt=since).order_by('seq')[:limit + 1]
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    return {
+        'changes': [serialize_change(change) for change in changes],
+        'latest': changes[-1].seq if changes else since,
+        'has_more': has_more,
+        'resync': False,
+    }
+
+
+def compact(older_than=None, batch_size=COMPACT_BATCH_SIZE):
+    """
+    Deletes change log entries older than a cutoff and raises user floors.
+
+    Works in batches, each in its own transaction, so it can run against a
+    busy table without holding locks for long.
+
+    Args:
+        older_than: A timedelta; defaults to
+            ``NOTIFICATIONS_CHANGELOG_RETENTION_DAYS`` days
+        batch_size: Entries deleted per statement
+
+    Returns:
+        The number of entries deleted
+    """
+    if older_than is None:
+        older_than = timedelta(days=settings.NOTIFICATIONS_CHANGELOG_RETENTION_DAYS)
+    cutoff = timezone.now() - older_than
+
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                InboxChange.objects.filter(created_at__lt=cutoff)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+
+            floors = defaultdict(int)
+            for user_id, seq in InboxChange.objects.filter(id__in=ids).values_list('user_id', 'seq'):
+                floors[user_id] = max(floors[user_id], seq)
+            InboxChange.objects.filter(id__in=ids).delete()
+            for user_id, floor in sorted(floors.items()):
+                InboxSequence.objects.filter(user_id=user_id, floor__lt=floor).update(floor=floor)
+            deleted += len(ids)
@@ -0,0 +1,136 @@
+"""
+The JSON codec used by the API, the WebSocket consumer and cached payloads.
+
+``NOTIFICATIONS_JSON_CODEC`` picks the implementation: ``orjson`` or
+``msgspec`` when installed (both encode a notification several times
+faster than the standard library), ``json`` for the standard library, or
+``auto`` for the fastest one available.
+``notifications/utils/benchmark_codec.py`` measures the difference.
+
+Every codec produces the same JSON for the values our serializers return:
+``dumps`` returns UTF-8 bytes and ``loads`` accepts bytes or str, raising
+``ValueError`` on malformed input whichever library is underneath.
+Datetimes are written the way DRF's encoder writes them, with UTC as ``Z``
+rather than ``+00:00`` (``OPT_UTC_Z`` for orjson; msgspec does so already).
+"""
+
+import json
+from collections.abc import Mapping
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.utils.encoders import JSONEncoder
+
+_drf_encoder = JSONEncoder()
+
+
+def _default(obj):
+    # Types the fast libraries leave to a hook: lazy strings, decimals,
+    # querysets and the like go through DRF's encoder, mapping and list
+    # subclasses are passed on as their plain counterparts
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, (list, tuple)):
+        return list(obj)
+    return _drf_encoder.default(obj)
+
+
+class Codec:
+    """A named pair of ``dumps``/``loads`` functions."""
+
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return f'<Codec {self.name}>'
+
+
+def _stdlib_codec():
+    def dumps(obj):
+        return json.dumps(
+            obj, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+    return Codec('json', dumps, json.loads)
+
+
+def _orjson_codec():
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(
+            obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        )
+
+    return Codec('orjson', dumps, orjson.loads)
+
+
+def _msgspec_codec():
+    import msgspec
+
+    encoder = msgspec.json.Encoder(enc_hook=_default)
+    decoder = msgspec.json.Decoder()
+
+    def loads(data):
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as exc:
+            raise ValueError(str(exc)) from exc
+
+    return Codec('msgspec', encoder.encode, loads)
+
+
+CODECS = {
+    'orjson': _orjson_codec,
+    'msgspec': _msgspec_codec,
+    'json': _stdlib_codec,
+}
+
+
+def build_codec(name):
+    """
+    Returns the codec called ``name``, or the fastest installed for ``auto``.
+
+    Raises:
+        ImproperlyConfigured: If the name is unknown or its library is missing
+    """
+    if name == 'auto':
+        for candidate in CODECS.values():
+            try:
+                return candidate()
+            except ImportError:
+                continue
+    if name not in CODECS:
+        raise ImproperlyConfigured(f'Unknown NOTIFICATIONS_JSON_CODEC {name!r}')
+    try:
+        return CODECS[name]()
+    except ImportError:
+        raise ImproperlyConfigured(f'NOTIFICATIONS_JSON_CODEC {name!r} is not installed')
+
+
+@lru_cache(maxsize=None)
+def _codec_for(name):
+    return build_codec(name)
+
+
+def get_codec():
+    """Returns the configured codec."""
+    return _codec_for(settings.NOTIFICATIONS_JSON_CODEC)
+
+
+def dumps(obj):
+    """Encodes ``obj`` as UTF-8 JSON bytes."""
+    return get_codec().dumps(obj)
+
+
+def loads(data):
+    """
+    Decodes JSON bytes or str.
+
+    Raises:
+        ValueError: If ``data`` is not valid JSON
+    """
+    return get_codec().loads(data)
@@ -1,41 +1,223 @@
-from channels.generic.websocket import AsyncWebsocketConsumer
-import json
+from channels.exceptions import StopConsumer
+from channels.generic.http import AsyncHttpConsumer
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+import asyncio
+from urllib.parse import parse_qs
+from django.db import transaction
 from django.db.models import Q
-from .models import Notifications, UserPreferences
+from .models import Notifications, NotificationType, UserPreferences
 from .serializers import NotificationsSerializer
+from .pagination import InvalidCursor
+from .backpressure import (
+    EncodedFrame, OutboundQueue, QueueOverflow, RESYNC_CLOSE_CODE, transport_backpressure
+)
+from . import changelog, codec, delivery, fanout, inbox_cache, presence, replay, unread
 from asgiref.sync import sync_to_async
-from django.core.paginator import Paginator
+from django.conf import settings
 
-class NotificationsConsumer(AsyncWebsocketConsumer):
+class SubscriptionMixin:
+    """
+    Group membership and presence shared by the WebSocket and SSE consumers.
+
+    ``subscribe`` joins the user's group and the topic groups of their
+    notification types and marks the user present, refreshing the entry
+    from a heartbeat task; ``unsubscribe`` undoes all of it.
+    """
+
+    async def subscribe(self):
+        """
+        Start receiving the user's notifications and announcements.
+        """
+        delivery.serve_on(asyncio.get_running_loop())
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+        await self.join_topics(await self.get_subscribed_types())
+        await presence.register(self.group_name, self.channel_name)
+        self.heartbeat_task = asyncio.ensure_future(self.heartbeat())
+
+    async def unsubscribe(self):
+        """
+        Leave every group and drop the presence entry.
+        """
+        if getattr(self, 'heartbeat_task', None):
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+            await presence.unregister(self.group_name, self.channel_name)
+        if getattr(self, 'topics', None):
+            await self.join_topics(())
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(
+                self.group_name,
+                self.channel_name
+            )
+
+    @sync_to_async
+    def get_subscribed_types(self):
+        """
+        Get the IDs of the notification types the user receives.
+        """
+        return fanout.subscribed_type_ids(self.user.id)
+
+    async def join_topics(self, type_ids):
+        """
+        Move this connection to the topic groups of ``type_ids``.
+        """
+        topics = {delivery.topic_group(type_id) for type_id in type_ids}
+        for topic in self.topics - topics:
+            await self.channel_layer.group_discard(topic, self.channel_name)
+        for topic in topics - self.topics:
+            await self.channel_layer.group_add(topic, self.channel_name)
+        self.topics = topics
+
+    async def preferences_changed(self, event):
+        """
+        Follow a change of the user's subscribed notification types.
+        """
+        await self.join_topics(event['notification_types'])
+
+    async def heartbeat(self):
+        """
+        Keep the user's presence entry alive for as long as the connection is.
+        """
+        interval = settings.NOTIFICATIONS_PRESENCE_TTL / 2
+        while True:
+            await asyncio.sleep(interval)
+            await presence.register(self.group_name, self.channel_name)
+
+
+class NotificationsConsumer(SubscriptionMixin, AsyncJsonWebsocketConsumer):
     """
     WebSocket consumer for handling real-time notifications.
+
+    Notifications arriving in bursts are coalesced: they are buffered for
+    up to ``NOTIFICATIONS_COALESCE_WINDOW_MS`` (or until
+    ``NOTIFICATIONS_COALESCE_MAX_EVENTS`` are waiting) and sent as a single
+    ``notifications_batch`` frame. HIGH priority notifications are sent
+    immediately, after anything already buffered so ordering is kept.
+
+    Clients reconnecting with ``?last_event_id=<id>`` (the ``event_id`` of
+    the last notification they received) are first sent the events they
+    missed, or a ``resync`` frame if those are no longer buffered.
+
+    Every frame goes through a bounded ``OutboundQueue`` (see
+    ``notifications.backpressure``) so a slow client cannot make the worker
+    buffer without limit.
+
+    While connected, the user is marked present in ``notifications.presence``
+    and refreshed by a heartbeat task; notifications for users with no
+    connection skip the channel layer and go to email and push instead.
+    Clients may also send ``ping`` to refresh presence and get a ``pong``.
+
+    Connections also join the topic group of every notification type the
+    user is subscribed to and receive broadcast ``announcement`` frames
+    from them; the topics follow preference changes while connected.
     """
     
     async def connect(self):
         """
         Handles new WebSocket connections.
         """
+        self.pending = []
+        self.flush_task = None
+        self.outbound = None
+        self.heartbeat_task = None
+        self.topics = set()
         self.user = self.scope['user']
-        self.group_name = f"user_{self.user.id}"
+        self.group_name = delivery.user_group(self.user.id)
 
         if self.user.is_authenticated:
-            await self.channel_layer.group_add(
-                self.group_name,
-                self.channel_name
-            )
+            await self.subscribe()
             await self.accept()
+            self.outbound = OutboundQueue(
+                self.write_frame,
+                settings.NOTIFICATIONS_OUTBOUND_QUEUE_SIZE,
+                settings.NOTIFICATIONS_OUTBOUND_POLICY,
+                transport_backpressure(self.base_send)
+            )
+            await self.replay_missed()
         else:
             await self.close()
 
+    async def announcement_message(self, event):
+        """
+        Forward a broadcast announcement from a topic group.
+        """
+        await self.send_json(delivery.announcement_frame(event))
+
+    async def replay_missed(self):
+        """
+        Send the events published since the client's ``last_event_id``.
+
+        The group is joined before the buffer is read, so nothing falls
+        between replay and live delivery; an event may arrive twice and
+        clients should ignore IDs they have already seen.
+        """
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            last_event_id = int(query['last_event_id'][0])
+        except (KeyError, ValueError):
+            return
+
+        events = await replay.events_since(self.group_name, last_event_id)
+        if events is None:
+            await self.send_json({'type': 'resync'})
+        elif events:
+            await self.send_json(delivery.batch_frame(events))
+
+    @classmethod
+    async def decode_json(cls, text_data):
+        """
+        Decode an incoming frame with the configured JSON codec.
+        """
+        return codec.loads(text_data)
+
+    @classmethod
+    async def encode_json(cls, content):
+        """
+        Encode an outgoing frame with the configured JSON codec.
+        """
+        return codec.dumps(content).decode()
+
+    async def send_json(self, content, close=False):
+        """
+        Queue a frame for the writer task instead of writing it inline.
+        """
+        if self.outbound is None:
+            return
+        try:
+            self.outbound.put(content)
+        except QueueOverflow:
+            await self.close_for_resync()
+
+    async def write_frame(self, content):
+        """
+        Write one frame to the socket; called by the outbound queue's writer.
+        """
+        if isinstance(content, EncodedFrame):
+            await self.send(text_data=content.text)
+        else:
+            await super().send_json(content)
+
+    async def close_for_resync(self):
+        """
+        Drop the connection of a client that cannot keep up.
+        """
+        self.outbound.close()
+        self.outbound = None
+        await self.close(code=RESYNC_CLOSE_CODE)
+
     async def disconnect(self, close_code):
         """
         Handles WebSocket disconnections.
         """
-        if hasattr(self, 'group_name'):
-            await self.channel_layer.group_discard(
-                self.group_name,
-                self.channel_name
-            )
+        if getattr(self, 'flush_task', None):
+            self.flush_task.cancel()
+        if getattr(self, 'outbound', None):
+            self.outbound.close()
+            self.outbound = None
+        await self.unsubscribe()
 
     async def receive_json(self, content):
         """
@@ -47,33 +229,44 @@ class NotificationsConsumer(AsyncWebsocketConsumer):
             await self.fetch_notifications(content)
         elif message_type == 'mark_read':
             await self.mark_notifications_read(content)
+        elif message_type == 'mark_all_read':
+            await self.mark_all_notifications_read(content)
+        elif message_type == 'sync':
+            await self.sync_changes(content)
+        elif message_type == 'ping':
+            await presence.register(self.group_name, self.channel_name)
+            await self.send_json({'type': 'pong'})
 
     @sync_to_async
-    def get_notifications(self, page=1):
+    def get_notifications(self, cursor=None):
         """
-        Get paginated notifications for the current user.
+        Get a keyset paginated page of notifications for the current user,
+        served from the inbox cache when possible.
         """
-        notifications = Notifications.objects.filter(
-            recipient=self.user
-        ).order_by('-created_at')
-        
-        paginator = Paginator(notifications, 10)
-        page_obj = paginator.get_page(page)
-        
+        page = inbox_cache.get_inbox_page(self.user, cursor)
+
         return {
-            'notifications': NotificationsSerializer(page_obj, many=True).data,
-            'has_next': page_obj.has_next(),
-            'total_pages': paginator.num_pages,
-            'total_count': paginator.count
+            'notifications': page['results'],
+            'has_next': page['next_cursor'] is not None,
+            'next_cursor': page['next_cursor']
         }
 
     async def fetch_notifications(self, content):
         """
         Fetch notifications for the current user.
+
+        Clients pass the ``next_cursor`` of the previous page as ``cursor``
+        to continue; omitting it returns the newest page.
         """
-        page = content.get('page', 1)
-        notifications_data = await self.get_notifications(page)
-        
+        try:
+            notifications_data = await self.get_notifications(content.get('cursor'))
+        except InvalidCursor:
+            await self.send_json({
+                'type': 'error',
+                'message': 'Invalid cursor'
+            })
+            return
+
         await self.send_json({
             'type': 'notifications_list',
             **notifications_data
@@ -82,10 +275,67 @@ class NotificationsConsumer(AsyncWebsocketConsumer):
     async def notification_message(self, event):
         """
         Handles incoming notification messages from other parts of the application.
+
+        The notification arrives already encoded and is spliced into the
+        outgoing frame as is.
+        """
+        window = settings.NOTIFICATIONS_COALESCE_WINDOW_MS
+        if window <= 0:
+            await self.send_json(delivery.notification_frame(event))
+            return
+
+        self.pending.append(event)
+        if (delivery.event_priority(event) == 'HIGH'
+                or len(self.pending) >= settings.NOTIFICATIONS_COALESCE_MAX_EVENTS):
+            await self.flush_notifications()
+        elif self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later(window / 1000))
+
+    async def flush_later(self, delay):
+        """
+        Flush the buffered notifications once the coalescing window closes.
+        """
+        await asyncio.sleep(delay)
+        self.flush_task = None
+        await self.flush_notifications()
+
+    async def flush_notifications(self):
         """
+        Send buffered notifications, as a batch frame when there are several.
+        """
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        pending, self.pending = self.pending, []
+        if len(pending) == 1:
+            await self.send_json(delivery.notification_frame(pending[0]))
+        elif pending:
+            await self.send_json(delivery.batch_frame(pending))
+
+    @sync_to_async
+    def get_changes(self, since):
+        """
+        Get the inbox changes after sequence number ``since``.
+        """
+        return changelog.changes_since(self.user, since)
+
+    async def sync_changes(self, content):
+        """
+        Send the changes the client missed since its last known sequence
+        number, or ask it to re-download its inbox when they were compacted.
+        """
+        try:
+            since = int(content.get('since', 0))
+        except (TypeError, ValueError):
+            await self.send_json({
+                'type': 'error',
+                'message': 'since must be an integer'
+            })
+            return
+
         await self.send_json({
-            'type': 'notification',
-            'notification': event['notification']
+            'type': 'changes',
+            **await self.get_changes(since)
         })
 
     @sync_to_async
@@ -93,10 +343,12 @@ class NotificationsConsumer(AsyncWebsocketConsumer):
         """
         Mark notifications as read.
         """
-        Notifications.objects.filter(
-            id__in=notification_ids,
-            recipient=self.user
-        ).update(is_read=True)
+        with transaction.atomic():
+            marked = unread.mark_read(self.user, notification_ids)
+            changelog.record_many(
+                (self.user.id, 'read', pk, None) for pk in marked
+            )
+            inbox_cache.bump_generation(self.user.id)
 
     async def mark_notifications_read(self, content):
         """
@@ -108,4 +360,258 @@ class NotificationsConsumer(AsyncWebsocketConsumer):
             await self.send_json({
                 'type': 'notifications_marked_read',
                 'notification_ids': notification_ids
-            })
\ No newline at end of file
+            })
+
+    @sync_to_async
+    def mark_all_as_read(self, type_id=None):
+        """
+        Advance the user's read watermark, optionally for one type only.
+        """
+        notification_type = None
+        if type_id is not None:
+            notification_type = NotificationType.objects.filter(pk=type_id).first()
+            if notification_type is None:
+                return None
+        with transaction.atomic():
+            read_before = unread.mark_all_read(self.user, notification_type)
+            changelog.record(self.user.id, 'read_all', data={
+                'notification_type': type_id,
+                'read_before': read_before.isoformat(),
+            })
+            inbox_cache.bump_generation(self.user.id)
+        return read_before
+
+    async def mark_all_notifications_read(self, content):
+        """
+        Handle marking the whole inbox as read.
+        """
+        type_id = content.get('notification_type')
+        read_before = await self.mark_all_as_read(type_id)
+        if read_before is None:
+            await self.send_json({
+                'type': 'error',
+                'message': 'Invalid notification type'
+            })
+            return
+
+        await self.send_json({
+            'type': 'notifications_marked_all_read',
+            'notification_type': type_id,
+            'read_before': read_before.isoformat()
+        })
+
+
+class NotificationStreamConsumer(SubscriptionMixin, AsyncHttpConsumer):
+    """
+    Server-Sent Events stream of the user's notifications, for clients that
+    cannot keep a WebSocket open.
+
+    The stream joins the same groups as ``NotificationsConsumer`` and sends
+    ``notification`` and ``announcement`` events whose ``data`` is the JSON
+    already encoded for the WebSocket frames. Messages are buffered and
+    written every ``NOTIFICATIONS_SSE_FLUSH_MS`` (HIGH priority ones at
+    once), and a comment is written every ``NOTIFICATIONS_SSE_HEARTBEAT``
+    seconds so proxies do not close an idle stream.
+
+    Clients resume with the standard ``Last-Event-ID`` header (or
+    ``?last_event_id=``) and get a ``resync`` event if the events they
+    missed are no longer buffered. A client more than
+    ``NOTIFICATIONS_OUTBOUND_QUEUE_SIZE`` messages behind also gets
+    ``resync`` and the stream ends. Under Daphne, whose ``send_body`` does
+    not wait for the client, messages stay buffered while the transport's
+    send buffer is full (see ``backpressure.TransportBackpressure``), so
+    that limit applies to clients that stop reading too.
+    """
+
+    async def http_request(self, message):
+        """
+        Open the stream once the request has been read.
+
+        Unlike ``AsyncHttpConsumer``, the consumer keeps running after
+        ``handle`` returns: the response stays open and is written to by
+        the group event handlers until the client disconnects.
+        """
+        if 'body' in message:
+            self.body.append(message['body'])
+        if not message.get('more_body'):
+            await self.handle(b''.join(self.body))
+
+    async def handle(self, body):
+        """
+        Authenticate the request, subscribe and start the stream.
+        """
+        self.pending = []
+        self.flush_task = None
+        self.keepalive_task = None
+        self.heartbeat_task = None
+        self.backpressure = None
+        self.closed = False
+        self.topics = set()
+        self.user = self.scope.get('user')
+
+        if self.scope['method'] != 'GET':
+            await self.reject(405, 'Method not allowed.', [(b'Allow', b'GET')])
+        if self.user is None or not self.user.is_authenticated:
+            await self.reject(401, 'Authentication credentials were not provided.')
+
+        self.group_name = delivery.user_group(self.user.id)
+        await self.subscribe()
+        await self.send_headers(headers=[
+            (b'Content-Type', b'text/event-stream'),
+            (b'Cache-Control', b'no-cache'),
+            (b'X-Accel-Buffering', b'no'),
+        ])
+        self.backpressure = transport_backpressure(self.base_send)
+        # Servers hold the headers back until the first body message
+        await self.send_body(b': connected\n\n', more_body=True)
+        await self.replay_missed()
+        self.keepalive_task = asyncio.ensure_future(self.keepalive())
+
+    async def reject(self, status, detail, headers=()):
+        """
+        Answer with an error instead of a stream and stop the consumer.
+        """
+        await self.send_response(
+            status,
+            codec.dumps({'detail': detail}),
+            headers=[(b'Content-Type', b'application/json'), *headers]
+        )
+        raise StopConsumer()
+
+    def last_event_id(self):
+        """
+        Get the ID the client resumes from, if any.
+        """
+        value = dict(self.scope.get('headers', ())).get(b'last-event-id')
+        if value is None:
+            query = parse_qs(self.scope.get('query_string', b'').decode())
+            value = query.get('last_event_id', [None])[0]
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    async def replay_missed(self):
+        """
+        Send the events published since the client's last event ID.
+        """
+        last_event_id = self.last_event_id()
+        if last_event_id is None:
+            return
+
+        events = await replay.events_since(self.group_name, last_event_id)
+        if events is None:
+            await self.send_body(b'event: resync\ndata: {}\n\n', more_body=True)
+        elif events:
+            await self.send_body(
+                b''.join(delivery.sse_message(event) for event in events),
+                more_body=True
+            )
+
+    async def keepalive(self):
+        """
+        Write a comment periodically so the connection never looks idle.
+        """
+        while True:
+            await asyncio.sleep(settings.NOTIFICATIONS_SSE_HEARTBEAT)
+            if not self.paused():
+                await self.send_body(b': keepalive\n\n', more_body=True)
+
+    async def notification_message(self, event):
+        """
+        Stream a notification published to the user's group.
+        """
+        await self.queue(delivery.sse_message(event), delivery.event_priority(event))
+
+    async def announcement_message(self, event):
+        """
+        Stream a broadcast announcement from a topic group.
+        """
+        await self.queue(
+            delivery.sse_message(event, 'announcement'),
+            delivery.event_priority(event, 'announcement')
+        )
+
+    async def queue(self, message, priority):
+        """
+        Buffer a message until the next flush.
+        """
+        if self.closed:
+            return
+        self.pending.append(message)
+        if len(self.pending) > settings.NOTIFICATIONS_OUTBOUND_QUEUE_SIZE:
+            await self.end_for_resync()
+
+        interval = settings.NOTIFICATIONS_SSE_FLUSH_MS
+        if interval <= 0 or priority == 'HIGH':
+            await self.flush()
+        elif self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later(interval / 1000))
+
+    async def flush_later(self, delay):
+        """
+        Flush the buffered messages once the flush interval has passed.
+        """
+        await asyncio.sleep(delay)
+        self.flush_task = None
+        await self.flush()
+
+    async def flush_when_writable(self):
+        """
+        Flush the buffered messages once the transport has drained.
+        """
+        await self.backpressure.wait()
+        self.flush_task = None
+        await self.flush()
+
+    def paused(self):
+        """
+        Whether the server is still holding data the client has not read.
+        """
+        return self.backpressure is not None and self.backpressure.paused
+
+    async def flush(self):
+        """
+        Write every buffered message in a single body chunk.
+        """
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        if self.closed:
+            return
+        if self.paused():
+            # Stay buffered, where the queue limit applies, until the
+            # client has read what was already written
+            self.flush_task = asyncio.ensure_future(self.flush_when_writable())
+            return
+        pending, self.pending = self.pending, []
+        if pending:
+            await self.send_body(b''.join(pending), more_body=True)
+
+    async def end_for_resync(self):
+        """
+        End the stream of a client that cannot keep up.
+        """
+        if self.closed:
+            # The client is already gone and disconnect is cleaning up
+            return
+        await self.disconnect()
+        await self.send_body(b'event: resync\ndata: {}\n\n')
+        raise StopConsumer()
+
+    async def disconnect(self):
+        """
+        Stop the timers and leave the groups, once.
+        """
+        if getattr(self, 'closed', True):
+            return
+        self.closed = True
+        self.pending = []
+        for task in (self.flush_task, self.keepalive_task):
+            if task is not None:
+                task.cancel()
+        self.flush_task = self.keepalive_task = None
+        if self.backpressure is not None:
+            self.backpressure.release()
+            self.backpressure = None
+        await self.unsubscribe()
@@ -0,0 +1,346 @@
+"""
+Real-time delivery of notifications to connected clients.
+
+This module is the single owner of channel layer group names and event
+schemas: producers never build either by hand. Any notification saved
+through the ORM is delivered by the ``post_save`` receiver in
+``notifications.lifecycle``, together with the rest of its bookkeeping.
+
+Events are written to the transactional outbox inside the producing
+transaction. Once that transaction commits, the IDs it queued are handed to
+``publisher``, a background thread of the same process, which publishes
+them in one concurrent batch and removes them from the outbox; the
+committing request never waits for the channel layer. Events whose publish
+fails, or that were queued by a process that died before publishing, stay
+in the outbox for the ``dispatch_outbox`` command to retry.
+Each event is JSON-encoded once when published (``wire_message``), not
+once per receiving connection.
+
+Recipients without an open WebSocket (see ``notifications.presence``) skip
+the outbox and channel layer altogether: their notifications are queued for
+email and push instead. The events are still recorded in the replay buffer
+after commit so a client coming back with its ``last_event_id`` is not
+missing them.
+
+Announcements (``Announcement``) go to topic groups instead, one per
+notification type, which connections join for the types their user is
+subscribed to; a broadcast is a single event however many users receive
+it. When a user changes their subscriptions, their open connections are
+told to switch topic groups.
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+from functools import partial
+
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.db import close_old_connections, transaction
+
+from .backpressure import EncodedFrame, PRIORITY_RANK
+from .serializers import AnnouncementSerializer, NotificationsSerializer
+from . import codec, external, outbox, presence, replay
+
+logger = logging.getLogger(__name__)
+
+# Channel layer event types; Channels dispatches them to the consumer
+# methods ``notification_message``, ``announcement_message`` and
+# ``preferences_changed``
+NOTIFICATION_EVENT = 'notification.message'
+ANNOUNCEMENT_EVENT = 'announcement.message'
+PREFERENCES_EVENT = 'preferences.changed'
+
+def user_group(user_id):
+    """Returns the channel layer group every connection of a user joins."""
+    return f'user_notifications_{user_id}'
+
+
+def topic_group(type_id):
+    """Returns the channel layer group of subscribers to a notification type."""
+    return f'topic_notifications_{type_id}'
+
+
+def notification_event(notification, data=None):
+    """
+    Builds the ``(group, event)`` pair announcing a new notification.
+
+    Args:
+        notification: The notification; ``recipient`` should already be
+            loaded to avoid a query
+        data: Its serialized form, if the caller already has it
+    """
+    if data is None:
+        data = NotificationsSerializer(notification).data
+    return user_group(notification.recipient_id), {
+        'type': NOTIFICATION_EVENT,
+        'notification': data,
+    }
+
+
+def is_replayed(event):
+    """
+    Whether ``event`` goes to the replay buffer of its group.
+
+    Only notifications are replayed; the other events only concern the
+    connections open when they are published.
+    """
+    return event.get('type') == NOTIFICATION_EVENT
+
+
+def wire_message(event):
+    """
+    Returns the channel layer message to publish for an outbox event.
+
+    The notification or announcement of the event is encoded to JSON here,
+    once, and carried as ``encoded`` text next to its ``priority``; every
+    consumer receiving the message splices that text into its frames
+    without decoding or re-encoding it. Other events are sent unchanged.
+    """
+    for key in ('notification', 'announcement'):
+        if key in event:
+            message = {name: value for name, value in event.items() if name != key}
+            message['priority'] = event[key].get('priority', 'MEDIUM')
+            message['encoded'] = codec.dumps(event[key]).decode()
+            return message
+    return event
+
+
+def event_priority(event, key='notification'):
+    """Returns the priority of a wire message or of a plain event."""
+    if 'priority' in event:
+        return event['priority']
+    return event[key].get('priority', 'MEDIUM')
+
+
+def _encoded(event, key):
+    # Events published without wire_message (e.g. by older code) are
+    # encoded by the receiving consumer instead
+    if 'encoded' in event:
+        return event['encoded']
+    return codec.dumps(event[key]).decode()
+
+
+def notification_frame(event):
+    """
+    Builds the client frame for one notification event.
+
+    The ``event_id`` assigned by the replay buffer is passed through so the
+    client can resume from it after reconnecting.
+    """
+    text = '{"type":"notification","notification":' + _encoded(event, 'notification')
+    if 'event_id' in event:
+        text += ',"event_id":%d' % event['event_id']
+    return EncodedFrame('notification', text + '}', event_priority(event))
+
+
+def batch_frame(events):
+    """Builds one ``notifications_batch`` client frame for several events."""
+    text = '{"type":"notifications_batch","notifications":[' + ','.join(
+        _encoded(event, 'notification') for event in events
+    ) + ']'
+    if 'event_id' in events[-1]:
+        text += ',"last_event_id":%d' % events[-1]['event_id']
+    priority = max(
+        (event_priority(event) for event in events), key=PRIORITY_RANK.get
+    )
+    return EncodedFrame('notifications_batch', text + '}', priority)
+
+
+def announcement_frame(event):
+    """Builds the client frame for an announcement event."""
+    return EncodedFrame(
+        'announcement',
+        '{"type":"announcement","announcement":' + _encoded(event, 'announcement') + '}',
+        event_priority(event, 'announcement')
+    )
+
+
+def sse_message(event, key='notification'):
+    """
+    Builds the Server-Sent Events message for a notification or
+    announcement event, named after ``key``.
+
+    The ``event_id`` becomes the SSE ``id`` so browsers send it back as
+    ``Last-Event-ID`` when they reconnect. Encoded JSON never contains a
+    raw newline, so it always fits on a single ``data`` line.
+    """
+    text = 'event: %s\ndata: %s\n\n' % (key, _encoded(event, key))
+    if 'event_id' in event:
+        text = 'id: %d\n' % event['event_id'] + text
+    return text.encode()
+
+
+# Event loop the connections of this process are served on, see ``serve_on``
+_consumer_loop = None
+
+
+def serve_on(loop):
+    """
+    Remembers the event loop connections are served on.
+
+    The in-memory channel layer's queues belong to that loop, so with that
+    layer events are published there rather than on the publisher's own.
+    """
+    global _consumer_loop
+    _consumer_loop = loop
+
+
+async def _record_offline(events):
+    for group, event in events:
+        try:
+            await replay.record(group, event)
+        except Exception:
+            logger.exception('Failed to record event for replay on %s', group)
+
+
+class Publisher:
+    """
+    Publishes committed outbox events from a daemon thread.
+
+    Jobs submitted while the thread is busy are published together in its
+    next batch, on an event loop the publisher keeps for its lifetime (so
+    channel layer connections are reused), or for the in-memory channel
+    layer on the loop connections are served on. ``join`` waits until
+    everything submitted so far is done.
+    """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.loop = None
+
+    def submit(self, event_ids=(), offline=()):
+        """
+        Queues outbox event IDs to publish and offline events to record
+        for replay; called once their transaction has committed.
+        """
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='notification-publisher', daemon=True
+                )
+                self.thread.start()
+        self.jobs.put((list(event_ids), list(offline)))
+
+    def join(self):
+        self.jobs.join()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        while True:
+            jobs = [self.jobs.get()]
+            while True:
+                try:
+                    jobs.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.publish(
+                    [event_id for ids, _ in jobs for event_id in ids],
+                    [event for _, offline in jobs for event in offline],
+                )
+            except Exception:
+                # The events stay in the outbox for dispatch_outbox
+                logger.exception('Failed to publish committed outbox events')
+            finally:
+                for _ in jobs:
+                    self.jobs.task_done()
+
+    def publish_loop(self):
+        loop = _consumer_loop
+        if (
+            loop is not None and loop.is_running()
+            and isinstance(get_channel_layer(), InMemoryChannelLayer)
+        ):
+            return loop
+        return self.loop
+
+    def publish(self, event_ids, offline):
+        loop = self.publish_loop()
+        # Same connection handling as a request: drop broken or expired ones
+        close_old_connections()
+        try:
+            if offline:
+                outbox.run_async(_record_offline(offline), loop)
+            if event_ids:
+                outbox.dispatch_batch(batch_size=len(event_ids), event_ids=event_ids, loop=loop)
+        finally:
+            close_old_connections()
+
+
+publisher = Publisher()
+
+
+def _enqueue(events):
+    rows = outbox.enqueue_many(events)
+    # Bound to this transaction: dropped with it if it rolls back
+    transaction.on_commit(partial(publisher.submit, event_ids=[row.id for row in rows]))
+
+
+def deliver(notifications, events=None):
+    """
+    Queues delivery of new notifications after the current commit.
+
+    Recipients with a live connection get the channel layer event; the rest
+    get email and push deliveries. Outside a transaction the events are
+    handed to ``publisher`` immediately.
+
+    Args:
+        notifications: The notifications, with ``recipient`` loaded
+        events: Their ``notification_event`` pairs, if the caller already
+            built them
+    """
+    if events is None:
+        events = [notification_event(notification) for notification in notifications]
+    if not events:
+        return
+    online = presence.online_groups({group for group, _ in events})
+
+    live, offline, offline_notifications = [], [], []
+    for notification, (group, event) in zip(notifications, events):
+        if group in online:
+            live.append((group, event))
+        else:
+            offline.append((group, event))
+            offline_notifications.append(notification)
+
+    if live:
+        _enqueue(live)
+    if offline:
+        external.queue_offline(
+            offline_notifications, [event['notification'] for _, event in offline]
+        )
+        transaction.on_commit(partial(publisher.submit, offline=offline))
+
+
+def deliver_announcement(announcement, data=None):
+    """
+    Queues an announcement for its type's topic group after the current commit.
+
+    Args:
+        announcement: The saved ``Announcement``
+        data: Its serialized form, if the caller already has it
+    """
+    if data is None:
+        data = AnnouncementSerializer(announcement).data
+    _enqueue([(topic_group(announcement.notification_type_id), {
+        'type': ANNOUNCEMENT_EVENT,
+        'announcement': data,
+    })])
+
+
+def subscriptions_changed(user_id, type_ids):
+    """
+    Tells the user's open connections to switch to the topics of ``type_ids``.
+
+    Nothing is sent when the user is not connected; the next connection
+    reads the subscriptions afresh.
+    """
+    group = user_group(user_id)
+    if group in presence.online_groups([group]):
+        _enqueue([(group, {
+            'type': PREFERENCES_EVENT,
+            'notification_types': sorted(type_ids),
+        })])
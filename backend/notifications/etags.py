@@ -0,0 +1,85 @@
+"""
+Conditional GET support for endpoints the frontend polls.
+
+Responses carry a strong ETag derived from a version number that every write
+path bumps: the inbox generation from ``inbox_cache`` for notification
+lists, and a per-user preferences version kept here. Both live in the cache,
+so answering a matching ``If-None-Match`` with 304 needs neither a database
+query nor the serializer.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def _preferences_key(user_id):
+    return f'preferences_version_{user_id}'
+
+
+def get_preferences_version(user_id):
+    """Returns the current preferences version of a user, creating one if needed."""
+    key = _preferences_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_preferences_version(user_id):
+    """Async version of ``get_preferences_version``."""
+    key = _preferences_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_preferences_version(user_id):
+    """Invalidates the preferences ETag of a user once the transaction commits."""
+    transaction.on_commit(
+        lambda: cache.set(_preferences_key(user_id), time.time_ns(), timeout=None)
+    )
+
+
+def make_etag(request, *parts):
+    """
+    Builds a strong ETag for a response to ``request``.
+
+    The query string and negotiated format are folded in so different pages,
+    filters and renderers of the same resource get different tags.
+
+    Args:
+        request: The DRF request being answered
+        parts: Version numbers and identifiers the response depends on
+    """
+    accepted = getattr(request, 'accepted_renderer', None)
+    key = '|'.join([
+        *(str(part) for part in parts),
+        request.query_params.urlencode(),
+        accepted.format if accepted else '',
+    ])
+    return '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+
+
+def etag_matches(request, etag):
+    """Returns True if the request's ``If-None-Match`` header matches ``etag``."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(',')]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def not_modified(etag):
+    """Returns an empty 304 response carrying ``etag``."""
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response['ETag'] = etag
+    return response
@@ -0,0 +1,144 @@
+"""
+Streaming exports of a user's notification history.
+
+Rows are read with a server-side cursor ``chunk_size`` at a time and each
+chunk is encoded (and optionally gzipped) as soon as it is read, so an
+export holds one chunk in memory however long the history is.
+
+Under ASGI the response body is an async generator over
+``QuerySet.aiterator``; Django would otherwise read a synchronous iterator
+to the end before sending anything. Under WSGI it is a plain generator over
+``QuerySet.iterator``.
+"""
+
+import csv
+import zlib
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from .serializers import NotificationsSerializer
+from . import codec
+
+CSV_FIELDS = ('id', 'notification_type', 'title', 'message', 'read', 'priority', 'created_at')
+
+# Leading characters spreadsheets evaluate as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+
+class _Buffer:
+    """Write target for ``csv.writer`` that collects the encoded lines."""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def take(self):
+        data, self.lines = ''.join(self.lines).encode(), []
+        return data
+
+
+class ExportWriter:
+    """
+    Encodes chunks of notifications in one export format.
+
+    ``start``, ``write`` and ``finish`` return the bytes to send next; with
+    ``compress`` they are pieces of a single gzip stream.
+    """
+
+    def __init__(self, output, compress=False):
+        self.output = output
+        self.serializer = NotificationsSerializer()
+        self.buffer = _Buffer()
+        self.csv = csv.writer(self.buffer)
+        self.gzip = zlib.compressobj(wbits=31) if compress else None
+
+    def _emit(self, data):
+        if self.gzip is None:
+            return data
+        return self.gzip.compress(data)
+
+    def start(self):
+        if self.output == 'csv':
+            self.csv.writerow(CSV_FIELDS)
+            return self._emit(self.buffer.take())
+        return b''
+
+    def write(self, rows):
+        represent = self.serializer.to_representation
+        if self.output == 'csv':
+            for row in rows:
+                data = represent(row)
+                self.csv.writerow([_csv_value(data[field]) for field in CSV_FIELDS])
+            return self._emit(self.buffer.take())
+        return self._emit(b''.join(codec.dumps(represent(row)) + b'\n' for row in rows))
+
+    def finish(self):
+        return self.gzip.flush() if self.gzip is not None else b''
+
+
+def _csv_value(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream(queryset, writer, chunk_size):
+    """Yields the encoded export of ``queryset``."""
+    yield writer.start()
+    rows = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) == chunk_size:
+            yield writer.write(rows)
+            rows = []
+    yield writer.write(rows) + writer.finish()
+
+
+async def astream(queryset, writer, chunk_size):
+    """Async version of ``stream``."""
+    yield writer.start()
+    rows = []
+    async for row in queryset.aiterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) == chunk_size:
+            yield writer.write(rows)
+            rows = []
+    yield writer.write(rows) + writer.finish()
+
+
+def export_response(request, queryset, output='ndjson', compress=False):
+    """
+    Returns a streaming download of ``queryset`` in chronological order.
+
+    Args:
+        request: The Django request, which decides between a sync and an
+            async body
+        queryset: The notifications to export
+        output: A key of ``FORMATS``
+        compress: Gzip the body (served as a ``.gz`` file)
+    """
+    content_type, extension = FORMATS[output]
+    filename = f'notifications.{extension}'
+    if compress:
+        content_type, filename = 'application/gzip', filename + '.gz'
+
+    queryset = queryset.order_by('created_at', 'id')
+    writer = ExportWriter(output, compress)
+    chunk_size = settings.NOTIFICATIONS_EXPORT_CHUNK_SIZE
+    if isinstance(request, ASGIRequest):
+        body = astream(queryset, writer, chunk_size)
+    else:
+        body = stream(queryset, writer, chunk_size)
+
+    response = StreamingHttpResponse(body, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,138 @@
+"""
+Email and push delivery for recipients who are not connected.
+
+``notifications.delivery`` hands notifications for offline users to
+``queue_offline``, which writes one ``ExternalDelivery`` row per channel the
+user has enabled in ``UserPreferences`` (users without preferences get
+both). Push is only queued while ``NOTIFICATIONS_PUSH_SENDER`` is set, so
+nothing piles up that ``dispatch_external`` could not send. The ``dispatch_external`` management command claims due rows with
+``SELECT ... FOR UPDATE SKIP LOCKED``, sends them and deletes them; rows
+that fail are retried with exponential backoff.
+
+Email goes through Django's mail backend. Push goes through the callable
+named by ``NOTIFICATIONS_PUSH_SENDER``, which receives the delivery row.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ExternalDelivery, UserPreferences
+
+logger = logging.getLogger(__name__)
+
+# Longest delay between retries of a delivery that failed to send
+MAX_RETRY_DELAY = 3600
+
+
+def queue_offline(notifications, payloads):
+    """
+    Queues email and push deliveries for notifications of offline users.
+
+    Args:
+        notifications: Notifications whose recipients have no connection;
+            ``recipient`` should already be loaded
+        payloads: Their serialized forms, in the same order
+
+    Returns:
+        The created ``ExternalDelivery`` rows
+    """
+    if not notifications:
+        return []
+    flags = {
+        user_id: (email, push)
+        for user_id, email, push in UserPreferences.objects.filter(
+            user_id__in={n.recipient_id for n in notifications}
+        ).values_list('user_id', 'email_notifications', 'push_notifications')
+    }
+
+    push_configured = bool(settings.NOTIFICATIONS_PUSH_SENDER)
+    rows = []
+    for notification, payload in zip(notifications, payloads):
+        email, push = flags.get(notification.recipient_id, (True, True))
+        if email and notification.recipient.email:
+            rows.append(ExternalDelivery(
+                user_id=notification.recipient_id, channel='email',
+                notification_id=notification.id, payload=payload
+            ))
+        if push and push_configured:
+            rows.append(ExternalDelivery(
+                user_id=notification.recipient_id, channel='push',
+                notification_id=notification.id, payload=payload
+            ))
+    return ExternalDelivery.objects.bulk_create(rows)
+
+
+def send_email(delivery):
+    """Sends one email delivery through the configured mail backend."""
+    send_mail(
+        delivery.payload['title'],
+        delivery.payload['message'],
+        None,
+        [delivery.user.email],
+    )
+
+
+def get_sender(channel):
+    """Returns the callable that sends deliveries of ``channel``."""
+    if channel == 'email':
+        return send_email
+    if not settings.NOTIFICATIONS_PUSH_SENDER:
+        raise ImproperlyConfigured('Push delivery requires NOTIFICATIONS_PUSH_SENDER')
+    return import_string(settings.NOTIFICATIONS_PUSH_SENDER)
+
+
+def dispatch_batch(channel, batch_size=None, sender=None):
+    """
+    Claims and sends one batch of due deliveries of ``channel``.
+
+    Args:
+        channel: ``email`` or ``push``
+        batch_size: Maximum number of deliveries to claim
+        sender: Callable sending one delivery, defaults to ``get_sender``
+
+    Returns:
+        A ``(sent, failed)`` tuple of delivery counts
+    """
+    batch_size = batch_size or settings.NOTIFICATIONS_OUTBOX_BATCH_SIZE
+    sender = sender or get_sender(channel)
+
+    with transaction.atomic():
+        deliveries = list(
+            ExternalDelivery.objects.select_for_update(
+                skip_locked=True, of=('self',)
+            ).select_related('user').filter(
+                channel=channel, available_at__lte=timezone.now()
+            ).order_by('id')[:batch_size]
+        )
+        if not deliveries:
+            return 0, 0
+
+        failed = []
+        for delivery in deliveries:
+            try:
+                sender(delivery)
+            except Exception:
+                logger.exception('Failed to send %s delivery %s', channel, delivery.id)
+                failed.append(delivery)
+
+        failed_ids = {delivery.id for delivery in failed}
+        ExternalDelivery.objects.filter(
+            id__in=[d.id for d in deliveries if d.id not in failed_ids]
+        ).delete()
+
+        now = timezone.now()
+        for delivery in failed:
+            delivery.attempts += 1
+            delivery.available_at = now + timedelta(
+                seconds=min(2 ** delivery.attempts, MAX_RETRY_DELAY)
+            )
+        ExternalDelivery.objects.bulk_update(failed, ['attempts', 'available_at'])
+
+    return len(deliveries) - len(failed), len(failed)
@@ -0,0 +1,139 @@
+"""
+Bulk fan-out of one notification to many recipients.
+
+A broadcast to thousands of users is written in chunks: each chunk is one
+``bulk_create`` of notification rows, one unread-counter upsert, one change
+log append and one outbox insert (or, for recipients who are offline, one
+email/push queue insert), so the cost grows with the number of chunks
+rather than the number of recipients. The per-user events are then
+published concurrently once the transaction commits.
+
+An ``announce`` to everyone subscribed to a type goes further: the
+announcement is stored once and published once, to the type's topic group.
+"""
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Announcement, Notifications, NotificationType, UserPreferences
+from . import delivery, lifecycle
+
+# Recipients written per INSERT statement
+FANOUT_CHUNK_SIZE = 1000
+
+
+def eligible_recipients(users, notification_type):
+    """
+    Filters out users who have opted out of ``notification_type``.
+
+    A user opts out by having preferences with at least one enabled type,
+    none of which is ``notification_type``; users without preferences or
+    with no enabled types at all receive everything.
+
+    Args:
+        users: QuerySet of candidate recipients
+        notification_type: The type being sent
+
+    Returns:
+        The narrowed QuerySet, still evaluated as a single statement
+    """
+    opted_out = UserPreferences.objects.filter(
+        enabled_types__isnull=False
+    ).exclude(
+        enabled_types=notification_type
+    ).values('user_id')
+    return users.exclude(id__in=opted_out)
+
+
+def subscribed_type_ids(user_id):
+    """
+    Returns the IDs of the notification types a user receives.
+
+    Mirrors ``eligible_recipients``: a user without preferences, or with no
+    enabled types, receives every type.
+    """
+    enabled = list(NotificationType.objects.filter(
+        subscribed_users__user_id=user_id
+    ).values_list('id', flat=True))
+    return enabled or list(NotificationType.objects.values_list('id', flat=True))
+
+
+def resolve_recipients(recipients=None, recipient_query=None):
+    """
+    Turns the recipient part of a bulk request into a user QuerySet.
+
+    Args:
+        recipients: Explicit list of user IDs
+        recipient_query: Dict of supported filters (currently ``group``)
+    """
+    users = User.objects.filter(is_active=True)
+    if recipients is not None:
+        return users.filter(id__in=recipients)
+    if recipient_query.get('group'):
+        users = users.filter(groups__name=recipient_query['group'])
+    return users
+
+
+def fan_out(users, notification_type, title, message, priority='MEDIUM'):
+    """
+    Creates one notification per eligible user and queues their delivery.
+
+    Args:
+        users: QuerySet of candidate recipients
+        notification_type: NotificationType of every created notification
+        title: Notification title
+        message: Notification body
+        priority: Notification priority
+
+    Returns:
+        The number of notifications created
+    """
+    recipients = eligible_recipients(users, notification_type).only(
+        'id', 'username', 'email'
+    ).order_by('id')
+
+    created = 0
+    with transaction.atomic():
+        chunk = []
+        for user in recipients.iterator(chunk_size=FANOUT_CHUNK_SIZE):
+            chunk.append(user)
+            if len(chunk) == FANOUT_CHUNK_SIZE:
+                created += _write_chunk(chunk, notification_type, title, message, priority)
+                chunk = []
+        if chunk:
+            created += _write_chunk(chunk, notification_type, title, message, priority)
+    return created
+
+
+def announce(notification_type, title, message, priority='MEDIUM'):
+    """
+    Broadcasts an announcement to every subscriber of ``notification_type``.
+
+    Returns:
+        The created ``Announcement``
+    """
+    with transaction.atomic():
+        announcement = Announcement.objects.create(
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            priority=priority
+        )
+        delivery.deliver_announcement(announcement)
+    return announcement
+
+
+def _write_chunk(users, notification_type, title, message, priority):
+    notifications = Notifications.objects.bulk_create([
+        Notifications(
+            recipient=user,
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            priority=priority
+        )
+        for user in users
+    ])
+    # bulk_create sends no post_save, so the bookkeeping is done explicitly
+    lifecycle.record_created(notifications)
+    return len(notifications)
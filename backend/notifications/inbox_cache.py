@@ -0,0 +1,158 @@
+"""
+Read-through cache of serialized inbox pages.
+
+The first few pages of every user's inbox are cached as already-serialized
+data, so hot reads skip both the ORM and the DRF serializer. Cache keys embed
+a per-user generation number; writes bump the generation instead of deleting
+keys, which makes every previously cached page unreachable in one cache write
+and lets the stale entries simply expire. The generation (which the inbox
+ETag is derived from) expires too, after ``NOTIFICATIONS_INBOX_CACHE_TIMEOUT``
+like the pages, so a write that somehow missed its bump is served stale for
+at most that long rather than forever.
+
+Pages are stored JSON-encoded with ``notifications.codec`` rather than
+pickled, which is both faster and smaller for this kind of data.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notifications
+from .pagination import apaginate_keyset, cursor_page, paginate_keyset
+from .serializers import NotificationsSerializer
+from . import codec, unread
+
+
+def _generation_key(user_id):
+    return f'inbox_generation_{user_id}'
+
+
+def _generation_timeout():
+    # As long as the pages; shorter would only churn ETags and pages early
+    return settings.NOTIFICATIONS_INBOX_CACHE_TIMEOUT
+
+
+def _new_generation():
+    # Nanosecond timestamps are unique enough and need no read-modify-write
+    return time.time_ns()
+
+
+def get_generation(user_id):
+    """Returns the current inbox generation of a user, creating one if needed."""
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # add() so concurrent readers settle on the same generation
+        cache.add(key, _new_generation(), timeout=_generation_timeout())
+        generation = cache.get(key)
+    return generation
+
+
+async def aget_generation(user_id):
+    """Async version of ``get_generation``."""
+    key = _generation_key(user_id)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, _new_generation(), timeout=_generation_timeout())
+        generation = await cache.aget(key)
+    return generation
+
+
+def bump_generation(user_id):
+    """
+    Invalidates every cached inbox page of a user.
+
+    The bump is deferred until the surrounding transaction commits so a
+    concurrent reader cannot cache pre-commit data under the new generation.
+    """
+    bump_generations([user_id])
+
+
+def bump_generations(user_ids):
+    """Invalidates the cached inbox pages of many users with one cache write."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    def bump():
+        generation = _new_generation()
+        cache.set_many(
+            {_generation_key(user_id): generation for user_id in user_ids},
+            timeout=_generation_timeout()
+        )
+
+    transaction.on_commit(bump)
+
+
+def _page_key(user, cursor, page_size, generation):
+    return f'inbox_page_{user.id}_{generation}_{page_size}_{cursor or ""}'
+
+
+def _inbox(user):
+    return unread.with_watermark_read(
+        Notifications.objects.filter(recipient=user).select_related('recipient')
+    )
+
+
+def _serialize_page(rows, next_cursor):
+    return {
+        'results': [dict(item) for item in NotificationsSerializer(rows, many=True).data],
+        'next_cursor': next_cursor,
+    }
+
+
+def get_inbox_page(user, cursor=None, page_size=None, generation=None):
+    """
+    Returns one serialized page of a user's unfiltered inbox.
+
+    Pages shallower than ``NOTIFICATIONS_INBOX_CACHE_PAGES`` are served from
+    and written to the cache; deeper pages always hit the database.
+
+    Args:
+        user: The inbox owner
+        cursor: Cursor returned with the previous page, or None for the first
+        page_size: Maximum number of notifications on the page
+        generation: The user's inbox generation, when the caller already
+            read it (e.g. for an ETag)
+
+    Returns:
+        A dict with ``results`` (serialized notifications) and ``next_cursor``
+
+    Raises:
+        InvalidCursor: If ``cursor`` is malformed
+    """
+    page_size = page_size or settings.NOTIFICATIONS_PAGE_SIZE
+    cacheable = cursor_page(cursor) < settings.NOTIFICATIONS_INBOX_CACHE_PAGES
+    if cacheable:
+        if generation is None:
+            generation = get_generation(user.id)
+        key = _page_key(user, cursor, page_size, generation)
+        cached = cache.get(key)
+        if cached is not None:
+            return codec.loads(cached)
+
+    page = _serialize_page(*paginate_keyset(_inbox(user), cursor, page_size))
+    if cacheable:
+        cache.set(key, codec.dumps(page), timeout=settings.NOTIFICATIONS_INBOX_CACHE_TIMEOUT)
+    return page
+
+
+async def aget_inbox_page(user, cursor=None, page_size=None, generation=None):
+    """Async version of ``get_inbox_page``."""
+    page_size = page_size or settings.NOTIFICATIONS_PAGE_SIZE
+    cacheable = cursor_page(cursor) < settings.NOTIFICATIONS_INBOX_CACHE_PAGES
+    if cacheable:
+        if generation is None:
+            generation = await aget_generation(user.id)
+        key = _page_key(user, cursor, page_size, generation)
+        cached = await cache.aget(key)
+        if cached is not None:
+            return codec.loads(cached)
+
+    page = _serialize_page(*await apaginate_keyset(_inbox(user), cursor, page_size))
+    if cacheable:
+        await cache.aset(key, codec.dumps(page), timeout=settings.NOTIFICATIONS_INBOX_CACHE_TIMEOUT)
+    return page
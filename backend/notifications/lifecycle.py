@@ -0,0 +1,88 @@
+"""
+Bookkeeping shared by every write of a notification.
+
+Creating, editing or deleting a notification moves the recipient's unread
+counters, invalidates their cached inbox pages (and with them the inbox
+ETag), appends to their change log and, for new notifications, queues
+real-time delivery. The receivers below do all of it for ``save()`` and
+``delete()`` so every producer (the API, the admin, management commands,
+scripts calling ``Notifications.objects.create``) keeps the derived state
+in step; code that bypasses signals (``bulk_create`` in
+``notifications.fanout``) calls ``record_created`` itself.
+
+Read-state changes that update rows in bulk (``unread.mark_read``,
+``unread.mark_all_read``) do their own bookkeeping.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Notifications
+from .serializers import NotificationsSerializer
+from . import changelog, delivery, inbox_cache, unread
+
+
+def record_created(notifications):
+    """
+    Counts, logs and delivers new notifications, a chunk at a time.
+
+    Args:
+        notifications: The saved notifications, with ``recipient`` loaded
+    """
+    notifications = list(notifications)
+    if not notifications:
+        return
+    events = [delivery.notification_event(notification) for notification in notifications]
+    unread.record_created_many(notifications)
+    inbox_cache.bump_generations({notification.recipient_id for notification in notifications})
+    changelog.record_many(
+        (notification.recipient_id, 'created', notification.id, event['notification'])
+        for notification, (_, event) in zip(notifications, events)
+    )
+    delivery.deliver(notifications, events)
+
+
+@receiver(pre_save, sender=Notifications, dispatch_uid='remember_notification_state')
+def remember_state(sender, instance, raw=False, using=None, **kwargs):
+    """
+    Keeps the stored read state, type and priority of an edited notification.
+
+    Inside a transaction the row is locked until it commits, so a concurrent
+    edit or ``mark_read`` cannot change the state between this read and the
+    counter update in ``notification_saved``.
+    """
+    instance._stored_state = None
+    if raw or instance._state.adding:
+        return
+    stored = Notifications.objects.using(using).filter(pk=instance.pk)
+    if transaction.get_connection(using).in_atomic_block:
+        stored = stored.select_for_update()
+    instance._stored_state = stored.values_list('read', 'notification_type_id', 'priority').first()
+
+
+@receiver(post_save, sender=Notifications, dispatch_uid='notification_saved')
+def notification_saved(sender, instance, created=False, raw=False, **kwargs):
+    """Does the bookkeeping of every notification saved through ``save()``."""
+    if raw:
+        return
+    if created:
+        record_created([instance])
+        return
+
+    stored = getattr(instance, '_stored_state', None)
+    if stored is not None:
+        was_read, old_type_id, old_priority = stored
+        unread.record_updated(instance, was_read, old_type_id, old_priority)
+    inbox_cache.bump_generation(instance.recipient_id)
+    changelog.record(
+        instance.recipient_id, 'updated', instance.id, NotificationsSerializer(instance).data
+    )
+
+
+@receiver(post_delete, sender=Notifications, dispatch_uid='notification_deleted')
+def notification_deleted(sender, instance, **kwargs):
+    """Does the bookkeeping of every notification deleted through the ORM."""
+    unread.record_deleted(instance)
+    inbox_cache.bump_generation(instance.recipient_id)
+    changelog.record(instance.recipient_id, 'deleted', instance.id)
@@ -0,0 +1,37 @@
+"""
+Management command to compact the inbox change log.
+
+Run it daily from cron. Entries older than the retention window are deleted
+and each affected user's floor is raised, so clients that have been offline
+for longer than the window are told to re-download their inbox.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from notifications import changelog
+
+class Command(BaseCommand):
+    help = 'Delete inbox change log entries older than the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.NOTIFICATIONS_CHANGELOG_RETENTION_DAYS,
+            help='Keep entries recorded within this many days'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=changelog.COMPACT_BATCH_SIZE,
+            help='Number of entries deleted per transaction'
+        )
+
+    def handle(self, *args, **options):
+        deleted = changelog.compact(
+            older_than=timedelta(days=options['days']),
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} change log entries older than {options["days"]} days'
+        ))
@@ -0,0 +1,59 @@
+"""
+Management command that sends queued email and push deliveries.
+
+Notifications for users without an open WebSocket are queued by channel;
+run one instance per channel (or several, since batches are claimed with
+SKIP LOCKED) next to the outbox dispatcher.
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from notifications import external
+
+class Command(BaseCommand):
+    help = 'Send queued email and push deliveries for offline users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--channel',
+            choices=['email', 'push'],
+            required=True,
+            help='Which deliveries to send'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.NOTIFICATIONS_OUTBOX_BATCH_SIZE,
+            help='Maximum number of deliveries claimed per transaction'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep when the queue is empty'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit instead of running forever'
+        )
+
+    def handle(self, *args, **options):
+        channel = options['channel']
+        batch_size = options['batch_size']
+        sender = external.get_sender(channel)
+        total_sent = 0
+        self.stdout.write(f'Dispatching {channel} deliveries...')
+        try:
+            while True:
+                sent, failed = external.dispatch_batch(channel, batch_size, sender)
+                total_sent += sent
+                if failed:
+                    self.stderr.write(f'{failed} deliveries failed and will be retried')
+                if sent + failed < batch_size:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Sent {total_sent} {channel} deliveries'))
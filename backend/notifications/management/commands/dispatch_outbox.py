@@ -0,0 +1,51 @@
+"""
+Management command that publishes queued outbox events to the channel layer.
+
+Run one or more instances alongside the web workers; they share the queue
+safely because each batch is claimed with SKIP LOCKED.
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from notifications import outbox
+
+class Command(BaseCommand):
+    help = 'Publish queued real-time events from the outbox to the channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.NOTIFICATIONS_OUTBOX_BATCH_SIZE,
+            help='Maximum number of events claimed per transaction'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=0.2,
+            help='Seconds to sleep when the outbox is empty'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the outbox once and exit instead of running forever'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total_sent = 0
+        self.stdout.write('Dispatching outbox events...')
+        try:
+            while True:
+                sent, failed = outbox.dispatch_batch(batch_size)
+                total_sent += sent
+                if failed:
+                    self.stderr.write(f'{failed} events failed and will be retried')
+                if sent + failed < batch_size:
+                    # Outbox drained; idle briefly unless asked to stop
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Dispatched {total_sent} events'))
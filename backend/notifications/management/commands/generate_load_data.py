@@ -0,0 +1,323 @@
+"""
+Management command to generate high-volume synthetic data for capacity testing.
+
+Unlike generate_sample_data, nothing is created one row at a time: users are
+inserted with bulk_create, notifications are streamed from a generator into
+PostgreSQL COPY (or chunked bulk_create), and the work can be spread over
+several processes. Given the same --seed and --now, a fresh database gets
+the same data whatever the --method and number of --workers: users are
+split into fixed blocks, each generated from a seed derived from --seed
+and the block's position, and timestamps count back from --now instead of
+the clock.
+"""
+import io
+import random
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+from multiprocessing import get_context
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from notifications.models import Notifications, NotificationType
+from notifications import inbox_cache, unread
+
+NOTIFICATION_TYPES = {
+    'TASK_UPDATED': 'Task has been updated',
+    'TASK_ASSIGNED': 'Task has been assigned',
+    'TASK_COMPLETED': 'Task has been completed',
+}
+TASK_TITLES = [
+    'Update documentation',
+    'Review pull request',
+    'Deploy to production',
+    'Fix critical bug',
+    'Implement new feature',
+    'Optimize database queries',
+    'Write unit tests',
+    'Update dependencies',
+    'Refactor legacy code',
+    'Setup monitoring',
+]
+MESSAGES = {
+    'TASK_UPDATED': 'Task updated: {}',
+    'TASK_ASSIGNED': 'You have been assigned to: {}',
+    'TASK_COMPLETED': 'Task completed: {}',
+}
+PRIORITIES = ['LOW', 'MEDIUM', 'HIGH']
+PASSWORD = 'password123'
+
+# Users per block of notifications; each block has its own seed
+SEED_BLOCK = 1000
+
+
+class RowStream(io.RawIOBase):
+    """Read-only file object that pulls COPY lines from a generator on demand."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while len(self.buffer) < len(target):
+            try:
+                self.buffer += next(self.lines).encode()
+            except StopIteration:
+                break
+        size = min(len(target), len(self.buffer))
+        target[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+def anchor_time(value):
+    """Parses the --now option: an ISO 8601 datetime, UTC unless it says otherwise."""
+    anchor = parse_datetime(value)
+    if anchor is None:
+        raise ValueError(value)
+    if timezone.is_naive(anchor):
+        anchor = timezone.make_aware(anchor, dt_timezone.utc)
+    return anchor
+
+
+def block_seed(seed, start):
+    """Seed of the block of users starting at position ``start``."""
+    return f'{seed}:{start}'
+
+
+def generate_notifications(user_ids, per_user, type_ids, seed, days, now):
+    """
+    Yields notification field tuples for ``user_ids``.
+
+    Args:
+        user_ids: Recipients to generate notifications for
+        per_user: Number of notifications per recipient
+        type_ids: Mapping of notification type name to primary key
+        seed: Seed for this stream; equal seeds give identical rows
+        days: Notifications are spread over this many days before ``now``
+        now: Time the notification timestamps count back from
+
+    Yields:
+        ``(recipient_id, type_id, title, message, created_at, read, priority)``
+    """
+    rng = random.Random(seed)
+    names = sorted(type_ids)
+    for user_id in user_ids:
+        for _ in range(per_user):
+            type_name = rng.choice(names)
+            title = rng.choice(TASK_TITLES)
+            yield (
+                user_id,
+                type_ids[type_name],
+                title,
+                MESSAGES[type_name].format(title),
+                now - timedelta(seconds=rng.randrange(days * 86400)),
+                rng.random() < 0.5,
+                rng.choice(PRIORITIES),
+            )
+
+
+def _bulk_write(notifications):
+    """
+    Inserts ``notifications`` with bulk_create and then restores the
+    generated timestamps that ``auto_now_add`` replaced with the insert time.
+    """
+    created_at = [notification.created_at for notification in notifications]
+    Notifications.objects.bulk_create(notifications)
+    for notification, timestamp in zip(notifications, created_at):
+        notification.created_at = timestamp
+    Notifications.objects.bulk_update(notifications, ['created_at'])
+
+
+def load_notifications(job):
+    """
+    Writes the notifications of one block of users and returns its unread
+    tally.
+
+    Runs in a worker process when --workers is above one, so it only takes
+    and returns picklable values.
+    """
+    user_ids, per_user, type_ids, seed, days, now, method, chunk_size = job
+    rows = generate_notifications(user_ids, per_user, type_ids, seed, days, now)
+    unread_counts = Counter()
+
+    def tally(rows):
+        for row in rows:
+            if not row[5]:
+                unread_counts[(row[0], row[1])] += 1
+            yield row
+
+    rows = tally(rows)
+    with transaction.atomic():
+        if method == 'copy':
+            lines = (
+                f'{r[0]}\t{r[1]}\t{r[2]}\t{r[3]}\t{r[4].isoformat()}\t{"t" if r[5] else "f"}\t{r[6]}\n'
+                for r in rows
+            )
+            with connection.cursor() as cursor:
+                cursor.cursor.copy_expert(
+                    f'COPY {Notifications._meta.db_table} '
+                    f'(recipient_id, notification_type_id, title, message, created_at, read, priority) '
+                    f'FROM STDIN',
+                    io.BufferedReader(RowStream(lines), buffer_size=1 << 16)
+                )
+        else:
+            batch = []
+            for r in rows:
+                batch.append(Notifications(
+                    recipient_id=r[0], notification_type_id=r[1], title=r[2],
+                    message=r[3], created_at=r[4], read=r[5], priority=r[6]
+                ))
+                if len(batch) == chunk_size:
+                    _bulk_write(batch)
+                    batch = []
+            _bulk_write(batch)
+        unread.adjust_counters(unread_counts)
+    return sum(unread_counts.values())
+
+
+def _init_worker():
+    # Forked children must not share the parent's database connection
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Generate millions of synthetic users and notifications for capacity testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Number of synthetic users to create'
+        )
+        parser.add_argument(
+            '--notifications-per-user',
+            type=int,
+            default=100,
+            help='Number of notifications per user'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed; with the same --now, the same seed produces the same data'
+        )
+        parser.add_argument(
+            '--now',
+            type=anchor_time,
+            default=None,
+            help='ISO 8601 time the notification timestamps count back from '
+                 '(default: the current time)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes writing notifications in parallel'
+        )
+        parser.add_argument(
+            '--method',
+            choices=['copy', 'bulk'],
+            default='copy',
+            help='Write notifications with COPY (fastest) or chunked bulk_create'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk_create statement'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Spread notification timestamps over this many days before --now'
+        )
+        parser.add_argument(
+            '--fast-hasher',
+            action='store_true',
+            help='Hash the shared password once instead of once per user'
+        )
+
+    def _create_users(self, count, seed, fast_hasher, workers, chunk_size):
+        """Bulk-inserts synthetic users and returns their IDs."""
+        prefix = f'load{seed}_'
+        usernames = [f'{prefix}{i}' for i in range(count)]
+        if User.objects.filter(username__in=usernames[:1]).exists():
+            raise CommandError(
+                f'Users with prefix {prefix} already exist; pick another --seed'
+            )
+
+        if fast_hasher:
+            password = make_password(PASSWORD)
+            passwords = [password] * count
+        elif workers > 1:
+            with get_context('fork').Pool(workers) as pool:
+                passwords = pool.map(make_password, [PASSWORD] * count, chunksize=64)
+        else:
+            passwords = [make_password(PASSWORD) for _ in range(count)]
+
+        for start in range(0, count, chunk_size):
+            User.objects.bulk_create([
+                User(username=username, email=f'{username}@example.com', password=password)
+                for username, password in zip(
+                    usernames[start:start + chunk_size],
+                    passwords[start:start + chunk_size]
+                )
+            ])
+        return list(
+            User.objects.filter(username__startswith=prefix)
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    def handle(self, *args, **options):
+        method = options['method']
+        if method == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError('COPY requires PostgreSQL; use --method bulk')
+        workers = max(1, options['workers'])
+        seed = options['seed']
+
+        started = timezone.now()
+        type_ids = {
+            name: NotificationType.objects.get_or_create(
+                name=name, defaults={'description': description}
+            )[0].id
+            for name, description in NOTIFICATION_TYPES.items()
+        }
+
+        self.stdout.write(f'Creating {options["users"]} users...')
+        user_ids = self._create_users(
+            options['users'], seed, options['fast_hasher'], workers, options['chunk_size']
+        )
+
+        # Blocks and their seeds do not depend on --workers, only on which
+        # users they hold, so any number of workers writes the same rows
+        now = options['now'] or started
+        jobs = [
+            (
+                user_ids[start:start + SEED_BLOCK], options['notifications_per_user'], type_ids,
+                block_seed(seed, start), options['days'], now, method, options['chunk_size']
+            )
+            for start in range(0, len(user_ids), SEED_BLOCK)
+        ]
+        total = len(user_ids) * options['notifications_per_user']
+        self.stdout.write(f'Writing {total} notifications with {workers} worker(s)...')
+        if workers == 1:
+            unread_total = sum(map(load_notifications, jobs))
+        else:
+            connections.close_all()
+            with get_context('fork').Pool(workers, initializer=_init_worker) as pool:
+                unread_total = sum(pool.map(load_notifications, jobs))
+
+        inbox_cache.bump_generations(user_ids)
+        elapsed = (timezone.now() - started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(user_ids)} users and {total} notifications '
+            f'({unread_total} unread) in {elapsed:.1f}s'
+        ))
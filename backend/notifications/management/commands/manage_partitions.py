@@ -0,0 +1,110 @@
+"""
+Management command to maintain the monthly partitions of the notifications table.
+
+Run it daily from cron: it pre-creates partitions for upcoming months and
+detaches (or drops) partitions that have aged past the retention window.
+"""
+from collections import Counter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from notifications import partitioning, unread
+from notifications.models import ReadWatermark
+
+class Command(BaseCommand):
+    help = 'Create upcoming notification partitions and detach or drop expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--premake',
+            type=int,
+            default=settings.NOTIFICATIONS_PARTITION_PREMAKE_MONTHS,
+            help='Number of future months to create partitions for'
+        )
+        parser.add_argument(
+            '--retention',
+            type=int,
+            default=settings.NOTIFICATIONS_RETENTION_MONTHS,
+            help='Number of past months to keep attached (0 keeps everything)'
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Drop expired partitions instead of only detaching them'
+        )
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Convert the plain notifications table to a partitioned one first'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would change without touching the database'
+        )
+
+    def _uncount_partition(self, name):
+        """Removes a partition's unread rows from the unread counters."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT recipient_id, notification_type_id, COUNT(*) '
+                f'FROM {connection.ops.quote_name(name)} n WHERE NOT read '
+                f'AND NOT EXISTS (SELECT 1 FROM {ReadWatermark._meta.db_table} w '
+                f'WHERE w.user_id = n.recipient_id AND w.read_before >= n.created_at '
+                f'AND (w.notification_type_id IS NULL '
+                f'OR w.notification_type_id = n.notification_type_id)) '
+                f'GROUP BY recipient_id, notification_type_id'
+            )
+            deltas = Counter({
+                (user_id, type_id): -count for user_id, type_id, count in cursor.fetchall()
+            })
+        unread.adjust_counters(deltas)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires PostgreSQL')
+
+        dry_run = options['dry_run']
+        if options['convert']:
+            if partitioning.is_partitioned(connection):
+                self.stdout.write('Notifications table is already partitioned')
+            elif not dry_run:
+                with transaction.atomic():
+                    partitioning.convert_to_partitioned(connection, options['premake'])
+                self.stdout.write(self.style.SUCCESS('Converted notifications table to partitions'))
+
+        if not partitioning.is_partitioned(connection):
+            if not (dry_run and options['convert']):
+                raise CommandError(
+                    'Notifications table is not partitioned; run with --convert first'
+                )
+            return
+
+        current = partitioning.month_start(timezone.now())
+        for offset in range(options['premake'] + 1):
+            month = partitioning.add_months(current, offset)
+            name = partitioning.partition_name(month)
+            if dry_run:
+                self.stdout.write(f'Would ensure partition {name}')
+                continue
+            with transaction.atomic():
+                if partitioning.create_partition(connection, month):
+                    self.stdout.write(f'Created partition {name}')
+
+        if options['retention'] <= 0:
+            return
+
+        # Partitions whose whole month lies before the cutoff have expired
+        cutoff = partitioning.add_months(current, -options['retention'])
+        verb, action = ('drop', 'Dropped') if options['drop'] else ('detach', 'Detached')
+        for month, name in partitioning.list_partitions(connection):
+            if month >= cutoff:
+                break
+            if dry_run:
+                self.stdout.write(f'Would {verb} partition {name}')
+                continue
+            with transaction.atomic():
+                self._uncount_partition(name)
+                partitioning.detach_partition(connection, name, drop=options['drop'])
+            self.stdout.write(f'{action} partition {name}')
@@ -0,0 +1,58 @@
+"""
+Management command to find and repair drift in the unread counter table.
+"""
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from notifications import unread
+
+class Command(BaseCommand):
+    help = 'Recompute per-user unread counters from the notifications table and repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of users reconciled per transaction'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only reconcile this user ID (may be repeated)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without repairing it'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        repair = not options['dry_run']
+        users = User.objects.order_by('id').values_list('id', flat=True)
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+
+        checked = 0
+        repaired = 0
+        last_id = 0
+        while True:
+            # Walk users by primary key so each batch is an index range scan
+            batch = list(users.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            checked += len(batch)
+
+            for user_id, type_id, stored, actual in unread.reconcile(batch, repair=repair):
+                repaired += 1
+                self.stdout.write(
+                    f'User {user_id}, type {type_id}: counter was {stored}, actual {actual}'
+                )
+
+        verb = 'repaired' if repair else 'found drift in'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} users, {verb} {repaired} counters'
+        ))
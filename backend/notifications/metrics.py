@@ -0,0 +1,59 @@
+"""
+In-process counters and gauges for the real-time delivery path.
+
+Each worker process keeps its own values; ``snapshot`` returns them for the
+staff-only metrics endpoint or for a scraper to collect. Updates take a lock
+so they are safe from both the event loop and sync worker threads.
+"""
+
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_maxima = {}
+
+
+def increment(name, value=1):
+    """Adds ``value`` to the counter ``name``."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def adjust_gauge(name, delta):
+    """Moves the gauge ``name`` by ``delta`` and tracks its high-water mark."""
+    with _lock:
+        value = _gauges.get(name, 0) + delta
+        _gauges[name] = value
+        if value > _maxima.get(name, 0):
+            _maxima[name] = value
+
+
+def observe_max(name, value):
+    """Records ``value`` if it is the largest seen for ``name``."""
+    with _lock:
+        if value > _maxima.get(name, 0):
+            _maxima[name] = value
+
+
+def snapshot():
+    """
+    Returns the current metric values.
+
+    Returns:
+        A dict with ``counters``, ``gauges`` and ``maxima`` mappings
+    """
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+            'maxima': dict(_maxima),
+        }
+
+
+def reset():
+    """Clears every metric (used by tests)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _maxima.clear()
@@ -1,23 +1,52 @@
+from channels.auth import AuthMiddlewareStack
 from channels.middleware import BaseMiddleware
 from django.contrib.auth.models import AnonymousUser
-from rest_framework.authtoken.models import Token
 from urllib.parse import parse_qs
 from channels.db import database_sync_to_async
+from . import authentication, tokens
 
 @database_sync_to_async
 def get_user(token_key):
+    token = authentication.lookup(token_key)
+    return token.user if token is not None else AnonymousUser()
+
+async def get_signed_user(access_token):
+    # Only the periodic denylist reload touches the database
+    if tokens.denylist.stale():
+        await database_sync_to_async(tokens.denylist.load)()
     try:
-        token = Token.objects.get(key=token_key)
-        return token.user
-    except Token.DoesNotExist:
+        return tokens.claims_user(tokens.verify_access(access_token))
+    except tokens.InvalidToken:
         return AnonymousUser()
 
 class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates WebSocket and stream connections from an ``?access_token=`` (signed,
+    see ``notifications.tokens``) or ``?token=`` query parameter.
+
+    Signed tokens are verified without the database; database tokens are
+    resolved through the cache shared with the REST API (see
+    ``notifications.authentication``). Without either, the user set by an
+    outer middleware, if any, is kept.
+    """
+
     async def __call__(self, scope, receive, send):
         query_string = scope.get('query_string', b'').decode()
         query_params = parse_qs(query_string)
         
+        access_token = query_params.get('access_token', [None])[0]
         token_key = query_params.get('token', [None])[0]
-        scope['user'] = await get_user(token_key) if token_key else AnonymousUser()
+        if access_token:
+            scope['user'] = await get_signed_user(access_token)
+        elif token_key:
+            scope['user'] = await get_user(token_key)
+        elif 'user' not in scope:
+            scope['user'] = AnonymousUser()
         
         return await super().__call__(scope, receive, send)
+
+def TokenAuthMiddlewareStack(inner):
+    """
+    Session authentication with token authentication taking precedence.
+    """
+    return AuthMiddlewareStack(TokenAuthMiddleware(inner))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_remove_notifications_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='notifications',
+            options={'ordering': ['-created_at', '-id'], 'verbose_name_plural': 'notifications'},
+        ),
+        migrations.AddIndex(
+            model_name='notifications',
+            index=models.Index(fields=['recipient', '-created_at', '-id'], name='notif_recipient_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0004_notifications_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0, help_text='Number of unread notifications of this type')),
+                ('notification_type', models.ForeignKey(help_text='Category of notification being counted', on_delete=django.db.models.deletion.CASCADE, to='notifications.notificationtype')),
+                ('user', models.ForeignKey(help_text='User whose unread notifications are counted', on_delete=django.db.models.deletion.CASCADE, related_name='unread_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='unreadcounter',
+            constraint=models.UniqueConstraint(fields=('user', 'notification_type'), name='unique_unread_counter'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def partition_notifications(apps, schema_editor):
+    """Converts the notifications table to monthly partitions when opted in."""
+    from notifications import partitioning
+
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or not settings.NOTIFICATIONS_PARTITIONING:
+        return
+    if not partitioning.is_partitioned(connection):
+        partitioning.convert_to_partitioned(
+            connection, settings.NOTIFICATIONS_PARTITION_PREMAKE_MONTHS
+        )
+
+
+def unpartition_notifications(apps, schema_editor):
+    from notifications import partitioning
+
+    connection = schema_editor.connection
+    if partitioning.is_partitioned(connection):
+        partitioning.convert_to_plain(connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_unreadcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_notifications, unpartition_notifications),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:14
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_partition_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.CharField(help_text='Channel layer group the event is sent to', max_length=100)),
+                ('payload', models.JSONField(help_text='Channel layer message including its type')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Timestamp when the event was queued')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Earliest time the dispatcher may publish the event')),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Number of failed publish attempts')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0007_outboxevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_before', models.DateTimeField(help_text='Notifications created at or before this time count as read')),
+                ('notification_type', models.ForeignKey(blank=True, help_text='Category covered by the watermark; empty means all categories', null=True, on_delete=django.db.models.deletion.CASCADE, to='notifications.notificationtype')),
+                ('user', models.ForeignKey(help_text='User who marked their notifications read', on_delete=django.db.models.deletion.CASCADE, related_name='read_watermarks', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='readwatermark',
+            constraint=models.UniqueConstraint(fields=('user', 'notification_type'), name='unique_read_watermark'),
+        ),
+        migrations.AddConstraint(
+            model_name='readwatermark',
+            constraint=models.UniqueConstraint(condition=models.Q(('notification_type__isnull', True)), fields=('user',), name='unique_global_read_watermark'),
+        ),
+    ]
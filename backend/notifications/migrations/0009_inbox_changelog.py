@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0008_readwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_seq', models.BigIntegerField(default=0, help_text='Sequence number of the most recent change')),
+                ('floor', models.BigIntegerField(default=0, help_text='Highest sequence number removed by compaction')),
+                ('user', models.OneToOneField(help_text='User whose inbox changes are numbered', on_delete=django.db.models.deletion.CASCADE, related_name='inbox_sequence', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InboxChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField(help_text='Per-user sequence number of the change')),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('read', 'Read'), ('read_all', 'Read all'), ('deleted', 'Deleted')], help_text='Kind of change', max_length=10)),
+                ('notification_id', models.BigIntegerField(blank=True, help_text='ID of the affected notification', null=True)),
+                ('data', models.JSONField(blank=True, help_text='Serialized notification or action details', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, help_text='Timestamp when the change was recorded')),
+                ('user', models.ForeignKey(help_text='User whose inbox changed', on_delete=django.db.models.deletion.CASCADE, related_name='inbox_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user', 'seq'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='inboxchange',
+            constraint=models.UniqueConstraint(fields=('user', 'seq'), name='unique_inbox_change_seq'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0009_inbox_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExternalDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('email', 'Email'), ('push', 'Push')], help_text='Delivery channel', max_length=10)),
+                ('notification_id', models.BigIntegerField(help_text='ID of the notification being announced')),
+                ('payload', models.JSONField(help_text='Serialized notification')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Timestamp when the delivery was queued')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Earliest time the dispatcher may send the delivery')),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Number of failed send attempts')),
+                ('user', models.ForeignKey(help_text='User to notify', on_delete=django.db.models.deletion.CASCADE, related_name='external_deliveries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'external deliveries',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['channel', 'available_at'], name='external_delivery_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0010_externaldelivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Announcement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(help_text='Brief heading of the announcement', max_length=200)),
+                ('message', models.TextField(help_text='Full content of the announcement')),
+                ('priority', models.CharField(choices=[('LOW', 'Low'), ('MEDIUM', 'Medium'), ('HIGH', 'High')], default='MEDIUM', help_text='Priority level of the announcement', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Timestamp when the announcement was sent')),
+                ('notification_type', models.ForeignKey(help_text='Category announced', on_delete=django.db.models.deletion.CASCADE, related_name='announcements', to='notifications.notificationtype')),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+    ]
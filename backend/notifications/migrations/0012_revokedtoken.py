@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0011_announcement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Revoked token ID or user', max_length=64, unique=True)),
+                ('revoked_at', models.DateTimeField(help_text='Timestamp of the revocation')),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='Timestamp after which the entry can no longer match a token')),
+            ],
+        ),
+    ]
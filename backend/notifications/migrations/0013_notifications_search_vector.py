@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def add_search_vector(apps, schema_editor):
+    """Adds the generated full-text column and GIN index used for search."""
+    from notifications import search
+
+    search.install_search_vector(schema_editor.connection)
+
+
+def remove_search_vector(apps, schema_editor):
+    from notifications import search
+
+    search.uninstall_search_vector(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0012_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vector, remove_search_vector),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0013_notifications_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_id', models.BigIntegerField(default=0, help_text='Highest notification ID rolled up')),
+                ('updated_at', models.DateTimeField(help_text='When the rollups were last advanced', null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='UTC day the notifications were created')),
+                ('priority', models.CharField(choices=[('LOW', 'Low'), ('MEDIUM', 'Medium'), ('HIGH', 'High')], help_text='Priority level of the notifications', max_length=10)),
+                ('cohort', models.DateField(help_text='Month the recipients signed up')),
+                ('total', models.IntegerField(default=0, help_text='Number of notifications created')),
+                ('read', models.IntegerField(default=0, help_text='Number of those notifications that are read')),
+                ('notification_type', models.ForeignKey(help_text='Category of the notifications', on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='notifications.notificationtype')),
+            ],
+            options={
+                'ordering': ['day', 'notification_type', 'priority', 'cohort'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='notificationrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'notification_type', 'priority', 'cohort'), name='unique_notification_rollup'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:54
+
+from django.db import migrations, models
+import notifications.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0014_notificationrollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userpreferences',
+            name='push_notifications',
+            field=models.BooleanField(default=notifications.models.push_enabled_by_default, help_text='Whether to receive push notifications'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_existing_watermarks(apps, schema_editor):
+    """Existing watermarks were counted in the rollups when they moved."""
+    ReadWatermark = apps.get_model('notifications', 'ReadWatermark')
+    RolledUpWatermark = apps.get_model('notifications', 'RolledUpWatermark')
+    RolledUpWatermark.objects.bulk_create([
+        RolledUpWatermark(watermark_id=pk, read_before=read_before)
+        for pk, read_before in ReadWatermark.objects.values_list('pk', 'read_before')
+    ], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0015_userpreferences_push_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RolledUpWatermark',
+            fields=[
+                ('watermark', models.OneToOneField(help_text='Watermark counted in the rollups', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rolled_up', serialize=False, to='notifications.readwatermark')),
+                ('read_before', models.DateTimeField(help_text='Notifications created at or before this time are counted read')),
+            ],
+        ),
+        migrations.RunPython(count_existing_watermarks, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,14 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Create your models here.
 
+def push_enabled_by_default():
+    """Push is on by default only where a push sender is configured."""
+    return bool(settings.NOTIFICATIONS_PUSH_SENDER)
+
 class NotificationType(models.Model):
     name = models.CharField(max_length=50, unique=True)
     description = models.TextField()
@@ -84,8 +90,15 @@ class Notifications(models.Model):
         """
         Model metadata options
         """
-        ordering = ['-created_at']  # Most recent notifications first
+        ordering = ['-created_at', '-id']  # Most recent notifications first
         verbose_name_plural = 'notifications'
+        indexes = [
+            # Backs keyset pagination of a user's inbox (see pagination.py)
+            models.Index(
+                fields=['recipient', '-created_at', '-id'],
+                name='notif_recipient_keyset_idx'
+            ),
+        ]
 
 class UserPreferences(models.Model):
     """
@@ -114,7 +127,7 @@ class UserPreferences(models.Model):
         help_text="Whether to receive email notifications"
     )
     push_notifications = models.BooleanField(
-        default=True,
+        default=push_enabled_by_default,
         help_text="Whether to receive push notifications"
     )
     enabled_types = models.ManyToManyField(
@@ -132,3 +145,519 @@ class UserPreferences(models.Model):
 
     class Meta:
         verbose_name_plural = 'user preferences'
+
+class UnreadCounter(models.Model):
+    """
+    Denormalized count of a user's unread notifications of one type.
+
+    Kept up to date by the write paths in ``notifications.unread`` so badge
+    counts can be read without touching the notifications table. The
+    ``reconcile_unread_counters`` management command repairs any drift.
+
+    Fields:
+        user: The User whose unread notifications are counted
+        notification_type: The category being counted
+        count: Number of unread notifications of that type
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='unread_counters',
+        help_text="User whose unread notifications are counted"
+    )
+    notification_type = models.ForeignKey(
+        NotificationType,
+        on_delete=models.CASCADE,
+        help_text="Category of notification being counted"
+    )
+    count = models.IntegerField(
+        default=0,
+        help_text="Number of unread notifications of this type"
+    )
+
+    def __str__(self):
+        """
+        String representation of the counter
+        Returns: A string containing the username, type and count
+        """
+        return f"{self.user.username} / {self.notification_type}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'notification_type'],
+                name='unique_unread_counter'
+            ),
+        ]
+
+class OutboxEvent(models.Model):
+    """
+    A real-time event waiting to be published to the channel layer.
+
+    Rows are written in the same transaction as the change they announce and
+    published by the ``dispatch_outbox`` management command, so an event is
+    never lost when the channel layer is slow or unavailable.
+
+    Fields:
+        group: Channel layer group the event is sent to
+        payload: The channel layer message, including its ``type``
+        created_at: When the event was queued
+        available_at: Earliest time the dispatcher may (re)try the event
+        attempts: Number of failed publish attempts so far
+    """
+    group = models.CharField(
+        max_length=100,
+        help_text="Channel layer group the event is sent to"
+    )
+    payload = models.JSONField(
+        help_text="Channel layer message including its type"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="Timestamp when the event was queued"
+    )
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Earliest time the dispatcher may publish the event"
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of failed publish attempts"
+    )
+
+    def __str__(self):
+        """
+        String representation of the outbox event
+        Returns: A string containing the event type and target group
+        """
+        return f"{self.payload.get('type')} -> {self.group}"
+
+    class Meta:
+        ordering = ['id']
+
+class ReadWatermark(models.Model):
+    """
+    Point in time up to which a user has marked their inbox as read.
+
+    "Mark all read" advances a watermark instead of updating every
+    notification row. A notification counts as read when its ``read`` flag
+    is set or it was created at or before a watermark covering its type.
+    Helpers in ``notifications.unread`` apply this rule.
+
+    Fields:
+        user: The User who marked their inbox read
+        notification_type: The category covered, or null for all categories
+        read_before: Notifications created at or before this time are read
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='read_watermarks',
+        help_text="User who marked their notifications read"
+    )
+    notification_type = models.ForeignKey(
+        NotificationType,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        help_text="Category covered by the watermark; empty means all categories"
+    )
+    read_before = models.DateTimeField(
+        help_text="Notifications created at or before this time count as read"
+    )
+
+    def __str__(self):
+        """
+        String representation of the watermark
+        Returns: A string containing the username, type and timestamp
+        """
+        scope = self.notification_type or 'all'
+        return f"{self.user.username} / {scope}: {self.read_before}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'notification_type'],
+                name='unique_read_watermark'
+            ),
+            # NULLs are distinct in the constraint above, so the
+            # all-categories watermark needs its own
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(notification_type__isnull=True),
+                name='unique_global_read_watermark'
+            ),
+        ]
+
+class InboxSequence(models.Model):
+    """
+    Per-user sequence counter of the inbox change log.
+
+    Fields:
+        user: The User whose changes are numbered
+        last_seq: Sequence number of the user's most recent change
+        floor: Highest sequence number removed by compaction; clients
+            syncing from below it must re-download their inbox
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='inbox_sequence',
+        help_text="User whose inbox changes are numbered"
+    )
+    last_seq = models.BigIntegerField(
+        default=0,
+        help_text="Sequence number of the most recent change"
+    )
+    floor = models.BigIntegerField(
+        default=0,
+        help_text="Highest sequence number removed by compaction"
+    )
+
+    def __str__(self):
+        """
+        String representation of the sequence
+        Returns: A string containing the username and last sequence number
+        """
+        return f"{self.user.username}: {self.last_seq}"
+
+class InboxChange(models.Model):
+    """
+    One entry of a user's append-only inbox change log.
+
+    Clients that were offline replay the entries after the last sequence
+    number they saw instead of re-downloading their inbox. Written by
+    ``notifications.changelog``.
+
+    Fields:
+        user: The User whose inbox changed
+        seq: Per-user, gap-free, increasing sequence number
+        action: What happened (created, updated, read, read_all, deleted)
+        notification_id: The notification affected, if any. Not a foreign
+            key so entries outlive deleted notifications and the
+            notifications table can stay partitioned
+        data: Serialized notification or action details
+        created_at: When the change was recorded
+    """
+    ACTION_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('read', 'Read'),
+        ('read_all', 'Read all'),
+        ('deleted', 'Deleted'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='inbox_changes',
+        help_text="User whose inbox changed"
+    )
+    seq = models.BigIntegerField(
+        help_text="Per-user sequence number of the change"
+    )
+    action = models.CharField(
+        max_length=10,
+        choices=ACTION_CHOICES,
+        help_text="Kind of change"
+    )
+    notification_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="ID of the affected notification"
+    )
+    data = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Serialized notification or action details"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        help_text="Timestamp when the change was recorded"
+    )
+
+    def __str__(self):
+        """
+        String representation of the change
+        Returns: A string containing the username, sequence number and action
+        """
+        return f"{self.user.username} #{self.seq}: {self.action}"
+
+    class Meta:
+        ordering = ['user', 'seq']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'seq'],
+                name='unique_inbox_change_seq'
+            ),
+        ]
+
+class ExternalDelivery(models.Model):
+    """
+    A notification waiting to be sent by email or push.
+
+    Queued by ``notifications.delivery`` for recipients with no open
+    WebSocket, according to their ``UserPreferences`` flags, and sent by the
+    ``dispatch_external`` management command.
+
+    Fields:
+        user: The User to notify
+        channel: How to notify them (email or push)
+        notification_id: The notification being announced. Not a foreign
+            key so the notifications table can stay partitioned
+        payload: Serialized notification
+        created_at: When the delivery was queued
+        available_at: Earliest time the dispatcher may (re)try the delivery
+        attempts: Number of failed send attempts so far
+    """
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('push', 'Push'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='external_deliveries',
+        help_text="User to notify"
+    )
+    channel = models.CharField(
+        max_length=10,
+        choices=CHANNEL_CHOICES,
+        help_text="Delivery channel"
+    )
+    notification_id = models.BigIntegerField(
+        help_text="ID of the notification being announced"
+    )
+    payload = models.JSONField(
+        help_text="Serialized notification"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="Timestamp when the delivery was queued"
+    )
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Earliest time the dispatcher may send the delivery"
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of failed send attempts"
+    )
+
+    def __str__(self):
+        """
+        String representation of the delivery
+        Returns: A string containing the channel, username and notification ID
+        """
+        return f"{self.channel} -> {self.user.username}: {self.notification_id}"
+
+    class Meta:
+        ordering = ['id']
+        verbose_name_plural = 'external deliveries'
+        indexes = [
+            models.Index(fields=['channel', 'available_at'], name='external_delivery_due_idx'),
+        ]
+
+class Announcement(models.Model):
+    """
+    A notification broadcast to everyone subscribed to a type.
+
+    Stored once instead of once per recipient and delivered with a single
+    channel layer send to the type's topic group, which every connection
+    subscribed to the type has joined (see ``notifications.delivery``).
+
+    Fields:
+        notification_type: The category announced; its subscribers receive it
+        title: Brief heading of the announcement
+        message: Full content of the announcement
+        priority: Priority level of the announcement
+        created_at: When the announcement was sent
+    """
+    notification_type = models.ForeignKey(
+        NotificationType,
+        on_delete=models.CASCADE,
+        related_name='announcements',
+        help_text="Category announced"
+    )
+    title = models.CharField(
+        max_length=200,
+        help_text="Brief heading of the announcement"
+    )
+    message = models.TextField(
+        help_text="Full content of the announcement"
+    )
+    priority = models.CharField(
+        max_length=10,
+        choices=Notifications.PRIORITY_CHOICES,
+        default='MEDIUM',
+        help_text="Priority level of the announcement"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="Timestamp when the announcement was sent"
+    )
+
+    def __str__(self):
+        """
+        String representation of the announcement
+        Returns: A string containing the notification type and title
+        """
+        return f"{self.notification_type}: {self.title}"
+
+    class Meta:
+        ordering = ['-id']
+
+class RevokedToken(models.Model):
+    """
+    Denylist entry for signed access and refresh tokens.
+
+    Each worker keeps the unexpired entries in memory and reloads them every
+    few seconds (see ``notifications.tokens``), so verifying a token never
+    queries the database. Entries are deleted once every token they could
+    match has expired, which keeps the list small.
+
+    Fields:
+        key: ``jti:<token id>`` revokes one token, ``user:<user id>`` every
+            token of that user issued before ``revoked_at``
+        revoked_at: When the revocation happened
+        expires_at: When the last token the entry can match expires
+    """
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text="Revoked token ID or user"
+    )
+    revoked_at = models.DateTimeField(
+        help_text="Timestamp of the revocation"
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        help_text="Timestamp after which the entry can no longer match a token"
+    )
+
+    def __str__(self):
+        """
+        String representation of the denylist entry
+        Returns: A string containing the key and revocation time
+        """
+        return f"{self.key} revoked at {self.revoked_at}"
+
+class NotificationRollup(models.Model):
+    """
+    Daily notification counts for analytics dashboards.
+
+    One row per creation day, type, priority and recipient cohort, so
+    dashboards never aggregate the notifications table (see
+    ``notifications.rollups``). ``total`` grows as the
+    ``rollup_notifications`` command rolls up new notifications and shrinks
+    when a rolled up notification is deleted through the ORM; ``read`` is
+    also moved by the read paths once a notification is rolled up, and by
+    the command for "mark all read". Notifications dropped with their
+    partition for retention stay counted.
+
+    Fields:
+        day: UTC day the notifications were created
+        notification_type: Category of the notifications
+        priority: Priority level of the notifications
+        cohort: First day of the month the recipients signed up
+        total: Number of notifications created
+        read: How many of them are read, by flag or by watermark
+    """
+    day = models.DateField(
+        help_text="UTC day the notifications were created"
+    )
+    notification_type = models.ForeignKey(
+        NotificationType,
+        on_delete=models.CASCADE,
+        related_name='rollups',
+        help_text="Category of the notifications"
+    )
+    priority = models.CharField(
+        max_length=10,
+        choices=Notifications.PRIORITY_CHOICES,
+        help_text="Priority level of the notifications"
+    )
+    cohort = models.DateField(
+        help_text="Month the recipients signed up"
+    )
+    total = models.IntegerField(
+        default=0,
+        help_text="Number of notifications created"
+    )
+    read = models.IntegerField(
+        default=0,
+        help_text="Number of those notifications that are read"
+    )
+
+    def __str__(self):
+        """
+        String representation of the rollup
+        Returns: A string containing the day, type, priority and counts
+        """
+        return f"{self.day} {self.notification_type} {self.priority}: {self.read}/{self.total}"
+
+    class Meta:
+        ordering = ['day', 'notification_type', 'priority', 'cohort']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'notification_type', 'priority', 'cohort'],
+                name='unique_notification_rollup'
+            ),
+        ]
+
+class RollupCheckpoint(models.Model):
+    """
+    Progress of the ``rollup_notifications`` command; a single row.
+
+    Fields:
+        last_id: Highest notification ID rolled up so far
+        updated_at: When the command last advanced
+    """
+    last_id = models.BigIntegerField(
+        default=0,
+        help_text="Highest notification ID rolled up"
+    )
+    updated_at = models.DateTimeField(
+        null=True,
+        help_text="When the rollups were last advanced"
+    )
+
+    def __str__(self):
+        """
+        String representation of the checkpoint
+        Returns: A string containing the last rolled up ID
+        """
+        return f"Rolled up to {self.last_id}"
+
+class RolledUpWatermark(models.Model):
+    """
+    Position of a ``ReadWatermark`` that the rollups have counted.
+
+    "Mark all read" only advances the watermark. The notifications a move
+    covers are counted read in the rollups later, by the
+    ``rollup_notifications`` command, which then copies the position here
+    (see ``notifications.rollups``).
+
+    Fields:
+        watermark: The watermark counted
+        read_before: Its ``read_before`` when it was last counted
+    """
+    watermark = models.OneToOneField(
+        ReadWatermark,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rolled_up',
+        help_text="Watermark counted in the rollups"
+    )
+    read_before = models.DateTimeField(
+        help_text="Notifications created at or before this time are counted read"
+    )
+
+    def __str__(self):
+        """
+        String representation of the counted watermark
+        Returns: A string containing the watermark and counted timestamp
+        """
+        return f"{self.watermark} counted to {self.read_before}"
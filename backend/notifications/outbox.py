@@ -0,0 +1,172 @@
+"""
+Transactional outbox for real-time delivery.
+
+Events are written with ``enqueue`` inside the transaction that creates a
+notification instead of being sent to the channel layer directly.
+``notifications.delivery`` hands a transaction's events to a background
+publisher as soon as it commits; the ``dispatch_outbox`` management command
+claims whatever is left
+(failed or orphaned events) in batches with ``SELECT ... FOR UPDATE SKIP
+LOCKED`` (so several dispatchers can run side by side), publishes them
+concurrently and deletes them once sent.
+Delivery is at-least-once: a dispatcher that dies after publishing but
+before committing leaves its batch to be sent again. A publish still
+running after ``PUBLISH_TIMEOUT`` seconds is cancelled; events it had not
+finished sending are retried under the ``event_id`` they were stamped with.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+from . import delivery, replay
+
+logger = logging.getLogger(__name__)
+
+# Longest delay between retries of an event that failed to publish
+MAX_RETRY_DELAY = 60
+
+# Longest a batch may take to publish before its unsent events are retried
+PUBLISH_TIMEOUT = 30
+
+
+def enqueue(group, message):
+    """
+    Queues a channel layer message for ``group``.
+
+    Must be called inside the transaction that makes the change visible so
+    the event and the change commit (or roll back) together.
+    """
+    return OutboxEvent.objects.create(group=group, payload=message)
+
+
+def enqueue_many(events):
+    """Queues many ``(group, message)`` pairs with a single insert."""
+    return OutboxEvent.objects.bulk_create(
+        [OutboxEvent(group=group, payload=message) for group, message in events]
+    )
+
+
+async def _record(group, payload):
+    try:
+        return await replay.record(group, payload)
+    except Exception:
+        # An unavailable replay buffer must not hold up live delivery
+        logger.exception('Failed to record event for replay on %s', group)
+        return payload
+
+
+async def _publish(channel_layer, events):
+    """
+    Sends a batch of events, returning the IDs of those that failed.
+
+    Groups are published concurrently while events for the same group are
+    sent in order, so a recipient never sees its notifications reordered.
+    Groups still sending after ``PUBLISH_TIMEOUT`` are cancelled, and have
+    stopped by the time this returns.
+    """
+    by_group = {}
+    for event in events:
+        by_group.setdefault(event.group, []).append(event)
+    sent = set()
+
+    async def send_group(group_events):
+        for event in group_events:
+            try:
+                if delivery.is_replayed(event.payload) and 'event_id' not in event.payload:
+                    # Stamped once; a retried event keeps its ID
+                    event.payload = await _record(event.group, event.payload)
+                await channel_layer.group_send(
+                    event.group, delivery.wire_message(event.payload)
+                )
+            except Exception:
+                logger.exception('Failed to publish outbox event %s', event.id)
+                # Later events would overtake this one, so hold them back too
+                return
+            sent.add(event.id)
+
+    tasks = [asyncio.ensure_future(send_group(g)) for g in by_group.values()]
+    _, pending = await asyncio.wait(tasks, timeout=PUBLISH_TIMEOUT)
+    if pending:
+        logger.error('Publishing timed out for %d groups', len(pending))
+        for task in pending:
+            task.cancel()
+        await asyncio.wait(pending)
+    return {event.id for event in events} - sent
+
+
+def run_async(coroutine, loop=None):
+    """
+    Runs ``coroutine`` to completion from synchronous code.
+
+    With ``loop`` the coroutine runs there: handed over if another thread
+    runs the loop, and cancelled if that thread does not finish it in time;
+    run by the calling thread otherwise. Without ``loop`` it runs on a loop
+    of the calling thread.
+    """
+    if loop is not None:
+        if not loop.is_running():
+            return loop.run_until_complete(coroutine)
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+        try:
+            # _publish gives up after PUBLISH_TIMEOUT; this guards against a
+            # loop too busy to run it at all
+            return future.result(2 * PUBLISH_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    async def wrapper():
+        return await coroutine
+    return async_to_sync(wrapper)()
+
+
+def dispatch_batch(batch_size=None, channel_layer=None, event_ids=None, loop=None):
+    """
+    Claims and publishes one batch of due outbox events.
+
+    Args:
+        batch_size: Maximum number of events to claim
+        channel_layer: Layer to publish to, defaults to the configured one
+        event_ids: Only claim these events
+        loop: Event loop to publish on, see ``run_async``
+
+    Returns:
+        A ``(sent, failed)`` tuple of event counts
+    """
+    batch_size = batch_size or settings.NOTIFICATIONS_OUTBOX_BATCH_SIZE
+    channel_layer = channel_layer or get_channel_layer()
+
+    with transaction.atomic():
+        events = OutboxEvent.objects.select_for_update(skip_locked=True).filter(
+            available_at__lte=timezone.now()
+        )
+        if event_ids is not None:
+            events = events.filter(id__in=event_ids)
+        events = list(events.order_by('id')[:batch_size])
+        if not events:
+            return 0, 0
+
+        failed_ids = run_async(_publish(channel_layer, events), loop)
+        OutboxEvent.objects.filter(
+            id__in=[event.id for event in events if event.id not in failed_ids]
+        ).delete()
+
+        failed = [event for event in events if event.id in failed_ids]
+        now = timezone.now()
+        for event in failed:
+            event.attempts += 1
+            event.available_at = now + timedelta(
+                seconds=min(2 ** event.attempts, MAX_RETRY_DELAY)
+            )
+        OutboxEvent.objects.bulk_update(failed, ['attempts', 'available_at', 'payload'])
+
+    return len(events) - len(failed), len(failed)
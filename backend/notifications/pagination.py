@@ -0,0 +1,275 @@
+"""
+Keyset (cursor) pagination for notification inboxes.
+
+Inbox pages are ordered newest first on ``(created_at, id)`` and each page
+carries an opaque cursor pointing at the last row it returned. Fetching the
+next page is a range scan on the ``(recipient, -created_at, -id)`` index that
+starts right after that row, so a deep page costs the same as the first one
+and no ``COUNT(*)`` is ever issued.
+
+The same helpers back both the REST list endpoint and the WebSocket
+``fetch_notifications`` message so a cursor obtained from one can be used
+with the other.
+
+Search results (querysets annotated with ``search_rank`` by
+``notifications.search``) are ordered by relevance instead, on
+``(search_rank, id)``, and their cursors carry the rank of the last row.
+"""
+
+import base64
+import binascii
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+KEYSET_ORDERING = ('-created_at', '-id')
+
+RANKED_ORDERING = ('-search_rank', '-id')
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client supplied cursor cannot be decoded."""
+
+
+def encode_cursor(notification, page=1):
+    """
+    Builds the opaque cursor that points just past ``notification``.
+
+    Args:
+        notification: The last notification of the current page
+        page: Zero-based index of the page the cursor leads to
+
+    Returns:
+        A URL-safe string encoding the row's ``(created_at, id)`` key and
+        the page index, which lets the inbox cache tell shallow pages apart
+    """
+    raw = f'{notification.created_at.isoformat()}|{notification.pk}|{page}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor produced by ``encode_cursor``.
+
+    Args:
+        cursor: The opaque cursor string sent by the client
+
+    Returns:
+        A ``(created_at, id, page)`` tuple
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, pk, page = raw.split('|')
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+        page = int(page)
+    except (TypeError, ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+    if created_at is None:
+        raise InvalidCursor(cursor)
+    return created_at, pk, page
+
+
+def encode_rank_cursor(notification, page=1):
+    """
+    Builds the cursor that points just past ``notification`` in ranked
+    search results, which must carry its ``search_rank`` annotation.
+    """
+    # repr round-trips the float exactly, so the bound excludes the row itself
+    raw = f'{notification.search_rank!r}|{notification.pk}|{page}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_rank_cursor(cursor):
+    """
+    Decodes a cursor produced by ``encode_rank_cursor``.
+
+    Returns:
+        A ``(rank, id, page)`` tuple
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        rank, pk, page = raw.split('|')
+        rank = float(rank)
+        pk = int(pk)
+        page = int(page)
+    except (TypeError, ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+    return rank, pk, page
+
+
+def is_ranked(queryset):
+    """Returns True for search results, which are paginated by rank."""
+    return 'search_rank' in queryset.query.annotations
+
+
+def cursor_page(cursor):
+    """
+    Returns the zero-based index of the page ``cursor`` leads to.
+
+    Raises:
+        InvalidCursor: If ``cursor`` is malformed
+    """
+    return decode_cursor(cursor)[2] if cursor else 0
+
+
+def _keyset_slice(queryset, cursor, page_size):
+    # The ordered, cursor-bounded queryset of one page plus its page index
+    page = 0
+    if is_ranked(queryset):
+        queryset = queryset.order_by(*RANKED_ORDERING)
+        if cursor:
+            rank, pk, page = decode_rank_cursor(cursor)
+            queryset = queryset.filter(
+                Q(search_rank__lte=rank),
+                Q(search_rank__lt=rank) | Q(id__lt=pk),
+            )
+        return queryset[:page_size + 1], page
+
+    queryset = queryset.order_by(*KEYSET_ORDERING)
+    if cursor:
+        created_at, pk, page = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lte=created_at),
+            Q(created_at__lt=created_at) | Q(id__lt=pk),
+        )
+    # Fetch one extra row to learn whether another page exists
+    return queryset[:page_size + 1], page
+
+
+def _keyset_page(rows, page, page_size, encode=encode_cursor):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode(rows[-1], page + 1)
+    return rows, next_cursor
+
+
+def _cursor_encoder(queryset):
+    return encode_rank_cursor if is_ranked(queryset) else encode_cursor
+
+
+def paginate_keyset(queryset, cursor=None, page_size=None):
+    """
+    Returns one page of ``queryset`` in keyset order, or in rank order
+    for search results.
+
+    The ``created_at__lte`` bound is redundant with the OR clause but gives
+    the planner an index condition to seek on, so rows before the cursor are
+    skipped by the index rather than filtered one by one.
+
+    Args:
+        queryset: The notifications to paginate
+        cursor: Cursor returned with the previous page, or None for the first
+        page_size: Maximum number of rows to return
+
+    Returns:
+        A ``(rows, next_cursor)`` tuple; ``next_cursor`` is None on the last page
+
+    Raises:
+        InvalidCursor: If ``cursor`` is malformed
+    """
+    page_size = page_size or settings.NOTIFICATIONS_PAGE_SIZE
+    rows, page = _keyset_slice(queryset, cursor, page_size)
+    return _keyset_page(list(rows), page, page_size, _cursor_encoder(queryset))
+
+
+async def apaginate_keyset(queryset, cursor=None, page_size=None):
+    """Async version of ``paginate_keyset``, for async views."""
+    page_size = page_size or settings.NOTIFICATIONS_PAGE_SIZE
+    rows, page = _keyset_slice(queryset, cursor, page_size)
+    return _keyset_page([row async for row in rows], page, page_size, _cursor_encoder(queryset))
+
+
+class NotificationCursorPagination(BasePagination):
+    """
+    DRF pagination class exposing ``paginate_keyset`` on list endpoints.
+
+    Responses contain ``next`` (a ready-to-follow URL), ``next_cursor`` (the
+    raw cursor, also accepted by the WebSocket consumer) and ``results``.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.NOTIFICATIONS_PAGE_SIZE
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            rows, self.next_cursor = paginate_keyset(
+                queryset,
+                cursor=request.query_params.get(self.cursor_query_param),
+                page_size=self.get_page_size(request),
+            )
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return rows
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async version of ``paginate_queryset``, for async views."""
+        self.request = request
+        try:
+            rows, self.next_cursor = await apaginate_keyset(
+                queryset,
+                cursor=request.query_params.get(self.cursor_query_param),
+                page_size=self.get_page_size(request),
+            )
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_cached_paginated_response(self, request, page):
+        """
+        Builds the paginated response for a page served from the inbox cache.
+
+        Args:
+            request: The incoming request
+            page: A dict with ``results`` and ``next_cursor`` keys
+        """
+        self.request = request
+        self.next_cursor = page['next_cursor']
+        return self.get_paginated_response(page['results'])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
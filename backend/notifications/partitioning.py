@@ -0,0 +1,249 @@
+"""
+Monthly range partitioning of the notifications table (PostgreSQL only).
+
+When enabled, ``notifications_notifications`` becomes a partitioned table on
+``created_at`` with one partition per calendar month plus a DEFAULT
+partition catching anything outside the pre-created range. Retention is then
+a matter of detaching or dropping whole partitions, and date-range filters
+on ``created_at`` let the planner skip partitions entirely.
+
+Partitioning is opt-in: set ``NOTIFICATIONS_PARTITIONING=True`` before
+running migrations, or convert an existing database later with
+``manage.py manage_partitions --convert``. PostgreSQL requires the primary
+key of a partitioned table to include the partition key, so the table's
+primary key becomes ``(id, created_at)``; ``id`` stays unique because it is
+still drawn from a single sequence.
+"""
+
+import re
+from datetime import date
+
+PARENT_TABLE = 'notifications_notifications'
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+PARTITION_RE = re.compile(rf'^{PARENT_TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+class PartitioningError(Exception):
+    """Raised when the notifications table cannot be (re)partitioned."""
+
+
+def month_start(value):
+    """Returns the first day of the month containing ``value``."""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    """Returns the first day of the month ``count`` months after ``month``."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    """Returns the table name of the partition holding ``month``."""
+    return f'{PARENT_TABLE}_p{month.year:04d}{month.month:02d}'
+
+
+def _quote(connection, name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned(connection):
+    """Returns True if the notifications table is already partitioned."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p '
+            'JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = %s AND pg_table_is_visible(c.oid)',
+            [PARENT_TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection):
+    """
+    Returns the monthly partitions currently attached to the parent table.
+
+    Returns:
+        A sorted list of ``(month, table_name)`` tuples; the DEFAULT
+        partition is not included
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            'JOIN pg_class p ON p.oid = i.inhparent '
+            'WHERE p.relname = %s AND pg_table_is_visible(p.oid)',
+            [PARENT_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def create_partition(connection, month):
+    """
+    Creates the partition for ``month`` if it does not exist yet.
+
+    Returns:
+        True if a partition was created
+    """
+    name = partition_name(month)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+        cursor.execute(
+            f'CREATE TABLE {_quote(connection, name)} '
+            f'PARTITION OF {_quote(connection, PARENT_TABLE)} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [month.isoformat(), add_months(month, 1).isoformat()]
+        )
+    return True
+
+
+def detach_partition(connection, name, drop=False):
+    """Detaches a partition from the parent and optionally drops it."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'ALTER TABLE {_quote(connection, PARENT_TABLE)} '
+            f'DETACH PARTITION {_quote(connection, name)}'
+        )
+        if drop:
+            cursor.execute(f'DROP TABLE {_quote(connection, name)}')
+
+
+def _table_definition(cursor, table):
+    """Captures the secondary indexes and outgoing foreign keys of ``table``."""
+    cursor.execute(
+        'SELECT indexdef FROM pg_indexes i '
+        'JOIN pg_class c ON c.relname = i.indexname '
+        'JOIN pg_index x ON x.indexrelid = c.oid '
+        'WHERE i.tablename = %s AND NOT x.indisprimary',
+        [table]
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table]
+    )
+    foreign_keys = cursor.fetchall()
+    return indexes, foreign_keys
+
+
+def _rebuild(connection, partitioned, months_ahead=3):
+    """
+    Copies the notifications table into a fresh partitioned or plain table.
+
+    The old table is renamed aside, a new table with the same columns is
+    created under the original name, rows are copied across, and indexes
+    and foreign keys are recreated with their original names so later
+    Django migrations keep working. Runs inside the caller's transaction.
+    """
+    parent = _quote(connection, PARENT_TABLE)
+    old = _quote(connection, f'{PARENT_TABLE}_old')
+    sequence = _quote(connection, f'{PARENT_TABLE}_id_seq')
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT conrelid::regclass::text FROM pg_constraint '
+            "WHERE confrelid = %s::regclass AND contype = 'f'",
+            [PARENT_TABLE]
+        )
+        referencing = [row[0] for row in cursor.fetchall()]
+        if referencing:
+            raise PartitioningError(
+                f'Tables {", ".join(referencing)} have foreign keys to '
+                f'{PARENT_TABLE}; drop them before converting'
+            )
+
+        cursor.execute(
+            'SELECT attname FROM pg_attribute '
+            'WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped '
+            # Generated columns (the search vector) are computed, not copied
+            "AND attgenerated = '' "
+            'ORDER BY attnum',
+            [PARENT_TABLE]
+        )
+        columns = ', '.join(_quote(connection, row[0]) for row in cursor.fetchall())
+        indexes, foreign_keys = _table_definition(cursor, PARENT_TABLE)
+
+        # Deferred foreign key checks would block altering the old table
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'LOCK TABLE {parent} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE {parent} RENAME TO {old}')
+        # Frees the sequence name; the old table keeps its rows until dropped
+        cursor.execute(f'ALTER TABLE {old} ALTER COLUMN "id" DROP IDENTITY IF EXISTS')
+        cursor.execute(f'ALTER TABLE {old} ALTER COLUMN "id" DROP DEFAULT')
+
+        partition_clause = ' PARTITION BY RANGE ("created_at")' if partitioned else ''
+        cursor.execute(
+            f'CREATE TABLE {parent} '
+            f'(LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED '
+            f'INCLUDING STORAGE)'
+            f'{partition_clause}'
+        )
+        cursor.execute(f'DROP SEQUENCE IF EXISTS {sequence}')
+        cursor.execute(f'CREATE SEQUENCE {sequence} OWNED BY {parent}."id"')
+        cursor.execute(
+            f'ALTER TABLE {parent} ALTER COLUMN "id" '
+            f"SET DEFAULT nextval('{PARENT_TABLE}_id_seq')"
+        )
+
+        if partitioned:
+            cursor.execute(f'SELECT MIN("created_at"), NOW() FROM {old}')
+            oldest, now = cursor.fetchone()
+            month = month_start(oldest or now)
+            last = add_months(month_start(now), months_ahead)
+            while month <= last:
+                create_partition(connection, month)
+                month = add_months(month, 1)
+            cursor.execute(
+                f'CREATE TABLE {_quote(connection, DEFAULT_PARTITION)} '
+                f'PARTITION OF {parent} DEFAULT'
+            )
+
+        cursor.execute(f'INSERT INTO {parent} ({columns}) SELECT {columns} FROM {old}')
+        cursor.execute(
+            f"SELECT setval('{PARENT_TABLE}_id_seq', COALESCE(MAX(\"id\"), 0) + 1, false) "
+            f'FROM {parent}'
+        )
+        cursor.execute(f'DROP TABLE {old}')
+
+        primary_key = '"id", "created_at"' if partitioned else '"id"'
+        cursor.execute(
+            f'ALTER TABLE {parent} ADD CONSTRAINT '
+            f'{_quote(connection, PARENT_TABLE + "_pkey")} PRIMARY KEY ({primary_key})'
+        )
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(
+                f'ALTER TABLE {parent} ADD CONSTRAINT {_quote(connection, name)} {definition}'
+            )
+
+
+def convert_to_partitioned(connection, months_ahead=3):
+    """
+    Converts the plain notifications table into a monthly partitioned one.
+
+    Creates partitions from the month of the oldest notification up to
+    ``months_ahead`` months in the future, plus a DEFAULT partition.
+    """
+    if is_partitioned(connection):
+        raise PartitioningError(f'{PARENT_TABLE} is already partitioned')
+    _rebuild(connection, partitioned=True, months_ahead=months_ahead)
+
+
+def convert_to_plain(connection):
+    """Folds all partitions back into a single plain notifications table."""
+    if not is_partitioned(connection):
+        raise PartitioningError(f'{PARENT_TABLE} is not partitioned')
+    _rebuild(connection, partitioned=False)
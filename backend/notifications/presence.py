@@ -0,0 +1,134 @@
+"""
+Registry of which user groups currently have an open WebSocket.
+
+``NotificationsConsumer`` registers its channel on connect and refreshes the
+entry from a heartbeat task every half ``NOTIFICATIONS_PRESENCE_TTL``; an
+entry that is not refreshed (the worker died) simply expires. On disconnect
+the entry is kept for ``NOTIFICATIONS_PRESENCE_GRACE`` seconds so a client
+that reconnects after a network blip still gets its events live or through
+replay. ``notifications.delivery`` asks ``online_groups`` before publishing
+and skips the channel layer for everyone else.
+
+With ``NOTIFICATIONS_PRESENCE_REDIS_URL`` set, each group is a Redis sorted
+set of channel names scored by expiry time, shared by all workers;
+otherwise the registry is in-process, matching the InMemory channel layer.
+Any other channel layer requires the Redis registry: producers outside the
+connection's process (other workers, management commands, the outbox
+relay) would see everyone as offline in an in-process one.
+"""
+
+import asyncio
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+class LocalRegistry:
+    """In-process registry: group -> {channel name: expiry}."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.groups = {}
+
+    def set_expiry(self, group, channel, expires_at):
+        with self.lock:
+            self.groups.setdefault(group, {})[channel] = expires_at
+
+    def online_groups(self, groups):
+        now = time.time()
+        online = set()
+        with self.lock:
+            for group in groups:
+                channels = self.groups.get(group)
+                if not channels:
+                    continue
+                for channel, expires_at in list(channels.items()):
+                    if expires_at <= now:
+                        del channels[channel]
+                if channels:
+                    online.add(group)
+                else:
+                    del self.groups[group]
+        return online
+
+
+class RedisRegistry:
+    """Redis registry: one sorted set per group, scored by expiry time."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(
+                'NOTIFICATIONS_PRESENCE_REDIS_URL requires the redis package'
+            )
+        self.client = redis.Redis.from_url(url)
+
+    def set_expiry(self, group, channel, expires_at):
+        key = f'presence:{group}'
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {channel: expires_at})
+            pipe.zremrangebyscore(key, '-inf', time.time())
+            pipe.expireat(key, int(expires_at) + 1)
+            pipe.execute()
+
+    def online_groups(self, groups):
+        groups = list(groups)
+        now = time.time()
+        with self.client.pipeline(transaction=False) as pipe:
+            for group in groups:
+                pipe.zcount(f'presence:{group}', f'({now}', '+inf')
+            counts = pipe.execute()
+        return {group for group, count in zip(groups, counts) if count}
+
+
+# The only channel layer whose groups live in one process
+IN_MEMORY_LAYER = 'channels.layers.InMemoryChannelLayer'
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Returns the configured presence registry, creating it on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            url = settings.NOTIFICATIONS_PRESENCE_REDIS_URL
+            if url:
+                _registry = RedisRegistry(url)
+            elif settings.CHANNEL_LAYERS['default']['BACKEND'] == IN_MEMORY_LAYER:
+                _registry = LocalRegistry()
+            else:
+                raise ImproperlyConfigured(
+                    'NOTIFICATIONS_PRESENCE_REDIS_URL is required unless the channel '
+                    'layer is the InMemoryChannelLayer'
+                )
+        return _registry
+
+
+def online_groups(groups):
+    """Returns the subset of ``groups`` with at least one live connection."""
+    return get_registry().online_groups(groups)
+
+
+async def _set_expiry(group, channel, expires_at):
+    registry = get_registry()
+    if isinstance(registry, LocalRegistry):
+        registry.set_expiry(group, channel, expires_at)
+    else:
+        await asyncio.get_running_loop().run_in_executor(
+            None, registry.set_expiry, group, channel, expires_at
+        )
+
+
+async def register(group, channel):
+    """Marks ``channel`` of ``group`` as connected for one TTL."""
+    await _set_expiry(group, channel, time.time() + settings.NOTIFICATIONS_PRESENCE_TTL)
+
+
+async def unregister(group, channel):
+    """Lets ``channel`` of ``group`` expire after the reconnect grace period."""
+    await _set_expiry(group, channel, time.time() + settings.NOTIFICATIONS_PRESENCE_GRACE)
@@ -0,0 +1,53 @@
+"""
+DRF renderer and parser backed by ``notifications.codec``.
+"""
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from . import codec
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+
+class CodecJSONRenderer(JSONRenderer):
+    """
+    Renders compact JSON with the configured codec.
+
+    Indented output (the browsable API, ``; indent=`` in ``Accept``) is
+    left to DRF's renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = codec.dumps(data)
+        # Escaped like DRF does, so the output stays a strict JavaScript subset
+        if LINE_SEPARATOR in ret or PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028').replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+
+class CodecJSONParser(JSONParser):
+    """
+    Parses JSON request bodies with the configured codec.
+    """
+
+    renderer_class = CodecJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read()
+            if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+                data = data.decode(encoding)
+            return codec.loads(data)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,151 @@
+"""
+Bounded per-group buffer of recently delivered events for reconnect replay.
+
+Every notification event published to a user group is stamped with an
+``event_id`` and appended to that group's buffer, which keeps the last
+``NOTIFICATIONS_REPLAY_BUFFER_SIZE`` events. A client reconnecting with the
+last ``event_id`` it saw is sent only the events after it; when some of
+those have already been evicted it is told to resync instead.
+
+Event IDs are consecutive integers per group, which is what makes a gap
+detectable. With ``NOTIFICATIONS_REPLAY_REDIS_URL`` set the buffers are
+Redis Streams shared by every worker (a Lua script allocates the ID and
+appends in one round trip); otherwise they are in-process rings, matching
+the InMemory channel layer.
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from . import codec
+
+# Upper bound on groups tracked by the in-process buffer
+MAX_LOCAL_GROUPS = 10000
+
+# Appends an event under the next sequence number and trims the stream
+APPEND_SCRIPT = '''
+local seq = redis.call('INCR', KEYS[2])
+redis.call('XADD', KEYS[1], 'MAXLEN', ARGV[2], seq .. '-0', 'event', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return seq
+'''
+
+
+class LocalBuffer:
+    """In-process ring buffers, one per group."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.groups = OrderedDict()
+
+    async def append(self, group, event):
+        with self.lock:
+            last_id, events = self.groups.pop(group, (0, None))
+            if events is None:
+                events = deque(maxlen=settings.NOTIFICATIONS_REPLAY_BUFFER_SIZE)
+            last_id += 1
+            events.append((last_id, event))
+            self.groups[group] = (last_id, events)
+            while len(self.groups) > MAX_LOCAL_GROUPS:
+                self.groups.popitem(last=False)
+            return last_id
+
+    async def since(self, group, last_event_id):
+        with self.lock:
+            last_id, events = self.groups.get(group, (0, ()))
+            events = list(events)
+        return last_id, events
+
+
+class RedisBuffer:
+    """Redis Stream buffers shared across workers."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(
+                'NOTIFICATIONS_REPLAY_REDIS_URL requires the redis package'
+            )
+        # The blocking client's pool is thread-safe and not tied to an event
+        # loop, which matters because async_to_sync runs each call in a new one
+        self.client = redis.Redis.from_url(url)
+        self.append_script = self.client.register_script(APPEND_SCRIPT)
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def append_sync(self, group, event):
+        return int(self.append_script(
+            keys=[f'replay:{group}', f'replay:{group}:seq'],
+            args=[
+                codec.dumps(event), settings.NOTIFICATIONS_REPLAY_BUFFER_SIZE,
+                settings.NOTIFICATIONS_REPLAY_TTL
+            ]
+        ))
+
+    def since_sync(self, group, last_event_id):
+        # MULTI so the sequence number and the entries are read consistently
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.get(f'replay:{group}:seq')
+            pipe.xrange(f'replay:{group}', min=f'{last_event_id + 1}-0')
+            last_id, entries = pipe.execute()
+        return int(last_id or 0), [
+            (int(entry_id.split(b'-')[0]), codec.loads(fields[b'event']))
+            for entry_id, fields in entries
+        ]
+
+    async def append(self, group, event):
+        return await self.run(self.append_sync, group, event)
+
+    async def since(self, group, last_event_id):
+        return await self.run(self.since_sync, group, last_event_id)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Returns the configured replay buffer, creating it on first use."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            url = settings.NOTIFICATIONS_REPLAY_REDIS_URL
+            _buffer = RedisBuffer(url) if url else LocalBuffer()
+        return _buffer
+
+
+async def record(group, event):
+    """
+    Appends ``event`` to the buffer of ``group``.
+
+    Returns:
+        A copy of ``event`` stamped with its ``event_id``
+    """
+    event_id = await get_buffer().append(group, event)
+    return {**event, 'event_id': event_id}
+
+
+async def events_since(group, last_event_id):
+    """
+    Returns the buffered events of ``group`` after ``last_event_id``.
+
+    Returns:
+        A list of stamped events in delivery order, or None if some of the
+        events the client missed are no longer buffered (or the client's ID
+        is ahead of the buffer, e.g. after a restart) and it must resync
+    """
+    last_id, events = await get_buffer().since(group, last_event_id)
+    if last_event_id > last_id:
+        return None
+    missed = [(event_id, event) for event_id, event in events if event_id > last_event_id]
+    expected = last_id - last_event_id
+    if len(missed) != expected:
+        return None
+    return [{**event, 'event_id': event_id} for event_id, event in missed]
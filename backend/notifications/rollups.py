@@ -0,0 +1,317 @@
+"""
+Daily notification rollups for analytics.
+
+``NotificationRollup`` counts notifications per creation day, type,
+priority and recipient cohort (the month the recipient signed up), so the
+stats endpoint reads a few hundred rollup rows instead of aggregating the
+notifications table.
+
+New notifications are rolled up by the ``rollup_notifications`` command,
+which walks the table by primary key past ``RollupCheckpoint.last_id``.
+That covers every way notifications are created (including ``bulk_create``
+fan-outs) and keeps the create path free of a hot counter upsert. Rows
+younger than ``NOTIFICATIONS_ROLLUP_LAG`` seconds are left for the next
+run so transactions still holding a lower ID can commit first.
+
+Once a notification is rolled up, ``mark_read`` and edits move its
+``read`` count themselves, and deleting it through the ORM takes it back
+out of ``total``. They change the row and then read the checkpoint; a run
+locks the rows of its batch before counting them, so it waits for such a
+transaction and counts its result, or the transaction waits for the run and
+then sees the row already rolled up.
+
+``mark_all_read`` only moves a ``ReadWatermark``, and stays a single-row
+update: ``roll_up_read_all``, run by the same command, later counts the
+rolled up notifications each move covered and records how far it counted
+in ``RolledUpWatermark``. Until then the rollups treat those notifications
+as unread, so every count here judges watermarks by the counted position
+(``counted_read_filter``, ``rolled_up_watermarks``) rather than the current
+one. ``roll_up_read_all`` locks the rows it counts, like a run does.
+
+Partitions detached or dropped for retention (``notifications.partitioning``)
+are not subtracted: the rollups keep the history the detail rows no longer
+hold.
+"""
+
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DateField, Exists, F, OuterRef, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import (
+    Notifications, NotificationRollup, ReadWatermark, RolledUpWatermark, RollupCheckpoint
+)
+from . import unread
+
+UTC = datetime.timezone.utc
+
+# Dimensions the stats can be grouped by, and the rollup field of each
+DIMENSIONS = {
+    'day': 'day',
+    'type': 'notification_type__name',
+    'priority': 'priority',
+    'cohort': 'cohort',
+}
+
+DEFAULT_GROUP_BY = ('day', 'type', 'priority')
+
+def rollup_day(created_at):
+    return created_at.astimezone(UTC).date()
+
+
+def cohort_of(user):
+    """Returns the first day of the month ``user`` signed up, in UTC."""
+    return user.date_joined.astimezone(UTC).date().replace(day=1)
+
+
+def rolled_up_to():
+    """Returns the highest notification ID counted in the rollups."""
+    return RollupCheckpoint.objects.filter(pk=1).values_list('last_id', flat=True).first() or 0
+
+
+def counted_read_filter():
+    """
+    Returns a ``Q`` matching notifications the rollups count as read: by
+    flag, or by a watermark as far as it was counted.
+    """
+    return Q(read=True) | Exists(RolledUpWatermark.objects.filter(
+        Q(watermark__notification_type__isnull=True)
+        | Q(watermark__notification_type=OuterRef('notification_type')),
+        watermark__user=OuterRef('recipient'),
+        read_before__gte=OuterRef('created_at'),
+    ))
+
+
+def rolled_up_watermarks(user_id):
+    """Like ``unread.get_watermarks``, as far as the rollups counted them."""
+    return dict(
+        RolledUpWatermark.objects.filter(watermark__user_id=user_id)
+        .values_list('watermark__notification_type_id', 'read_before')
+    )
+
+
+def _counted_unread(notification, read, notification_type_id):
+    if read:
+        return False
+    return not unread.watermark_covers(
+        rolled_up_watermarks(notification.recipient_id), notification_type_id,
+        notification.created_at
+    )
+
+
+def adjust(deltas):
+    """
+    Applies rollup deltas with a single upsert.
+
+    Args:
+        deltas: Mapping of ``(day, notification_type_id, priority, cohort)``
+            to a ``(total, read)`` pair of amounts to add
+    """
+    # Sorted so concurrent writers lock rollup rows in the same order
+    rows = sorted((key, delta) for key, delta in deltas.items() if any(delta))
+    if not rows:
+        return
+
+    table = connection.ops.quote_name(NotificationRollup._meta.db_table)
+    params = []
+    for (day, type_id, priority, cohort), (total, read) in rows:
+        params.extend([day, type_id, priority, cohort, total, read])
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (day, notification_type_id, priority, cohort, total, "read") '
+            f'VALUES {values} '
+            f'ON CONFLICT (day, notification_type_id, priority, cohort) '
+            f'DO UPDATE SET total = {table}.total + EXCLUDED.total, '
+            f'"read" = {table}."read" + EXCLUDED."read"',
+            params
+        )
+
+
+def record_read(user, rows):
+    """
+    Counts notifications that ``mark_read`` just marked read.
+
+    Must run after their rows were updated, in the same transaction.
+
+    Args:
+        user: Owner of the notifications
+        rows: ``(id, notification_type_id, priority, created_at)`` tuples
+    """
+    last_id = rolled_up_to()
+    cohort = cohort_of(user)
+    per_key = Counter(
+        (rollup_day(created_at), type_id, priority, cohort)
+        for pk, type_id, priority, created_at in rows
+        if pk <= last_id
+    )
+    adjust({key: (0, count) for key, count in per_key.items()})
+
+
+def record_updated(notification, old_type_id, old_priority, was_read):
+    """
+    Moves a rolled up notification after an edit changed its type,
+    priority or read state. Must run after the row was saved.
+    """
+    if notification.id > rolled_up_to():
+        return
+    was_unread = _counted_unread(notification, was_read, old_type_id)
+    is_unread = _counted_unread(notification, notification.read, notification.notification_type_id)
+    day = rollup_day(notification.created_at)
+    cohort = cohort_of(notification.recipient)
+    old_key = (day, old_type_id, old_priority, cohort)
+    new_key = (day, notification.notification_type_id, notification.priority, cohort)
+    if old_key == new_key:
+        adjust({new_key: (0, int(was_unread) - int(is_unread))})
+    else:
+        adjust({
+            old_key: (-1, -int(not was_unread)),
+            new_key: (1, int(not is_unread)),
+        })
+
+
+def record_deleted(notification):
+    """
+    Uncounts a rolled up notification deleted through the ORM. Must run
+    after the row was deleted.
+    """
+    if notification.id > rolled_up_to():
+        return
+    was_unread = _counted_unread(notification, notification.read, notification.notification_type_id)
+    key = (
+        rollup_day(notification.created_at), notification.notification_type_id,
+        notification.priority, cohort_of(notification.recipient)
+    )
+    adjust({key: (-1, -int(not was_unread))})
+
+
+def roll_up_read_all():
+    """
+    Counts the rolled up notifications read by watermarks that moved since
+    they were last counted.
+
+    Returns:
+        The number of notifications counted read
+    """
+    RollupCheckpoint.objects.get_or_create(pk=1)
+    counted = 0
+    with transaction.atomic():
+        # Keeps a run from rolling up rows while they are counted here
+        last_id = RollupCheckpoint.objects.select_for_update().get(pk=1).last_id
+        moved = (
+            ReadWatermark.objects.filter(
+                Q(rolled_up__isnull=True) | Q(rolled_up__read_before__lt=F('read_before'))
+            )
+            .select_related('user').order_by('id')
+        )
+        for watermark in moved:
+            covered = Notifications.objects.filter(
+                recipient=watermark.user, id__lte=last_id,
+                created_at__lte=watermark.read_before
+            ).exclude(counted_read_filter())
+            if watermark.notification_type_id is not None:
+                covered = covered.filter(notification_type_id=watermark.notification_type_id)
+            # Waits for transactions changing the rows' read state; rows they
+            # marked read are no longer matched once they commit
+            rows = list(
+                covered.select_for_update().order_by()
+                .values_list('id', 'notification_type_id', 'priority', 'created_at')
+            )
+            record_read(watermark.user, rows)
+            RolledUpWatermark.objects.update_or_create(
+                watermark=watermark, defaults={'read_before': watermark.read_before}
+            )
+            counted += len(rows)
+    return counted
+
+
+def roll_up(batch_size=None, lag=None):
+    """
+    Rolls up the next batch of notifications past the checkpoint.
+
+    Args:
+        batch_size: Maximum number of notifications to roll up
+        lag: Leave notifications younger than this many seconds for later
+
+    Returns:
+        The number of notifications rolled up; 0 once caught up
+    """
+    batch_size = batch_size or settings.NOTIFICATIONS_ROLLUP_BATCH_SIZE
+    lag = settings.NOTIFICATIONS_ROLLUP_LAG if lag is None else lag
+    RollupCheckpoint.objects.get_or_create(pk=1)
+
+    with transaction.atomic():
+        # Also keeps two runs from counting the same batch
+        checkpoint = RollupCheckpoint.objects.select_for_update().get(pk=1)
+        now = timezone.now()
+        batch = list(
+            Notifications.objects
+            .filter(id__gt=checkpoint.last_id, created_at__lt=now - datetime.timedelta(seconds=lag))
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        rows = Notifications.objects.filter(id__gt=checkpoint.last_id, id__lte=batch[-1])
+        # Waits for transactions still changing the read state of the batch
+        list(rows.select_for_update().order_by().values_list('id', flat=True))
+        counts = (
+            rows.annotate(
+                day=TruncDate('created_at', tzinfo=UTC),
+                cohort=TruncMonth('recipient__date_joined', output_field=DateField(), tzinfo=UTC),
+            )
+            .values('day', 'notification_type_id', 'priority', 'cohort')
+            .annotate(total=Count('id'), read=Count('id', filter=counted_read_filter()))
+            .order_by()
+        )
+        deltas = {
+            (row['day'], row['notification_type_id'], row['priority'], row['cohort']):
+                (row['total'], row['read'])
+            for row in counts
+        }
+        adjust(deltas)
+
+        checkpoint.last_id = batch[-1]
+        checkpoint.updated_at = now
+        checkpoint.save(update_fields=['last_id', 'updated_at'])
+    return sum(total for total, _ in deltas.values())
+
+
+def get_stats(group_by=DEFAULT_GROUP_BY, start=None, end=None, notification_type=None):
+    """
+    Sums the rollups over the requested dimensions.
+
+    Args:
+        group_by: Keys of ``DIMENSIONS`` to group by
+        start: First creation day to include
+        end: Last creation day to include
+        notification_type: Only count this type name
+
+    Returns:
+        A list of dicts with the ``group_by`` keys plus ``total``, ``read``
+        and ``unread``
+    """
+    rollups = NotificationRollup.objects.all()
+    if start:
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        rollups = rollups.filter(day__lte=end)
+    if notification_type:
+        rollups = rollups.filter(notification_type__name=notification_type)
+
+    fields = [DIMENSIONS[dimension] for dimension in group_by]
+    rows = rollups.values(*fields).annotate(total=Sum('total'), read=Sum('read')).order_by(*fields)
+    return [
+        {
+            **{dimension: row[DIMENSIONS[dimension]] for dimension in group_by},
+            'total': row['total'],
+            'read': row['read'],
+            'unread': row['total'] - row['read'],
+        }
+        for row in rows
+    ]
@@ -1,14 +1,17 @@
 from django.urls import re_path
 from . import consumers
+from .middleware import TokenAuthMiddlewareStack
 
 """
-WebSocket URL Configuration
+WebSocket and streaming URL Configuration
 
-This module defines the WebSocket URL patterns for the notification system.
-Each URL pattern maps to a specific consumer that handles the WebSocket connection.
+This module defines the WebSocket and long-lived HTTP URL patterns for the
+notification system. Each URL pattern maps to a specific consumer that
+handles the connection.
 
 URL Patterns:
     - ws/notifications/: Handles real-time notifications for authenticated users
+    - api/notifications/stream/: The same notifications as Server-Sent Events
 """
 
 websocket_urlpatterns = [
@@ -17,4 +20,13 @@ websocket_urlpatterns = [
         consumers.NotificationsConsumer.as_asgi(),
         name='notifications'
     ),
-]
\ No newline at end of file
+]
+# Routed ahead of Django in asgi.py; each pattern authenticates itself so
+# ordinary requests do not pay for the session lookup
+http_urlpatterns = [
+    re_path(
+        r'^api/notifications/stream/$',
+        TokenAuthMiddlewareStack(consumers.NotificationStreamConsumer.as_asgi()),
+        name='notifications-stream'
+    ),
+]
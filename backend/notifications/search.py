@@ -0,0 +1,113 @@
+"""
+Full-text search over notification titles and messages.
+
+``search_vector`` is a stored generated ``tsvector`` column with a GIN index,
+weighting the title above the message. PostgreSQL keeps it up to date on
+every write, so nothing in Django assigns it and the model does not declare
+it (Django 4.2 has no generated fields); queries reach it through
+``SearchVectorColumn``. ``install_search_vector`` creates both, from
+migration ``0013_notifications_search_vector`` and again after every
+``migrate`` so databases built without migrations (the test suite) have
+them too.
+
+Both the inbox ``?q=`` parameter and the admin search go through ``search``
+so they match the same rows and hit the same index instead of scanning with
+``ILIKE '%term%'``.
+"""
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVectorExact, SearchVectorField
+)
+from django.db import connections
+from django.db.models import Expression, FloatField
+from django.db.models.functions import Cast
+
+from .models import Notifications
+
+SEARCH_CONFIG = 'english'
+
+SEARCH_COLUMN = 'search_vector'
+
+SEARCH_INDEX = 'notif_search_vector_idx'
+
+
+def install_search_vector(connection):
+    """
+    Adds the generated column and its GIN index unless they exist.
+
+    Both cascade to the partitions when the table is partitioned.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    table = connection.ops.quote_name(Notifications._meta.db_table)
+    column = connection.ops.quote_name(SEARCH_COLUMN)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} tsvector '
+            f'GENERATED ALWAYS AS ('
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(\"title\", '')), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(\"message\", '')), 'B')"
+            f') STORED'
+        )
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {connection.ops.quote_name(SEARCH_INDEX)} '
+            f'ON {table} USING gin ({column})'
+        )
+
+
+def uninstall_search_vector(connection):
+    if connection.vendor != 'postgresql':
+        return
+    table = connection.ops.quote_name(Notifications._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(SEARCH_INDEX)}')
+        cursor.execute(
+            f'ALTER TABLE {table} DROP COLUMN IF EXISTS {connection.ops.quote_name(SEARCH_COLUMN)}'
+        )
+
+
+def ensure_search_vector(using, **kwargs):
+    """``post_migrate`` receiver installing the column once the table exists."""
+    connection = connections[using]
+    if Notifications._meta.db_table in connection.introspection.table_names():
+        install_search_vector(connection)
+
+
+class SearchVectorColumn(Expression):
+    """The generated ``search_vector`` column of the queried notifications."""
+
+    output_field = SearchVectorField()
+
+    def as_sql(self, compiler, connection):
+        alias = compiler.query.get_initial_alias()
+        return (
+            f'{compiler.quote_name_unless_alias(alias)}.{connection.ops.quote_name(SEARCH_COLUMN)}',
+            [],
+        )
+
+
+def search_query(terms):
+    """Parses user input with web search syntax (quotes, ``or``, ``-``)."""
+    return SearchQuery(terms, config=SEARCH_CONFIG, search_type='websearch')
+
+
+def matches(terms):
+    """
+    The ``search_vector @@ query`` condition, usable in ``filter`` and ``Q``.
+    """
+    return SearchVectorExact(SearchVectorColumn(), search_query(terms))
+
+
+def search(queryset, terms):
+    """
+    Narrows ``queryset`` to notifications matching ``terms``.
+
+    The rows are annotated with ``search_rank`` (``ts_rank`` of the match),
+    which ``pagination`` orders ranked results by. It is cast to double
+    precision: a ``real`` read back into Python no longer compares equal to
+    itself, which would break the rank bound of the next page's cursor.
+    """
+    query = search_query(terms)
+    return queryset.alias(search_vector=SearchVectorColumn()).annotate(
+        search_rank=Cast(SearchRank(SearchVectorColumn(), query), FloatField()),
+    ).filter(search_vector=query)
@@ -5,7 +5,7 @@ This module defines how the model instances should be converted to and from JSON
 
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Notifications, UserPreferences
+from .models import Announcement, Notifications, UserPreferences, NotificationType
 
 class UserSerializer(serializers.ModelSerializer):
     """
@@ -39,9 +39,22 @@ class NotificationsSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'recipient', 'notification_type',
             'title', 'message', 'read',
-            'created_at', 'updated_at'
+            'priority', 'created_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']  # Prevent id, created_at, and updated_at modifications through API
+        read_only_fields = ['id', 'created_at']  # Prevent id and created_at modifications through API
+
+    def to_representation(self, instance):
+        """
+        Reports notifications covered by a read watermark as read.
+
+        Relies on the ``watermark_read`` annotation added by
+        ``unread.with_watermark_read``; without it the stored flag is
+        returned as is.
+        """
+        data = super().to_representation(instance)
+        if getattr(instance, 'watermark_read', False):
+            data['read'] = True
+        return data
 
     def validate_notification_type(self, value):
         """
@@ -59,7 +72,7 @@ class NotificationsSerializer(serializers.ModelSerializer):
             serializers.ValidationError: If notification type is invalid
         """
         valid_types = ['TASK_UPDATED', 'TASK_ASSIGNED', 'TASK_COMPLETED']
-        if value not in valid_types:
+        if value.name not in valid_types:
             raise serializers.ValidationError(
                 f"Invalid notification type. Must be one of: {', '.join(valid_types)}"
             )
@@ -78,33 +91,75 @@ class UserPreferencesSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserPreferences
         fields = [
-            'id', 'user', 'task_updated',
-            'task_assigned', 'task_completed'
+            'id', 'user', 'email_notifications',
+            'push_notifications', 'enabled_types'
         ]
         read_only_fields = ['id', 'user']  # Prevent id and user modifications through API
 
+class BulkNotificationSerializer(serializers.Serializer):
+    """
+    Validates a bulk fan-out request.
+
+    Exactly one of ``recipients`` (explicit user IDs) or ``recipient_query``
+    (a filter over active users) must be given. ``recipient_query`` accepts
+    an optional ``group`` name; an empty query targets every active user.
+    """
+
+    notification_type = serializers.PrimaryKeyRelatedField(
+        queryset=NotificationType.objects.all()
+    )
+    title = serializers.CharField(max_length=200)
+    message = serializers.CharField()
+    priority = serializers.ChoiceField(
+        choices=Notifications.PRIORITY_CHOICES,
+        default='MEDIUM'
+    )
+    recipients = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=False
+    )
+    recipient_query = serializers.DictField(required=False)
+
+    def validate_recipient_query(self, value):
+        """
+        Ensures only supported recipient filters are used.
+
+        Raises:
+            serializers.ValidationError: If an unknown filter key is given
+        """
+        unknown = set(value) - {'group'}
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unsupported recipient filters: {', '.join(sorted(unknown))}"
+            )
+        return value
+
     def validate(self, data):
         """
-        Validates the entire UserPreferences instance.
-        
-        Ensures at least one notification type is enabled to prevent
-        users from completely disabling all notifications.
-        
-        Args:
-            data: The preference data to validate
-            
-        Returns:
-            The validated preference data
-            
+        Ensures the request names its recipients exactly one way.
+
         Raises:
-            serializers.ValidationError: If all preferences are disabled
+            serializers.ValidationError: If both or neither recipient options are set
         """
-        if not any([
-            data.get('task_updated', True),
-            data.get('task_assigned', True),
-            data.get('task_completed', True)
-        ]):
+        if ('recipients' in data) == ('recipient_query' in data):
             raise serializers.ValidationError(
-                "At least one notification type must be enabled"
+                "Provide exactly one of 'recipients' or 'recipient_query'"
             )
         return data
+
+class AnnouncementSerializer(serializers.ModelSerializer):
+    """
+    Serializer for Announcement model.
+
+    Used both to validate a broadcast request and to send the announcement
+    to subscribers.
+    """
+
+    class Meta:
+        model = Announcement
+        fields = [
+            'id', 'notification_type', 'title',
+            'message', 'priority', 'created_at'
+        ]
+        read_only_fields = ['id', 'created_at']
@@ -0,0 +1,11 @@
+import pytest
+from django.core.cache import cache
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    # User IDs are reused from test to test, and the inbox cache's
+    # generation bumps run on commit, which never happens inside a test's
+    # transaction: a page cached by one test would be served to the next
+    cache.clear()
+    yield
+    cache.clear()
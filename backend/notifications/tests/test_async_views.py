@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import AsyncClient
+from django.urls import reverse
+from notifications.models import Notifications, NotificationType
+from notifications.views import NotificationsViewSet
+from notifications import tokens
+
+def test_viewset_views_are_coroutines():
+    view = NotificationsViewSet.as_view({'get': 'list', 'post': 'create'})
+    assert asyncio.iscoroutinefunction(view)
+    assert view.csrf_exempt
+    assert view.cls is NotificationsViewSet
+
+@sync_to_async
+def create_inbox():
+    user = User.objects.create_user(username='asyncuser', password='testpass')
+    notification_type = NotificationType.objects.create(name='TASK_ASSIGNED', description='Assigned')
+    for n in range(3):
+        Notifications.objects.create(
+            recipient=user, notification_type=notification_type,
+            title=f'Notification {n}', message='Body'
+        )
+    return user, tokens.issue_pair(user)['access']
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+class TestAsyncViews:
+    async def test_hot_endpoints_with_signed_token(self):
+        user, access = await create_inbox()
+        client = AsyncClient()
+        auth = {'Authorization': f'Bearer {access}'}
+
+        response = await client.get(reverse('notification-list'), headers=auth)
+        assert response.status_code == 200
+        assert len(response.json()['results']) == 3
+        assert response['ETag']
+        cached = await client.get(reverse('notification-list'), headers={**auth, 'If-None-Match': response['ETag']})
+        assert cached.status_code == 304
+
+        response = await client.get(reverse('notification-list'), {'type': 'TASK_ASSIGNED', 'page_size': 2}, headers=auth)
+        assert [n['title'] for n in response.json()['results']] == ['Notification 2', 'Notification 1']
+        assert response.json()['next_cursor']
+
+        response = await client.get(reverse('notification-unread-count'), headers=auth)
+        assert response.json() == {'total': 3, 'by_type': {'TASK_ASSIGNED': 3}}
+
+        first = (await client.get(reverse('notification-list'), headers=auth)).json()['results'][0]['id']
+        response = await client.post(
+            reverse('notification-mark-read'), {'notification_ids': [first]},
+            content_type='application/json', headers=auth
+        )
+        assert response.status_code == 200
+        response = await client.get(reverse('notification-unread-count'), headers=auth)
+        assert response.json()['total'] == 2
+
+        response = await client.get(reverse('preference-list'), headers=auth)
+        assert response.status_code == 200
+        assert response.json()['enabled_types'] == []
+        assert (await client.get(reverse('preference-list'), headers=auth)).json()['user']['id'] == user.id
+
+    async def test_sync_actions_and_errors(self):
+        _, access = await create_inbox()
+        client = AsyncClient()
+        auth = {'Authorization': f'Bearer {access}'}
+
+        response = await client.get(reverse('notification-changes'), headers=auth)
+        assert response.status_code == 200
+
+        response = await client.get(reverse('notification-list'), {'type': 'X', 'cursor': 'garbage'}, headers=auth)
+        assert response.status_code == 404
+
+        assert (await AsyncClient().get(reverse('notification-unread-count'))).status_code == 401
+        forged = {'Authorization': 'Bearer forged'}
+        assert (await AsyncClient().get(reverse('notification-unread-count'), headers=forged)).status_code == 401
@@ -0,0 +1,111 @@
+import pytest
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from notifications.consumers import NotificationsConsumer
+from notifications.middleware import TokenAuthMiddlewareStack
+from notifications.models import ExternalDelivery, NotificationType
+from notifications import authentication
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    authentication.local_cache.clear()
+    cache.clear()
+    yield
+    authentication.local_cache.clear()
+
+@pytest.fixture
+def token(db):
+    user = User.objects.create_user(username='tokenuser', password='testpass')
+    return Token.objects.create(user=user)
+
+@pytest.mark.django_db
+class TestTokenCache:
+    def test_lookup_is_served_from_local_then_shared_cache(self, token, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            assert authentication.lookup(token.key).user == token.user
+        with django_assert_num_queries(0):
+            assert authentication.lookup(token.key).user == token.user
+
+        # Another process has an empty local cache but shares the Redis layer
+        authentication.local_cache.clear()
+        with django_assert_num_queries(0):
+            assert authentication.lookup(token.key).user == token.user
+
+    def test_only_authorization_fields_are_cached(self, token):
+        user = authentication.lookup(token.key).user
+        assert (user.id, user.username, user.is_active, user.is_staff) == (
+            token.user_id, 'tokenuser', True, False
+        )
+        assert user.password == ''
+        cached = cache.get(authentication._cache_key(token.key))
+        assert cached == authentication.local_cache.get(token.key)
+        assert set(cached) == set(authentication.ENTRY_FIELDS)
+
+    def test_unknown_keys_are_cached_briefly(self, db, django_assert_num_queries):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token unknown-key')
+        with django_assert_num_queries(1):
+            assert authentication.lookup('unknown-key') is None
+        with django_assert_num_queries(0):
+            assert authentication.lookup('unknown-key') is None
+            response = client.get(reverse('notification-unread-count'))
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        # A token created with the key afterwards is not shadowed
+        user = User.objects.create_user(username='latecomer', password='testpass')
+        Token.objects.create(user=user, key='unknown-key')
+        assert authentication.lookup('unknown-key').user == user
+
+    def test_local_entries_are_copies(self, token):
+        first = authentication.lookup(token.key)
+        first.user.username = 'changed'
+        assert authentication.lookup(token.key).user.username == 'tokenuser'
+
+    def test_deleted_token_is_forgotten(self, token):
+        key = token.key
+        authentication.lookup(key)
+        token.delete()
+        assert authentication.lookup(key) is None
+
+    def test_deactivated_user_is_rejected(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        assert client.get(reverse('notification-unread-count')).status_code == status.HTTP_200_OK
+
+        token.user.is_active = False
+        token.user.save()
+        response = client.get(reverse('notification-unread-count'))
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert authentication.lookup(token.key) is None
+
+    def test_created_notification_has_the_whole_recipient(self, token):
+        token.user.email = 'tokenuser@example.com'
+        token.user.save()
+        notification_type, _ = NotificationType.objects.get_or_create(name='TASK_ASSIGNED')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        response = client.post(reverse('notification-list'), {
+            'notification_type': notification_type.id, 'title': 'Hello', 'message': 'World',
+        })
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['recipient']['email'] == 'tokenuser@example.com'
+        # The recipient is offline, so email is queued along with push
+        assert 'email' in ExternalDelivery.objects.filter(
+            user=token.user
+        ).values_list('channel', flat=True)
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_websocket_connect_uses_token_cache(token):
+    application = TokenAuthMiddlewareStack(NotificationsConsumer.as_asgi())
+    communicator = WebsocketCommunicator(application, f'/ws/notifications/?token={token.key}')
+    connected, _ = await communicator.connect()
+    assert connected
+    await communicator.disconnect()
+    assert authentication.local_cache.get(token.key)['user_id'] == token.user_id
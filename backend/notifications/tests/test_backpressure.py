@@ -0,0 +1,249 @@
+import asyncio
+import base64
+import os
+import socket
+import struct
+import time
+from functools import partial
+import pytest
+from channels.sessions import InstanceSessionWrapper
+from daphne.server import Server
+from daphne.testing import DaphneProcess
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from notifications.backpressure import (
+    EncodedFrame, OutboundQueue, QueueOverflow, RESYNC_CLOSE_CODE, transport_backpressure
+)
+from notifications.consumers import NotificationsConsumer
+from notifications import delivery, metrics
+
+def frame(pk, priority='MEDIUM'):
+    return {'type': 'notification', 'notification': {'id': pk, 'priority': priority}}
+
+class BlockedSocket:
+    """Collects frames, but only once ``release`` is called."""
+
+    def __init__(self):
+        self.sent = []
+        self.released = asyncio.Event()
+
+    async def send(self, content):
+        await self.released.wait()
+        self.sent.append(content)
+
+    async def release(self):
+        self.released.set()
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+@pytest.mark.asyncio
+class TestOutboundQueue:
+    @pytest.fixture(autouse=True)
+    def clean_metrics(self):
+        metrics.reset()
+
+    async def occupy_writer(self, queue):
+        # The writer takes frame 0 and blocks on the socket
+        await asyncio.sleep(0)
+        queue.put(frame(0))
+        await asyncio.sleep(0)
+
+    async def test_drop_oldest_discards_low_priority(self):
+        socket = BlockedSocket()
+        queue = OutboundQueue(socket.send, maxsize=3, policy='drop_oldest')
+        await self.occupy_writer(queue)
+        for pk in (1, 2, 3, 4):
+            queue.put(frame(pk, 'LOW' if pk < 3 else 'MEDIUM'))
+
+        await socket.release()
+        # Frame 1, the oldest LOW one, made room for frame 4
+        assert [f['notification']['id'] for f in socket.sent] == [0, 2, 3, 4]
+        assert metrics.snapshot()['counters']['ws_outbound_dropped_frames'] == 1
+        queue.close()
+
+    async def test_coalesce_counts_skipped_notifications(self):
+        socket = BlockedSocket()
+        queue = OutboundQueue(socket.send, maxsize=2, policy='coalesce')
+        await self.occupy_writer(queue)
+        for pk in range(1, 6):
+            queue.put(frame(pk))
+
+        await socket.release()
+        assert [f.get('notification', {}).get('id') for f in socket.sent] == [0, 1, 2, None]
+        assert socket.sent[-1] == {'type': 'notifications_skipped', 'count': 3}
+        assert metrics.snapshot()['maxima']['ws_outbound_queue_depth'] == 2
+        queue.close()
+
+    async def test_replies_are_never_dropped(self):
+        socket = BlockedSocket()
+        queue = OutboundQueue(socket.send, maxsize=1, policy='coalesce')
+        await self.occupy_writer(queue)
+        queue.put({'type': 'notifications_list', 'notifications': []})
+        with pytest.raises(QueueOverflow):
+            queue.put({'type': 'notifications_list', 'notifications': []})
+        queue.close()
+        assert metrics.snapshot()['gauges']['ws_outbound_queued_frames'] == 0
+
+class SlowClientConsumer(NotificationsConsumer):
+    async def write_frame(self, content):
+        await asyncio.sleep(10)
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_slow_client_is_closed_with_resync_code(settings):
+    settings.NOTIFICATIONS_COALESCE_WINDOW_MS = 0
+    settings.NOTIFICATIONS_OUTBOUND_QUEUE_SIZE = 2
+    settings.NOTIFICATIONS_OUTBOUND_POLICY = 'close'
+    user = User(id=6161, username='slowuser')
+    communicator = WebsocketCommunicator(SlowClientConsumer.as_asgi(), '/ws/notifications/')
+    communicator.scope['user'] = user
+    connected, _ = await communicator.connect()
+    assert connected
+
+    layer = get_channel_layer()
+    for pk in range(5):
+        await layer.group_send(delivery.user_group(user.id), {
+            'type': delivery.NOTIFICATION_EVENT, 'notification': {'id': pk, 'priority': 'MEDIUM'}
+        })
+    assert await communicator.receive_output(timeout=1) == {
+        'type': 'websocket.close', 'code': RESYNC_CLOSE_CODE
+    }
+    await communicator.wait()
+
+# Far more than the kernel socket buffers of a loopback connection hold
+FLOOD_FRAMES = 400
+FLOOD_FRAME = 'x' * 65536
+
+def flooding_application(use_backpressure):
+    """
+    A WebSocket application writing ``FLOOD_FRAMES`` frames through an
+    ``OutboundQueue`` as fast as it accepts them, then an ``overflow`` or
+    ``done`` frame. (Not a close frame: Daphne drops connections that do
+    not answer one within a second.)
+    """
+    async def application(scope, receive, send):
+        await receive()
+        await send({'type': 'websocket.accept'})
+
+        async def write(frame):
+            await send({'type': 'websocket.send', 'text': frame.text})
+
+        backpressure = transport_backpressure(send) if use_backpressure else None
+        queue = OutboundQueue(write, 8, 'close', backpressure)
+        try:
+            for _ in range(FLOOD_FRAMES):
+                queue.put(EncodedFrame('notification', FLOOD_FRAME, 'MEDIUM'))
+                await asyncio.sleep(0)
+            while len(queue):
+                await asyncio.sleep(0.01)
+            await send({'type': 'websocket.send', 'text': 'done'})
+        except QueueOverflow:
+            queue.close()
+            await send({'type': 'websocket.send', 'text': 'overflow'})
+        while (await receive())['type'] != 'websocket.disconnect':
+            pass
+    return application
+
+class SlowWebSocketClient:
+    """A raw WebSocket client with a tiny receive buffer that reads on demand."""
+
+    def __init__(self, port):
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        self.sock.settimeout(10)
+        self.sock.connect(('127.0.0.1', port))
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall((
+            'GET /ws/notifications/ HTTP/1.1\r\nHost: localhost\r\n'
+            'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+            f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n'
+        ).encode())
+        self.buffer = b''
+        while b'\r\n\r\n' not in self.buffer:
+            self.buffer += self.sock.recv(4096)
+        self.buffer = self.buffer.split(b'\r\n\r\n', 1)[1]
+
+    def read(self, size):
+        while len(self.buffer) < size:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError('Connection closed mid-frame')
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def frames(self):
+        """Reads frames until a short one; returns the number before it and its text."""
+        count = 0
+        while True:
+            _, length = self.read(2)
+            length &= 0x7F
+            if length == 126:
+                length, = struct.unpack('!H', self.read(2))
+            elif length == 127:
+                length, = struct.unpack('!Q', self.read(8))
+            payload = self.read(length)
+            if length < len(FLOOD_FRAME):
+                return count, payload.decode()
+            count += 1
+
+    def close(self):
+        self.sock.close()
+
+@pytest.mark.parametrize('use_backpressure', [True, False])
+def test_daphne_transport_buffer_fills_the_queue(use_backpressure):
+    # Daphne buffers websocket.send in the Twisted transport, so without the
+    # producer registration a client that does not read never fills the queue
+    process = DaphneProcess('127.0.0.1', lambda: flooding_application(use_backpressure))
+    process.start()
+    try:
+        assert process.ready.wait(10)
+        client = SlowWebSocketClient(process.port.value)
+        try:
+            # Not reading lets the kernel buffers and then the server fill up
+            time.sleep(1)
+            count, last = client.frames()
+        finally:
+            client.close()
+    finally:
+        process.terminate()
+        process.join()
+
+    if use_backpressure:
+        assert last == 'overflow'
+        assert count < FLOOD_FRAMES
+    else:
+        assert (count, last) == (FLOOD_FRAMES, 'done')
+
+class RecordingChannel:
+    def __init__(self):
+        self.producer = None
+
+    def registerProducer(self, producer, streaming):
+        assert streaming
+        self.producer = producer
+
+    def unregisterProducer(self):
+        self.producer = None
+
+class FakeProtocol:
+    def __init__(self):
+        self.transport = type('Transport', (), {'producer': RecordingChannel()})()
+
+def test_backpressure_is_found_behind_session_middleware():
+    protocol = FakeProtocol()
+    channel = protocol.transport.producer
+    send = partial(Server(application=None, endpoints=['tcp:port=0']).handle_reply, protocol)
+    wrapped = InstanceSessionWrapper({'cookies': {}}, send).send
+
+    backpressure = transport_backpressure(wrapped)
+    assert channel.producer is backpressure
+    channel.producer.pauseProducing()
+    assert backpressure.paused
+    channel.producer.resumeProducing()
+    assert not backpressure.paused
+
+    backpressure.release()
+    assert channel.producer is None
+    assert transport_backpressure(lambda message: None) is None
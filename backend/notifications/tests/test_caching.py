@@ -1,11 +1,15 @@
+import time
+from unittest import mock
 from django.test import TestCase
 from django.core.cache import cache
 from notifications.models import Notifications, NotificationType
 from django.contrib.auth.models import User
 from notifications.views import get_user_notifications
+from notifications import inbox_cache
 
 class NotificationCacheTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username='testuser', password='testpass')
         self.notification_type = NotificationType.objects.create(
             name='Test Type',
@@ -20,17 +24,42 @@ class NotificationCacheTest(TestCase):
         )
 
     def test_cache_notifications(self):
-        # Fetch notifications for the first time (should hit the database)
-        notifications = get_user_notifications(self.user)
-        self.assertEqual(len(notifications), 1)
-
-        # Fetch notifications again (should hit the cache)
-        notifications = get_user_notifications(self.user)
-        self.assertEqual(len(notifications), 1)
+        # Fetch the first page for the first time (should hit the database)
+        page = inbox_cache.get_inbox_page(self.user)
+        self.assertEqual(len(page['results']), 1)
+
+        # Fetch it again (should be served from the cache without queries)
+        with self.assertNumQueries(0):
+            page = inbox_cache.get_inbox_page(self.user)
+        self.assertEqual(page['results'][0]['title'], 'Test Notification')
+
+    def test_generation_bump_invalidates_pages(self):
+        inbox_cache.get_inbox_page(self.user)
+        Notifications.objects.create(
+            recipient=self.user,
+            notification_type=self.notification_type,
+            title='Second Notification',
+            message='This is another test notification.',
+            priority='LOW'
+        )
 
-        # Ensure the cache is set
-        cached_notifications = cache.get(f'user_notifications_{self.user.id}')
-        self.assertIsNotNone(cached_notifications)
+        # Still the cached page until the generation moves
+        self.assertEqual(len(inbox_cache.get_inbox_page(self.user)['results']), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            inbox_cache.bump_generation(self.user.id)
+        self.assertEqual(len(inbox_cache.get_inbox_page(self.user)['results']), 2)
+
+    def test_generation_expires_with_the_pages(self):
+        with self.settings(NOTIFICATIONS_INBOX_CACHE_TIMEOUT=1):
+            generation = inbox_cache.get_generation(self.user.id)
+            with mock.patch('time.time', return_value=time.time() + 2):
+                self.assertNotEqual(inbox_cache.get_generation(self.user.id), generation)
+
+    def test_deep_pages_are_not_cached(self):
+        with self.settings(NOTIFICATIONS_INBOX_CACHE_PAGES=0):
+            inbox_cache.get_inbox_page(self.user)
+            with self.assertNumQueries(1):
+                inbox_cache.get_inbox_page(self.user)
 
     def test_cache_timeout(self):
         # Fetch notifications and cache them
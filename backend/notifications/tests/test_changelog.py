@@ -0,0 +1,94 @@
+import pytest
+from datetime import timedelta
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from notifications.models import InboxChange, NotificationType
+from notifications import changelog, fanout
+
+@pytest.mark.django_db
+class TestInboxChangelog:
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user(username='syncuser', password='testpass')
+
+    @pytest.fixture
+    def client(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    @pytest.fixture
+    def notification_type(self):
+        return NotificationType.objects.create(
+            name='TASK_UPDATED',
+            description='Task has been updated'
+        )
+
+    def create_notification(self, client, notification_type):
+        response = client.post(reverse('notification-list'), {
+            'notification_type': notification_type.id,
+            'title': 'Test Notification',
+            'message': 'This is a test notification.'
+        })
+        assert response.status_code == status.HTTP_201_CREATED
+        return response.data['id']
+
+    def test_changes_since_sequence(self, client, notification_type):
+        first = self.create_notification(client, notification_type)
+        second = self.create_notification(client, notification_type)
+        client.post(reverse('notification-mark-read'), {'notification_ids': [first]}, format='json')
+        client.delete(reverse('notification-detail', args=[second]))
+
+        response = client.get(reverse('notification-changes'))
+        assert response.status_code == status.HTTP_200_OK
+        assert [(c['seq'], c['action'], c['notification_id']) for c in response.data['changes']] == [
+            (1, 'created', first), (2, 'created', second), (3, 'read', first), (4, 'deleted', second),
+        ]
+        assert response.data['changes'][0]['data']['title'] == 'Test Notification'
+        assert response.data['latest'] == 4
+
+        response = client.get(reverse('notification-changes'), {'since': 2})
+        assert [c['seq'] for c in response.data['changes']] == [3, 4]
+
+        response = client.get(reverse('notification-changes'), {'since': 4})
+        assert response.data['changes'] == []
+        assert response.data['latest'] == 4
+
+    def test_limit_and_bad_since(self, client, user, notification_type):
+        for _ in range(3):
+            self.create_notification(client, notification_type)
+        page = changelog.changes_since(user, 0, limit=2)
+        assert page['has_more'] is True
+        assert page['latest'] == 2
+
+        response = client.get(reverse('notification-changes'), {'since': 'abc'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_fan_out_numbers_each_user_separately(self, user, notification_type):
+        other = User.objects.create_user(username='syncother', password='testpass')
+        changelog.record(user.id, 'read_all')
+        fanout.fan_out(User.objects.filter(id__in=[user.id, other.id]), notification_type, 'Hi', 'All')
+
+        assert list(InboxChange.objects.filter(user=user).values_list('seq', 'action')) == [
+            (1, 'read_all'), (2, 'created')
+        ]
+        assert list(InboxChange.objects.filter(user=other).values_list('seq', flat=True)) == [1]
+
+    def test_compaction_forces_resync(self, client, user, notification_type):
+        for _ in range(3):
+            self.create_notification(client, notification_type)
+        InboxChange.objects.filter(user=user, seq__lte=2).update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+
+        assert changelog.compact(older_than=timedelta(days=7)) == 2
+        response = client.get(reverse('notification-changes'), {'since': 1})
+        assert response.data['resync'] is True
+        assert response.data['latest'] == 3
+
+        response = client.get(reverse('notification-changes'), {'since': 2})
+        assert response.data['resync'] is False
+        assert [c['seq'] for c in response.data['changes']] == [3]
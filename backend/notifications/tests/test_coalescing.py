@@ -0,0 +1,72 @@
+import pytest
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from notifications.consumers import NotificationsConsumer
+from notifications import delivery
+
+def notification_event(pk, priority='MEDIUM'):
+    return {
+        'type': delivery.NOTIFICATION_EVENT,
+        'notification': {'id': pk, 'priority': priority},
+    }
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+class TestBurstCoalescing:
+    @pytest.fixture
+    def user(self):
+        # Unsaved users are authenticated; the consumer only needs the id
+        return User(id=4242, username='burstuser')
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(NotificationsConsumer.as_asgi(), '/ws/notifications/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        assert connected
+        return communicator
+
+    async def send(self, user, *events):
+        layer = get_channel_layer()
+        for event in events:
+            await layer.group_send(delivery.user_group(user.id), event)
+
+    async def test_burst_is_sent_as_one_frame(self, user, settings):
+        settings.NOTIFICATIONS_COALESCE_WINDOW_MS = 50
+        communicator = await self.connect(user)
+
+        await self.send(user, *(notification_event(pk) for pk in range(5)))
+        frame = await communicator.receive_json_from(timeout=1)
+        assert frame['type'] == 'notifications_batch'
+        assert [n['id'] for n in frame['notifications']] == [0, 1, 2, 3, 4]
+        assert await communicator.receive_nothing(timeout=0.1)
+        await communicator.disconnect()
+
+    async def test_max_events_flushes_early(self, user, settings):
+        settings.NOTIFICATIONS_COALESCE_WINDOW_MS = 10000
+        settings.NOTIFICATIONS_COALESCE_MAX_EVENTS = 3
+        communicator = await self.connect(user)
+
+        await self.send(user, *(notification_event(pk) for pk in range(3)))
+        frame = await communicator.receive_json_from(timeout=1)
+        assert len(frame['notifications']) == 3
+        await communicator.disconnect()
+
+    async def test_high_priority_bypasses_buffer(self, user, settings):
+        settings.NOTIFICATIONS_COALESCE_WINDOW_MS = 10000
+        communicator = await self.connect(user)
+
+        await self.send(user, notification_event(1), notification_event(2, priority='HIGH'))
+        # Buffered notifications go out first so order is preserved
+        frame = await communicator.receive_json_from(timeout=1)
+        assert [n['id'] for n in frame['notifications']] == [1, 2]
+        await communicator.disconnect()
+
+    async def test_single_notification_keeps_plain_frame(self, user, settings):
+        settings.NOTIFICATIONS_COALESCE_WINDOW_MS = 10
+        communicator = await self.connect(user)
+
+        await self.send(user, notification_event(7))
+        frame = await communicator.receive_json_from(timeout=1)
+        assert frame == {'type': 'notification', 'notification': {'id': 7, 'priority': 'MEDIUM'}}
+        await communicator.disconnect()
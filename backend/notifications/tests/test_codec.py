@@ -0,0 +1,86 @@
+import datetime
+import json
+from decimal import Decimal
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from notifications.codec import CODECS, build_codec
+from notifications.consumers import NotificationsConsumer
+from notifications.models import NotificationType
+from notifications.renderers import CodecJSONRenderer
+from notifications.serializers import NotificationsSerializer
+
+def installed_codecs():
+    names = []
+    for name, build in CODECS.items():
+        try:
+            build()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+@pytest.mark.parametrize('name', installed_codecs())
+class TestCodecs:
+    def test_matches_stdlib_output(self, name):
+        codec = build_codec(name)
+        data = NotificationsSerializer({
+            'id': 1, 'recipient': {'id': 2, 'username': 'ünïcode', 'email': ''},
+            'notification_type': None, 'title': 'Hello', 'message': 'World',
+            'read': False, 'priority': 'LOW', 'created_at': None,
+        }).data
+        value = {'notification': data, 'label': gettext_lazy('Invalid token.'), 'amount': Decimal('1.5')}
+        assert json.loads(codec.dumps(value)) == json.loads(build_codec('json').dumps(value))
+
+    def test_datetimes_match_stdlib_output(self, name):
+        codec = build_codec(name)
+        value = {
+            'utc': datetime.datetime(2024, 5, 6, 7, 8, 9, tzinfo=datetime.timezone.utc),
+            'precise': datetime.datetime(2024, 5, 6, 7, 8, 9, 123456, tzinfo=datetime.timezone.utc),
+            'offset': datetime.datetime(
+                2024, 5, 6, 7, 8, 9, tzinfo=datetime.timezone(datetime.timedelta(hours=2))
+            ),
+            'date': datetime.date(2024, 5, 6),
+        }
+        assert codec.dumps(value) == build_codec('json').dumps(value)
+        assert b'"2024-05-06T07:08:09Z"' in codec.dumps(value)
+
+    def test_loads_raises_value_error(self, name):
+        codec = build_codec(name)
+        assert codec.loads(b'{"a": [1, 2]}') == codec.loads('{"a": [1, 2]}') == {'a': [1, 2]}
+        with pytest.raises(ValueError):
+            codec.loads(b'{not json')
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ImproperlyConfigured):
+        build_codec('yaml')
+
+def test_renderer_escapes_line_separators():
+    assert CodecJSONRenderer().render({'text': 'a b'}) == b'{"text":"a\\u2028b"}'
+
+@pytest.mark.django_db
+def test_api_round_trip():
+    user = User.objects.create_user(username='codecuser', password='testpass')
+    notification_type = NotificationType.objects.create(name='TASK_UPDATED', description='Updated')
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    response = client.post(
+        reverse('notification-list'),
+        data=json.dumps({'notification_type': notification_type.id, 'title': 'Über', 'message': 'Body'}),
+        content_type='application/json'
+    )
+    assert response.status_code == 201
+    assert json.loads(response.content)['title'] == 'Über'
+
+    response = client.post(reverse('notification-list'), data='{broken', content_type='application/json')
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_consumer_uses_codec():
+    text = await NotificationsConsumer.encode_json({'type': 'pong', 'text': 'é'})
+    assert isinstance(text, str)
+    assert await NotificationsConsumer.decode_json(text) == {'type': 'pong', 'text': 'é'}
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import time
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.db import transaction
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from notifications.models import Notifications, NotificationType, OutboxEvent
+from notifications.consumers import NotificationsConsumer
+from notifications import codec, delivery, fanout, outbox, presence
+
+# Generous bound for an in-memory layer; catches falling back to the poller
+MAX_LATENCY = 0.5
+
+@pytest.mark.django_db(transaction=True)
+class TestDelivery:
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user(username='deliveryuser', password='testpass')
+
+    @pytest.fixture
+    def notification_type(self):
+        return NotificationType.objects.create(
+            name='TASK_ASSIGNED',
+            description='A task has been assigned'
+        )
+
+    @pytest.fixture
+    def channel(self, user):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(delivery.user_group(user.id), channel)
+        async_to_sync(presence.register)(delivery.user_group(user.id), channel)
+        return layer, channel
+
+    def receive(self, channel, count=1):
+        layer, name = channel
+
+        async def receive_all():
+            return [
+                await asyncio.wait_for(layer.receive(name), timeout=MAX_LATENCY)
+                for _ in range(count)
+            ]
+        return async_to_sync(receive_all)()
+
+    def assert_delivered(self, channel, produce, count=1):
+        started = time.monotonic()
+        produce()
+        # Published by a background thread, not on the committing request
+        delivery.publisher.join()
+        events = self.receive(channel, count)
+        assert time.monotonic() - started < MAX_LATENCY
+        assert all(event['type'] == delivery.NOTIFICATION_EVENT for event in events)
+        # Encoded once before publishing; consumers forward the text as is
+        for event in events:
+            event['notification'] = codec.loads(event.pop('encoded'))
+        # Sent right after commit, so nothing is left for the dispatcher
+        assert not OutboxEvent.objects.exists()
+        return events
+
+    def test_rest_create_delivers(self, user, notification_type, channel):
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        def produce():
+            response = client.post(reverse('notification-list'), {
+                'notification_type': notification_type.id,
+                'title': 'From the API',
+                'message': 'Created over REST'
+            })
+            assert response.status_code == status.HTTP_201_CREATED
+
+        [event] = self.assert_delivered(channel, produce)
+        assert event['notification']['title'] == 'From the API'
+
+    def test_orm_create_delivers(self, user, notification_type, channel):
+        def produce():
+            Notifications.objects.create(
+                recipient=user,
+                notification_type=notification_type,
+                title='From the ORM',
+                message='Created directly'
+            )
+
+        [event] = self.assert_delivered(channel, produce)
+        assert event['notification']['title'] == 'From the ORM'
+
+    def test_bulk_fan_out_delivers(self, user, notification_type, channel):
+        def produce():
+            fanout.fan_out(User.objects.filter(id=user.id), notification_type, 'Broadcast', 'To all')
+
+        self.assert_delivered(channel, produce)
+
+    def test_sends_of_one_transaction_are_flushed_together(self, user, notification_type, channel):
+        def produce():
+            with transaction.atomic():
+                for i in range(3):
+                    Notifications.objects.create(
+                        recipient=user,
+                        notification_type=notification_type,
+                        title=f'Batched {i}',
+                        message='Same transaction'
+                    )
+                # Nothing leaves before the commit
+                assert OutboxEvent.objects.count() == 3
+
+        events = self.assert_delivered(channel, produce, count=3)
+        assert [e['notification']['title'] for e in events] == ['Batched 0', 'Batched 1', 'Batched 2']
+
+    def test_rolled_back_notifications_are_not_delivered(self, user, notification_type, channel):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                Notifications.objects.create(
+                    recipient=user,
+                    notification_type=notification_type,
+                    title='Never committed',
+                    message='Rolled back'
+                )
+                raise RuntimeError
+
+        with pytest.raises(asyncio.TimeoutError):
+            self.receive(channel)
+
+    def test_rolled_back_events_are_not_published_by_the_next_commit(self, user, notification_type, channel, monkeypatch):
+        submitted = []
+        monkeypatch.setattr(delivery.publisher, 'submit', lambda **job: submitted.append(job))
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                fanout.fan_out(User.objects.filter(id=user.id), notification_type, 'Never', 'Rolled back')
+                raise RuntimeError
+        fanout.fan_out(User.objects.filter(id=user.id), notification_type, 'Committed', 'Sent')
+
+        [job] = submitted
+        assert job['event_ids'] == list(OutboxEvent.objects.values_list('id', flat=True))
+
+    def test_commit_does_not_wait_for_the_channel_layer(self, user, notification_type, channel, monkeypatch):
+        release = threading.Event()
+        publish = outbox._publish
+
+        async def slow_publish(*args):
+            await sync_to_async(release.wait)()
+            return await publish(*args)
+
+        monkeypatch.setattr(outbox, '_publish', slow_publish)
+        started = time.monotonic()
+        Notifications.objects.create(
+            recipient=user, notification_type=notification_type, title='Slow layer', message='Body'
+        )
+        assert time.monotonic() - started < MAX_LATENCY
+        release.set()
+        delivery.publisher.join()
+        assert self.receive(channel)[0]['type'] == delivery.NOTIFICATION_EVENT
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_event_is_encoded_once_for_every_socket(settings, monkeypatch):
+    settings.NOTIFICATIONS_COALESCE_WINDOW_MS = 0
+    user = User(id=7171, username='encodeonce')
+    sockets = []
+    for _ in range(3):
+        communicator = WebsocketCommunicator(NotificationsConsumer.as_asgi(), '/ws/notifications/')
+        communicator.scope['user'] = user
+        assert (await communicator.connect())[0]
+        sockets.append(communicator)
+
+    calls = []
+    dumps = codec.dumps
+    monkeypatch.setattr(codec, 'dumps', lambda obj: calls.append(obj) or dumps(obj))
+    notification = {'id': 1, 'title': 'Shared', 'priority': 'MEDIUM'}
+    await sync_to_async(outbox.enqueue)(delivery.user_group(user.id), {
+        'type': delivery.NOTIFICATION_EVENT, 'notification': notification
+    })
+    await sync_to_async(outbox.dispatch_batch)()
+
+    for communicator in sockets:
+        frame = await communicator.receive_json_from(timeout=1)
+        assert frame['notification'] == notification
+        await communicator.disconnect()
+    assert calls == [notification]
@@ -0,0 +1,72 @@
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from notifications.models import NotificationType
+
+@pytest.mark.django_db(transaction=True)
+class TestConditionalRequests:
+    @pytest.fixture
+    def user(self):
+        cache.clear()
+        return User.objects.create_user(username='etaguser', password='testpass')
+
+    @pytest.fixture
+    def client(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    @pytest.fixture
+    def notification_type(self):
+        return NotificationType.objects.create(
+            name='TASK_UPDATED',
+            description='Task has been updated'
+        )
+
+    def test_list_returns_304_without_queries(self, client, notification_type, django_assert_num_queries):
+        client.post(reverse('notification-list'), {
+            'notification_type': notification_type.id,
+            'title': 'Test Notification',
+            'message': 'This is a test notification.'
+        })
+        response = client.get(reverse('notification-list'))
+        etag = response['ETag']
+
+        with django_assert_num_queries(0):
+            response = client.get(reverse('notification-list'), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+
+    def test_list_etag_changes_after_write(self, client, notification_type):
+        etag = client.get(reverse('notification-list'))['ETag']
+        client.post(reverse('notification-list'), {
+            'notification_type': notification_type.id,
+            'title': 'Test Notification',
+            'message': 'This is a test notification.'
+        })
+
+        response = client.get(reverse('notification-list'), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+        assert len(response.data['results']) == 1
+
+    def test_list_etag_depends_on_query(self, client):
+        plain = client.get(reverse('notification-list'))['ETag']
+        filtered = client.get(reverse('notification-list'), {'type': 'TASK_UPDATED'})['ETag']
+        assert plain != filtered
+
+    def test_preferences_etag(self, client, notification_type):
+        response = client.get(reverse('preference-list'))
+        assert response.status_code == status.HTTP_200_OK
+        etag = response['ETag']
+
+        response = client.get(reverse('preference-list'), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        client.post(reverse('preference-list'), {'email_notifications': False}, format='json')
+        response = client.get(reverse('preference-list'), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['email_notifications'] is False
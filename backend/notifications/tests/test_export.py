@@ -0,0 +1,76 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework.test import APIClient
+from notifications.models import Notifications, NotificationType
+from notifications import tokens
+
+def create_history(count=5):
+    user = User.objects.create_user(username='exportuser', password='testpass')
+    assigned = NotificationType.objects.create(name='TASK_ASSIGNED', description='Assigned')
+    updated = NotificationType.objects.create(name='TASK_UPDATED', description='Updated')
+    for n in range(count):
+        Notifications.objects.create(
+            recipient=user, notification_type=assigned if n % 2 else updated,
+            title=f'Notification {n}', message='=1+1' if n == 0 else 'Body'
+        )
+    return user
+
+@pytest.mark.django_db
+class TestExport:
+    @pytest.fixture
+    def client(self):
+        client = APIClient()
+        client.force_authenticate(user=create_history())
+        return client
+
+    def test_ndjson_streams_chunks_in_order(self, client, settings):
+        settings.NOTIFICATIONS_EXPORT_CHUNK_SIZE = 2
+        response = client.get(reverse('notification-export'))
+        assert response.status_code == 200
+        assert response.streaming
+        assert response['Content-Type'] == 'application/x-ndjson'
+        chunks = list(response.streaming_content)
+        # Every two rows are encoded and sent as they are read
+        assert len([chunk for chunk in chunks if chunk]) == 3
+        rows = [json.loads(line) for line in b''.join(chunks).splitlines()]
+        assert [row['title'] for row in rows] == [f'Notification {n}' for n in range(5)]
+
+    def test_csv_applies_list_filters(self, client):
+        response = client.get(reverse('notification-export'), {'output': 'csv', 'type': 'TASK_ASSIGNED'})
+        assert response['Content-Disposition'] == 'attachment; filename="notifications.csv"'
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        assert [row['title'] for row in rows] == ['Notification 1', 'Notification 3']
+
+    def test_csv_neutralizes_formulas(self, client):
+        response = client.get(reverse('notification-export'), {'output': 'csv', 'type': 'TASK_UPDATED'})
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        assert rows[0]['message'] == "'=1+1"
+
+    def test_gzip(self, client):
+        response = client.get(reverse('notification-export'), {'gzip': 'true'})
+        assert response['Content-Type'] == 'application/gzip'
+        lines = gzip.decompress(b''.join(response.streaming_content)).splitlines()
+        assert len(lines) == 5
+
+    def test_unknown_output_is_rejected(self, client):
+        assert client.get(reverse('notification-export'), {'output': 'xml'}).status_code == 400
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_asgi_export_streams_asynchronously():
+    user = await sync_to_async(create_history)()
+    access = tokens.issue_pair(user)['access']
+    response = await AsyncClient().get(
+        reverse('notification-export'), headers={'Authorization': f'Bearer {access}'}
+    )
+    assert response.status_code == 200
+    assert response.is_async
+    body = b''.join([chunk async for chunk in response.streaming_content])
+    assert len(body.splitlines()) == 5
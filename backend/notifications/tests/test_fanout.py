@@ -0,0 +1,90 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User, Group
+from notifications.models import (
+    Notifications, NotificationType, UserPreferences, ExternalDelivery
+)
+from notifications import unread
+
+@pytest.mark.django_db
+class TestBulkFanOut:
+    @pytest.fixture(autouse=True)
+    def push_configured(self, settings):
+        settings.NOTIFICATIONS_PUSH_SENDER = 'push.sender'
+
+    @pytest.fixture
+    def staff_client(self):
+        staff = User.objects.create_user(username='taskservice', password='testpass', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user=staff)
+        return client
+
+    @pytest.fixture
+    def notification_types(self):
+        return (
+            NotificationType.objects.create(name='TASK_ASSIGNED', description='Assigned'),
+            NotificationType.objects.create(name='TASK_COMPLETED', description='Completed'),
+        )
+
+    @pytest.fixture
+    def team(self, notification_types):
+        assigned, completed = notification_types
+        group = Group.objects.create(name='team-a')
+        users = [
+            User.objects.create_user(username=f'member{i}', password='testpass')
+            for i in range(30)
+        ]
+        group.user_set.add(*users)
+        # One member only wants completion notifications
+        preferences = UserPreferences.objects.create(user=users[0])
+        preferences.enabled_types.set([completed])
+        # Another explicitly wants assignments
+        preferences = UserPreferences.objects.create(user=users[1])
+        preferences.enabled_types.set([assigned])
+        return users
+
+    def test_fan_out_to_group(self, staff_client, notification_types, team, django_assert_max_num_queries):
+        assigned, _ = notification_types
+        with django_assert_max_num_queries(20):
+            response = staff_client.post(reverse('notification-bulk'), {
+                'notification_type': assigned.id,
+                'title': 'Sprint planning',
+                'message': 'You have new tasks',
+                'recipient_query': {'group': 'team-a'}
+            }, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data == {'created': 29}
+
+        assert not Notifications.objects.filter(recipient=team[0]).exists()
+        assert Notifications.objects.filter(recipient=team[1]).count() == 1
+        # Nobody is connected, so everyone is notified by push instead
+        assert ExternalDelivery.objects.filter(channel='push').count() == 29
+        assert unread.get_unread_counts(team[2])['total'] == 1
+
+    def test_fan_out_to_explicit_recipients(self, staff_client, notification_types, team):
+        assigned, _ = notification_types
+        response = staff_client.post(reverse('notification-bulk'), {
+            'notification_type': assigned.id,
+            'title': 'Review',
+            'message': 'Please review',
+            'recipients': [team[0].id, team[2].id, team[3].id]
+        }, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data == {'created': 2}
+
+    def test_requires_exactly_one_recipient_option(self, staff_client, notification_types):
+        assigned, _ = notification_types
+        response = staff_client.post(reverse('notification-bulk'), {
+            'notification_type': assigned.id,
+            'title': 'Review',
+            'message': 'Please review'
+        }, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_requires_staff(self, notification_types, team):
+        client = APIClient()
+        client.force_authenticate(user=team[2])
+        response = client.post(reverse('notification-bulk'), {}, format='json')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
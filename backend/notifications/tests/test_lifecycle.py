@@ -0,0 +1,66 @@
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from notifications.models import Notifications, NotificationType
+from notifications import unread
+
+@pytest.mark.django_db
+class TestOrmWrites:
+    """Notifications written outside the API keep the derived state in step."""
+
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user(username='ormuser', password='testpass')
+
+    @pytest.fixture
+    def notification_type(self):
+        return NotificationType.objects.create(name='TASK_ASSIGNED', description='Assigned')
+
+    @pytest.fixture
+    def client(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    def create(self, user, notification_type):
+        return Notifications.objects.create(
+            recipient=user, notification_type=notification_type, title='From a script', message='Body'
+        )
+
+    def test_create_counts_logs_and_invalidates(self, user, notification_type, client, django_capture_on_commit_callbacks):
+        etag = client.get(reverse('notification-list'))['ETag']
+        with django_capture_on_commit_callbacks(execute=True):
+            notification = self.create(user, notification_type)
+
+        response = client.get(reverse('notification-list'), HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert [n['id'] for n in response.data['results']] == [notification.id]
+        assert unread.get_unread_counts(user)['total'] == 1
+        changes = client.get(reverse('notification-changes')).data['changes']
+        assert [(c['action'], c['notification_id']) for c in changes] == [('created', notification.id)]
+
+    def test_update_and_delete(self, user, notification_type, client):
+        notification = self.create(user, notification_type)
+        notification.read = True
+        notification.save()
+        assert unread.get_unread_counts(user)['total'] == 0
+
+        notification.read = False
+        notification.save()
+        assert unread.get_unread_counts(user)['total'] == 1
+
+        notification.delete()
+        assert unread.get_unread_counts(user)['total'] == 0
+        changes = client.get(reverse('notification-changes')).data['changes']
+        assert [c['action'] for c in changes] == ['created', 'updated', 'updated', 'deleted']
+
+    def test_update_locks_the_row_before_reading_it(self, user, notification_type):
+        notification = self.create(user, notification_type)
+        notification.read = True
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            notification.save()
+        [select] = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and '"read"' in q['sql']]
+        assert select.endswith('FOR UPDATE')
@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from notifications.management.commands import generate_load_data
+from notifications.management.commands.generate_load_data import generate_notifications
+from notifications.models import Notifications
+from notifications.unread import reconcile
+
+
+class InProcessContext:
+    """Stands in for a multiprocessing context, mapping in this process."""
+
+    def Pool(self, *args, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def map(self, function, items, chunksize=None):
+        return list(map(function, items))
+
+
+@pytest.mark.django_db
+class TestGenerateLoadData:
+    @pytest.mark.parametrize('method', ['copy', 'bulk'])
+    def test_generates_users_and_notifications(self, method):
+        call_command(
+            'generate_load_data', users=5, notifications_per_user=20,
+            seed=7, method=method, fast_hasher=True, chunk_size=30
+        )
+        users = User.objects.filter(username__startswith='load7_')
+        assert users.count() == 5
+        assert users.first().check_password('password123')
+        assert Notifications.objects.filter(recipient__in=users).count() == 100
+        # Counters are maintained during the load, so nothing has drifted
+        assert reconcile(list(users.values_list('id', flat=True)), repair=False) == []
+
+    def test_same_seed_gives_same_rows(self):
+        type_ids = {'TASK_UPDATED': 1, 'TASK_ASSIGNED': 2}
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        first = list(generate_notifications([1, 2], 10, type_ids, 3, 30, now))
+        second = list(generate_notifications([1, 2], 10, type_ids, 3, 30, now))
+        assert first == second
+
+    def test_rows_do_not_depend_on_workers(self, monkeypatch):
+        # Blocks of two users, so three users span more than one block
+        monkeypatch.setattr(generate_load_data, 'SEED_BLOCK', 2)
+        jobs = []
+        monkeypatch.setattr(generate_load_data, 'load_notifications', lambda job: jobs.append(job) or 0)
+        monkeypatch.setattr(generate_load_data, 'get_context', lambda method: InProcessContext())
+
+        def rows(workers):
+            jobs.clear()
+            User.objects.filter(username__startswith='load5_').delete()
+            call_command(
+                'generate_load_data', users=3, notifications_per_user=4, seed=5,
+                workers=workers, fast_hasher=True, now=datetime(2024, 1, 1, tzinfo=timezone.utc)
+            )
+            user_ids = sorted(user_id for job in jobs for user_id in job[0])
+            # User IDs differ between runs, their positions do not
+            return [
+                (user_ids.index(row[0]),) + row[1:]
+                for job in jobs
+                for row in generate_notifications(*job[:6])
+            ]
+
+        assert rows(1) == rows(3)
+
+    def test_methods_write_the_same_rows(self):
+        now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+        def rows(method):
+            call_command(
+                'generate_load_data', users=2, notifications_per_user=5, seed=8,
+                method=method, fast_hasher=True, chunk_size=3, now=now
+            )
+            rows = sorted(
+                Notifications.objects.filter(recipient__username__startswith='load8_')
+                .values_list('recipient__username', 'notification_type_id', 'title',
+                             'message', 'created_at', 'read', 'priority')
+            )
+            # Frees the seed for the next run
+            for user in User.objects.filter(username__startswith='load8_'):
+                user.username = f'{method}_{user.username}'
+                user.save()
+            return rows
+
+        bulk = rows('bulk')
+        assert rows('copy') == bulk
+        # Spread over --days before --now, not stamped with the insert time
+        assert all(row[4] < now for row in bulk)
+
+    def test_refuses_to_reuse_seed(self):
+        call_command('generate_load_data', users=1, notifications_per_user=1, seed=9, fast_hasher=True)
+        with pytest.raises(CommandError):
+            call_command('generate_load_data', users=1, notifications_per_user=1, seed=9, fast_hasher=True)
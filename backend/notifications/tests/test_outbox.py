@@ -0,0 +1,113 @@
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+from channels.layers import InMemoryChannelLayer
+from asgiref.sync import async_to_sync
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from notifications.models import NotificationType, OutboxEvent
+from notifications import delivery, outbox, presence
+
+class FailingChannelLayer(InMemoryChannelLayer):
+    async def group_send(self, group, message):
+        raise ConnectionError('channel layer unavailable')
+
+class StalledChannelLayer(InMemoryChannelLayer):
+    async def group_send(self, group, message):
+        if group == 'user_notifications_2':
+            await asyncio.Event().wait()
+        await super().group_send(group, message)
+
+def notification_event(pk):
+    return {'type': delivery.NOTIFICATION_EVENT, 'notification': {'id': pk}}
+
+@pytest.mark.django_db
+class TestOutbox:
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user(username='outboxuser', password='testpass')
+
+    @pytest.fixture
+    def notification_type(self):
+        return NotificationType.objects.create(
+            name='TASK_COMPLETED',
+            description='A task has been completed'
+        )
+
+    def test_create_queues_event_in_transaction(self, user, notification_type):
+        async_to_sync(presence.register)(delivery.user_group(user.id), 'outbox-test-channel')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post(reverse('notification-list'), {
+            'notification_type': notification_type.id,
+            'title': 'Queued',
+            'message': 'Delivered by the dispatcher'
+        })
+        assert response.status_code == status.HTTP_201_CREATED
+
+        event = OutboxEvent.objects.get()
+        assert event.group == delivery.user_group(user.id)
+        assert event.payload['notification']['id'] == response.data['id']
+
+    def test_dispatch_publishes_in_order_and_deletes(self):
+        layer = InMemoryChannelLayer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)('user_notifications_1', channel)
+        outbox.enqueue_many([
+            ('user_notifications_1', {'type': 'new_notification', 'n': i})
+            for i in range(3)
+        ])
+
+        assert outbox.dispatch_batch(channel_layer=layer) == (3, 0)
+        received = [async_to_sync(layer.receive)(channel)['n'] for _ in range(3)]
+        assert received == [0, 1, 2]
+        assert not OutboxEvent.objects.exists()
+
+    def test_failed_events_are_retried_later(self):
+        outbox.enqueue('user_notifications_1', {'type': 'new_notification'})
+
+        assert outbox.dispatch_batch(channel_layer=FailingChannelLayer()) == (0, 1)
+        event = OutboxEvent.objects.get()
+        assert event.attempts == 1
+        # Backed off, so an immediate second pass does not claim it
+        assert outbox.dispatch_batch(channel_layer=InMemoryChannelLayer()) == (0, 0)
+
+    def test_stalled_groups_are_cancelled_and_retried(self, monkeypatch):
+        monkeypatch.setattr(outbox, 'PUBLISH_TIMEOUT', 0.1)
+        outbox.enqueue_many([
+            ('user_notifications_1', notification_event(1)),
+            ('user_notifications_2', notification_event(2)),
+        ])
+
+        assert outbox.dispatch_batch(channel_layer=StalledChannelLayer()) == (1, 1)
+        event = OutboxEvent.objects.get()
+        assert event.group == 'user_notifications_2'
+        # The retry goes out under the replay ID it was already given
+        assert 'event_id' in event.payload
+
+def test_run_async_cancels_what_the_loop_does_not_finish(monkeypatch):
+    monkeypatch.setattr(outbox, 'PUBLISH_TIMEOUT', 0.05)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    cancelled = threading.Event()
+
+    async def stalled():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    try:
+        with pytest.raises(concurrent.futures.TimeoutError):
+            outbox.run_async(stalled(), loop)
+        assert cancelled.wait(1)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
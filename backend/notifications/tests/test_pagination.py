@@ -0,0 +1,78 @@
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from notifications.models import Notifications, NotificationType
+from notifications.pagination import (
+    InvalidCursor, decode_cursor, encode_cursor, paginate_keyset
+)
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user(username='pageuser', password='testpass')
+
+    @pytest.fixture
+    def notifications(self, user):
+        notification_type = NotificationType.objects.create(
+            name='TASK_UPDATED',
+            description='Task has been updated'
+        )
+        Notifications.objects.bulk_create([
+            Notifications(
+                recipient=user,
+                notification_type=notification_type,
+                title=f'Notification {i}',
+                message=f'Message {i}'
+            )
+            for i in range(25)
+        ])
+        # Force timestamp ties so the id tiebreaker is exercised
+        Notifications.objects.filter(recipient=user).update(created_at=timezone.now())
+        return list(Notifications.objects.filter(recipient=user).order_by('-created_at', '-id'))
+
+    def test_cursor_round_trip(self, notifications):
+        created_at, pk, page = decode_cursor(encode_cursor(notifications[0], 2))
+        assert created_at == notifications[0].created_at
+        assert pk == notifications[0].pk
+        assert page == 2
+
+    def test_invalid_cursor(self):
+        with pytest.raises(InvalidCursor):
+            decode_cursor('not-a-cursor')
+
+    def test_pages_cover_inbox_without_overlap(self, user, notifications):
+        queryset = Notifications.objects.filter(recipient=user)
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = paginate_keyset(queryset, cursor, page_size=10)
+            seen.extend(n.pk for n in page)
+            if cursor is None:
+                break
+        assert seen == [n.pk for n in notifications]
+
+    def test_list_endpoint_returns_cursor(self, user, notifications):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get(reverse('notification-list'), {'page_size': 20})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 20
+        assert response.data['next_cursor'] is not None
+
+        response = client.get(
+            reverse('notification-list'),
+            {'page_size': 20, 'cursor': response.data['next_cursor']}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [n['id'] for n in response.data['results']] == [n.pk for n in notifications[20:]]
+        assert response.data['next'] is None
+
+    def test_list_endpoint_rejects_bad_cursor(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get(reverse('notification-list'), {'cursor': 'garbage'})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,74 @@
+import pytest
+from datetime import date, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from django.contrib.auth.models import User
+from notifications.models import Notifications, NotificationType
+from notifications import partitioning, unread
+
+class TestPartitionMonths:
+    def test_add_months_wraps_years(self):
+        assert partitioning.add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+        assert partitioning.add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+
+    def test_partition_name(self):
+        assert partitioning.partition_name(date(2024, 3, 1)) == 'notifications_notifications_p202403'
+
+@pytest.mark.django_db
+class TestPartitionedTable:
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user(username='partuser', password='testpass')
+
+    @pytest.fixture
+    def notification_type(self):
+        return NotificationType.objects.create(
+            name='TASK_UPDATED',
+            description='Task has been updated'
+        )
+
+    def create_notification(self, user, notification_type, title):
+        notification = Notifications.objects.create(
+            recipient=user,
+            notification_type=notification_type,
+            title=title,
+            message='Partitioned notification'
+        )
+        return notification
+
+    def test_convert_keeps_rows_and_ids(self, user, notification_type):
+        existing = self.create_notification(user, notification_type, 'Before')
+        partitioning.convert_to_partitioned(connection, months_ahead=2)
+
+        assert partitioning.is_partitioned(connection)
+        assert Notifications.objects.get(pk=existing.pk).title == 'Before'
+        created = self.create_notification(user, notification_type, 'After')
+        assert created.pk > existing.pk
+        months = [month for month, _ in partitioning.list_partitions(connection)]
+        current = partitioning.month_start(timezone.now())
+        assert months[-1] == partitioning.add_months(current, 2)
+
+    def test_retention_drops_expired_partitions(self, user, notification_type):
+        old = self.create_notification(user, notification_type, 'Old')
+        Notifications.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=120)
+        )
+        self.create_notification(user, notification_type, 'Recent')
+        call_command('manage_partitions', '--convert', stdout=StringIO())
+
+        out = StringIO()
+        call_command('manage_partitions', '--retention', '2', '--drop', stdout=out)
+        assert 'Dropped partition' in out.getvalue()
+        assert list(Notifications.objects.values_list('title', flat=True)) == ['Recent']
+        assert unread.get_unread_counts(user)['total'] == 1
+
+    def test_convert_back_to_plain(self, user, notification_type):
+        existing = self.create_notification(user, notification_type, 'Kept')
+        partitioning.convert_to_partitioned(connection)
+        partitioning.convert_to_plain(connection)
+
+        assert not partitioning.is_partitioned(connection)
+        assert Notifications.objects.get(pk=existing.pk).title == 'Kept'
+        assert self.create_notification(user, notification_type, 'New').pk > existing.pk
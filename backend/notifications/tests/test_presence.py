@@ -0,0 +1,134 @@
+import pytest
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.contrib.auth.models import User
+from notifications.consumers import NotificationsConsumer
+from notifications.models import (
+    ExternalDelivery, Notifications, NotificationType, OutboxEvent, UserPreferences
+)
+from notifications import delivery, external, presence, replay
+
+@pytest.fixture(autouse=True)
+def registry():
+    presence._registry = None
+    yield presence.get_registry()
+    presence._registry = None
+
+class TestPresenceRegistry:
+    def test_register_and_grace_period(self, settings):
+        async_to_sync(presence.register)('presence_group', 'chan-1')
+        assert presence.online_groups(['presence_group', 'other']) == {'presence_group'}
+
+        settings.NOTIFICATIONS_PRESENCE_GRACE = 0
+        async_to_sync(presence.unregister)('presence_group', 'chan-1')
+        assert presence.online_groups(['presence_group']) == set()
+
+    def test_entries_expire_without_heartbeat(self, settings):
+        settings.NOTIFICATIONS_PRESENCE_TTL = 0
+        async_to_sync(presence.register)('presence_group', 'chan-1')
+        assert presence.online_groups(['presence_group']) == set()
+
+    def test_shared_channel_layer_needs_shared_registry(self, settings):
+        settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels_redis.core.RedisChannelLayer'}}
+        presence._registry = None
+        with pytest.raises(ImproperlyConfigured):
+            presence.get_registry()
+
+def push_sender(delivery):
+    pass
+
+@pytest.mark.django_db(transaction=True)
+class TestOfflineDelivery:
+    @pytest.fixture(autouse=True)
+    def push_configured(self, settings):
+        settings.NOTIFICATIONS_PUSH_SENDER = f'{__name__}.push_sender'
+
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user(
+            username='offlineuser', email='offline@example.com', password='testpass'
+        )
+
+    @pytest.fixture
+    def notification_type(self):
+        return NotificationType.objects.create(name='TASK_ASSIGNED', description='Assigned')
+
+    def create(self, user, notification_type, title='While away'):
+        return Notifications.objects.create(
+            recipient=user, notification_type=notification_type,
+            title=title, message='You were offline'
+        )
+
+    def test_offline_user_skips_channel_layer(self, user, notification_type):
+        notification = self.create(user, notification_type)
+
+        assert not OutboxEvent.objects.exists()
+        assert set(ExternalDelivery.objects.values_list('channel', flat=True)) == {'email', 'push'}
+        # Still replayable when the client comes back with its last_event_id
+        [event] = async_to_sync(replay.events_since)(delivery.user_group(user.id), 0)
+        assert event['notification']['id'] == notification.id
+
+    def test_respects_preference_flags(self, user, notification_type):
+        UserPreferences.objects.create(user=user, email_notifications=False)
+        self.create(user, notification_type)
+        assert list(ExternalDelivery.objects.values_list('channel', flat=True)) == ['push']
+
+    def test_push_needs_a_sender(self, settings, user, notification_type):
+        settings.NOTIFICATIONS_PUSH_SENDER = ''
+        self.create(user, notification_type)
+        assert list(ExternalDelivery.objects.values_list('channel', flat=True)) == ['email']
+        assert UserPreferences.objects.create(user=user).push_notifications is False
+
+    def test_online_user_goes_through_outbox(self, user, notification_type):
+        async_to_sync(presence.register)(delivery.user_group(user.id), 'chan-1')
+        with transaction.atomic():
+            self.create(user, notification_type)
+            assert OutboxEvent.objects.count() == 1
+        assert not ExternalDelivery.objects.exists()
+
+    def test_rolled_back_offline_events_are_not_replayed(self, user, notification_type):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                self.create(user, notification_type, 'Never committed')
+                raise RuntimeError
+        self.create(user, notification_type, 'Committed')
+        delivery.publisher.join()
+
+        events = async_to_sync(replay.events_since)(delivery.user_group(user.id), 0)
+        assert [e['notification']['title'] for e in events] == ['Committed']
+
+    def test_dispatch_sends_email_and_retries_failures(self, user, notification_type):
+        self.create(user, notification_type)
+
+        assert external.dispatch_batch('email') == (1, 0)
+        assert mail.outbox[0].subject == 'While away'
+        assert mail.outbox[0].to == ['offline@example.com']
+
+        def failing_sender(delivery):
+            raise ConnectionError('push service unavailable')
+
+        assert external.dispatch_batch('push', sender=failing_sender) == (0, 1)
+        assert ExternalDelivery.objects.get().attempts == 1
+        # Backed off, so not due again yet
+        assert external.dispatch_batch('push', sender=failing_sender) == (0, 0)
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_consumer_maintains_presence(settings):
+    settings.NOTIFICATIONS_PRESENCE_GRACE = 0
+    user = User(id=6161, username='presenceuser')
+    group = delivery.user_group(user.id)
+    communicator = WebsocketCommunicator(NotificationsConsumer.as_asgi(), '/ws/notifications/')
+    communicator.scope['user'] = user
+    connected, _ = await communicator.connect()
+    assert connected
+    assert presence.online_groups([group]) == {group}
+
+    await communicator.send_json_to({'type': 'ping'})
+    assert await communicator.receive_json_from() == {'type': 'pong'}
+
+    await communicator.disconnect()
+    assert presence.online_groups([group]) == set()
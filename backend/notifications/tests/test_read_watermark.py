@@ -0,0 +1,118 @@
+import datetime
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from notifications.models import Notifications, NotificationType, ReadWatermark
+from notifications import unread
+
+@pytest.mark.django_db(transaction=True)
+class TestReadWatermark:
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user(username='watermarkuser', password='testpass')
+
+    @pytest.fixture
+    def client(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    @pytest.fixture
+    def types(self):
+        return [
+            NotificationType.objects.create(name='TASK_ASSIGNED', description='Assigned'),
+            NotificationType.objects.create(name='TASK_UPDATED', description='Updated'),
+        ]
+
+    def create_notification(self, client, notification_type):
+        response = client.post(reverse('notification-list'), {
+            'notification_type': notification_type.id,
+            'title': 'Test Notification',
+            'message': 'This is a test notification.'
+        })
+        assert response.status_code == status.HTTP_201_CREATED
+        return response.data['id']
+
+    def test_mark_all_read_leaves_rows_untouched(self, client, user, types):
+        ids = [self.create_notification(client, t) for t in types for _ in range(2)]
+
+        response = client.post(reverse('notification-mark-all-read'))
+        assert response.status_code == status.HTTP_200_OK
+
+        # Rows keep their flag; the watermark makes them read
+        assert Notifications.objects.filter(id__in=ids, read=False).count() == 4
+        assert unread.get_unread_counts(user)['total'] == 0
+        response = client.get(reverse('notification-list'))
+        assert all(n['read'] for n in response.data['results'])
+
+        newer = self.create_notification(client, types[0])
+        response = client.get(reverse('notification-list'))
+        assert [n['id'] for n in response.data['results'] if not n['read']] == [newer]
+        assert unread.get_unread_counts(user)['total'] == 1
+
+    def test_mark_all_read_for_one_type(self, client, user, types):
+        for notification_type in types:
+            self.create_notification(client, notification_type)
+
+        response = client.post(
+            reverse('notification-mark-all-read'),
+            {'notification_type': types[0].id},
+            format='json'
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert unread.get_unread_counts(user)['by_type'] == {'TASK_UPDATED': 1}
+        assert ReadWatermark.objects.get(user=user).notification_type == types[0]
+
+    def test_rejects_unknown_type(self, client, types):
+        response = client.post(
+            reverse('notification-mark-all-read'),
+            {'notification_type': 9999},
+            format='json'
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_counters_stay_consistent_below_watermark(self, client, user, types):
+        first, second = [self.create_notification(client, types[0]) for _ in range(2)]
+        client.post(reverse('notification-mark-all-read'))
+
+        # Already read through the watermark, so nothing more to decrement
+        client.post(reverse('notification-mark-read'), {'notification_ids': [first]}, format='json')
+        client.delete(reverse('notification-detail', args=[second]))
+
+        assert unread.get_unread_counts(user)['total'] == 0
+        assert unread.reconcile([user.id], repair=False) == []
+
+    def test_watermark_never_moves_back(self, user, types):
+        later = timezone.now() + datetime.timedelta(hours=1)
+        ReadWatermark.objects.create(user=user, read_before=later)
+
+        assert unread.mark_all_read(user) == later
+        assert ReadWatermark.objects.get(user=user).read_before == later
+
+    def test_create_behind_a_new_watermark_is_not_counted(self, client, user, types):
+        # Stands in for a create stamped before a concurrent mark_all_read
+        # whose counter upsert only went through after the watermark committed
+        ReadWatermark.objects.create(
+            user=user, read_before=timezone.now() + datetime.timedelta(hours=1)
+        )
+        self.create_notification(client, types[0])
+
+        assert unread.get_unread_counts(user)['total'] == 0
+        assert unread.reconcile([user.id], repair=False) == []
+
+    def test_mark_all_read_recounts_newer_notifications(self, client, user, types):
+        self.create_notification(client, types[0])
+        newer = Notifications.objects.create(
+            recipient=user, notification_type=types[1], title='Newer', message='Body'
+        )
+        # Stamped after the database clock reads it, as with a skewed app server
+        Notifications.objects.filter(id=newer.id).update(
+            created_at=timezone.now() + datetime.timedelta(hours=1)
+        )
+
+        unread.mark_all_read(user)
+        assert unread.get_unread_counts(user)['by_type'] == {'TASK_UPDATED': 1}
+        assert unread.reconcile([user.id], repair=False) == []
@@ -0,0 +1,108 @@
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from notifications.consumers import NotificationsConsumer
+from notifications.models import OutboxEvent
+from notifications import delivery, outbox, replay
+
+def notification_event(pk):
+    return {
+        'type': delivery.NOTIFICATION_EVENT,
+        'notification': {'id': pk, 'priority': 'MEDIUM'},
+    }
+
+class TestReplayBuffer:
+    def test_events_since_returns_gap(self, settings):
+        group = 'replay_test_gap'
+        ids = [async_to_sync(replay.record)(group, {'n': n})['event_id'] for n in range(3)]
+
+        events = async_to_sync(replay.events_since)(group, ids[0])
+        assert [e['n'] for e in events] == [1, 2]
+        assert [e['event_id'] for e in events] == ids[1:]
+        assert async_to_sync(replay.events_since)(group, ids[-1]) == []
+
+    def test_evicted_gap_requires_resync(self, settings):
+        settings.NOTIFICATIONS_REPLAY_BUFFER_SIZE = 2
+        group = 'replay_test_evicted'
+        for n in range(5):
+            async_to_sync(replay.record)(group, {'n': n})
+
+        assert async_to_sync(replay.events_since)(group, 1) is None
+        assert [e['n'] for e in async_to_sync(replay.events_since)(group, 4)] == [4]
+        # An ID the buffer never issued, e.g. from before a restart
+        assert async_to_sync(replay.events_since)(group, 99) is None
+
+@pytest.mark.django_db
+def test_dispatch_stamps_events_once():
+    outbox.enqueue('replay_test_dispatch', notification_event(1))
+    outbox.dispatch_batch()
+    [event] = async_to_sync(replay.events_since)('replay_test_dispatch', 0)
+    assert event['notification']['id'] == 1
+    assert not OutboxEvent.objects.exists()
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+class TestReconnectReplay:
+    async def connect(self, user, query=''):
+        communicator = WebsocketCommunicator(
+            NotificationsConsumer.as_asgi(), f'/ws/notifications/{query}'
+        )
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        assert connected
+        return communicator
+
+    async def test_reconnect_replays_missed_events(self, settings):
+        settings.NOTIFICATIONS_COALESCE_WINDOW_MS = 0
+        user = User(id=5151, username='replayuser')
+        group = delivery.user_group(user.id)
+        layer = get_channel_layer()
+
+        communicator = await self.connect(user)
+        await layer.group_send(group, await replay.record(group, notification_event(1)))
+        frame = await communicator.receive_json_from(timeout=1)
+        last_event_id = frame['event_id']
+        await communicator.disconnect()
+
+        # Published while the client was away
+        for pk in (2, 3):
+            await layer.group_send(group, await replay.record(group, notification_event(pk)))
+
+        communicator = await self.connect(user, f'?last_event_id={last_event_id}')
+        frame = await communicator.receive_json_from(timeout=1)
+        assert frame['type'] == 'notifications_batch'
+        assert [n['id'] for n in frame['notifications']] == [2, 3]
+        assert frame['last_event_id'] == last_event_id + 2
+        await communicator.disconnect()
+
+    async def test_reconnect_skips_preference_changes(self, settings):
+        user = User(id=5353, username='preferencesreplayuser')
+        group = delivery.user_group(user.id)
+        last_event_id = (await replay.record(group, notification_event(1)))['event_id']
+
+        def publish():
+            outbox.enqueue(group, {
+                'type': delivery.PREFERENCES_EVENT, 'notification_types': [1],
+            })
+            outbox.enqueue(group, notification_event(2))
+            outbox.dispatch_batch()
+        await sync_to_async(publish)()
+
+        communicator = await self.connect(user, f'?last_event_id={last_event_id}')
+        frame = await communicator.receive_json_from(timeout=1)
+        assert [n['id'] for n in frame['notifications']] == [2]
+        assert frame['last_event_id'] == last_event_id + 1
+        await communicator.disconnect()
+
+    async def test_reconnect_after_eviction_asks_for_resync(self, settings):
+        settings.NOTIFICATIONS_REPLAY_BUFFER_SIZE = 1
+        user = User(id=5252, username='resyncuser')
+        group = delivery.user_group(user.id)
+        for pk in range(3):
+            await replay.record(group, notification_event(pk))
+
+        communicator = await self.connect(user, '?last_event_id=1')
+        assert await communicator.receive_json_from(timeout=1) == {'type': 'resync'}
+        await communicator.disconnect()
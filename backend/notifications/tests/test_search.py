@@ -0,0 +1,83 @@
+import pytest
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+from notifications.models import Notifications, NotificationType
+from notifications import partitioning, search
+
+@pytest.mark.django_db
+class TestSearch:
+    @pytest.fixture
+    def user(self):
+        user = User.objects.create_user(username='searchuser', password='testpass')
+        notification_type = NotificationType.objects.create(name='TASK_ASSIGNED', description='Assigned')
+        for title, message in [
+            ('Deployment finished', 'The release went out'),
+            ('Review requested', 'Please review the deployment checklist'),
+            ('Lunch', 'Pizza in the kitchen'),
+            ('Deploying again', 'Second deployment of the day'),
+        ]:
+            Notifications.objects.create(
+                recipient=user, notification_type=notification_type, title=title, message=message
+            )
+        return user
+
+    @pytest.fixture
+    def client(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    def test_ranks_title_matches_first(self, client):
+        response = client.get(reverse('notification-list'), {'q': 'deployment'})
+        assert response.status_code == 200
+        titles = [n['title'] for n in response.data['results']]
+        assert titles[-1] == 'Review requested'
+        assert set(titles) == {'Deployment finished', 'Review requested', 'Deploying again'}
+
+    def test_pages_by_rank(self, client):
+        seen = []
+        params = {'q': 'deploy', 'page_size': 1}
+        for _ in range(5):
+            response = client.get(reverse('notification-list'), params)
+            seen += [n['title'] for n in response.data['results']]
+            if not response.data['next_cursor']:
+                break
+            params['cursor'] = response.data['next_cursor']
+        assert len(seen) == 3
+        assert seen[-1] == 'Review requested'
+
+    def test_web_search_syntax_and_other_users(self, client):
+        other = User.objects.create_user(username='otheruser', password='testpass')
+        Notifications.objects.create(
+            recipient=other, notification_type=NotificationType.objects.get(),
+            title='Deployment finished', message=''
+        )
+        response = client.get(reverse('notification-list'), {'q': 'deployment -review'})
+        assert len(response.data['results']) == 2
+
+    def test_date_cursor_is_rejected(self, client):
+        response = client.get(reverse('notification-list'), {'page_size': 1})
+        cursor = response.data['next_cursor']
+        assert client.get(reverse('notification-list'), {'q': 'lunch', 'cursor': cursor}).status_code == 404
+
+    def test_admin_search(self, user):
+        admin = site._registry[Notifications]
+        queryset, duplicates = admin.get_search_results(None, Notifications.objects.all(), 'pizza')
+        assert [n.title for n in queryset] == ['Lunch']
+        assert not duplicates
+        queryset, _ = admin.get_search_results(None, Notifications.objects.all(), 'searchuser')
+        assert queryset.count() == 4
+
+    def test_search_vector_survives_partitioning(self, user):
+        partitioning.convert_to_partitioned(connection, months_ahead=1)
+        Notifications.objects.create(
+            recipient=user, notification_type=NotificationType.objects.get(),
+            title='Quarterly report', message=''
+        )
+        found = search.search(Notifications.objects.all(), 'report deployment -lunch')
+        assert not found.exists()
+        assert search.search(Notifications.objects.all(), 'quarterly').count() == 1
+        assert search.search(Notifications.objects.all(), 'pizza').count() == 1
@@ -0,0 +1,202 @@
+import json
+import pytest
+from channels.layers import get_channel_layer
+from channels.testing import ApplicationCommunicator
+from django.contrib.auth.models import AnonymousUser, User
+from notification_system.asgi import application
+from notifications.backpressure import TransportBackpressure
+from notifications.consumers import NotificationStreamConsumer
+from notifications import consumers
+from notifications import delivery, replay
+
+def notification_event(pk, priority='MEDIUM'):
+    return delivery.wire_message({
+        'type': delivery.NOTIFICATION_EVENT,
+        'notification': {'id': pk, 'priority': priority},
+    })
+
+def parse(chunk):
+    messages = []
+    for block in chunk.decode().split('\n\n'):
+        fields = dict(
+            line.split(': ', 1) for line in block.split('\n') if line and not line.startswith(':')
+        )
+        if fields:
+            messages.append(fields)
+    return messages
+
+async def open_stream(user, headers=(), query=b''):
+    communicator = ApplicationCommunicator(NotificationStreamConsumer.as_asgi(), {
+        'type': 'http', 'method': 'GET', 'path': '/api/notifications/stream/',
+        'headers': list(headers), 'query_string': query, 'user': user,
+    })
+    await communicator.send_input({'type': 'http.request', 'body': b''})
+    start = await communicator.receive_output(timeout=1)
+    return communicator, start
+
+async def read(communicator):
+    message = await communicator.receive_output(timeout=1)
+    return message['body']
+
+class StubChannel:
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+
+    def unregisterProducer(self):
+        self.producer = None
+
+@pytest.fixture
+def transport(monkeypatch):
+    """Stands in for Daphne's transport, which the test can pause and resume."""
+    channel = StubChannel()
+    monkeypatch.setattr(consumers, 'transport_backpressure', lambda send: TransportBackpressure(channel))
+    return channel
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+class TestNotificationStream:
+    async def test_streams_group_notifications(self, settings):
+        settings.NOTIFICATIONS_SSE_FLUSH_MS = 0
+        user = User(id=6161, username='sseuser')
+        communicator, start = await open_stream(user)
+        assert start['status'] == 200
+        assert (b'Content-Type', b'text/event-stream') in start['headers']
+        assert (await read(communicator)).startswith(b':')
+
+        group = delivery.user_group(user.id)
+        await get_channel_layer().group_send(group, {**notification_event(1), 'event_id': 7})
+        [message] = parse(await read(communicator))
+        assert message['id'] == '7'
+        assert message['event'] == 'notification'
+        assert json.loads(message['data']) == {'id': 1, 'priority': 'MEDIUM'}
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=1)
+
+    async def test_flush_interval_batches_writes(self, settings):
+        settings.NOTIFICATIONS_SSE_FLUSH_MS = 100
+        user = User(id=6262, username='ssebatch')
+        communicator, _ = await open_stream(user)
+        await read(communicator)
+
+        layer = get_channel_layer()
+        group = delivery.user_group(user.id)
+        for pk in (1, 2, 3):
+            await layer.group_send(group, notification_event(pk))
+        assert [json.loads(m['data'])['id'] for m in parse(await read(communicator))] == [1, 2, 3]
+
+        # HIGH priority is written at once, with what is buffered before it
+        settings.NOTIFICATIONS_SSE_FLUSH_MS = 10000
+        await layer.group_send(group, notification_event(4))
+        await layer.group_send(group, notification_event(5, 'HIGH'))
+        assert [json.loads(m['data'])['id'] for m in parse(await read(communicator))] == [4, 5]
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=1)
+
+    async def test_last_event_id_header_replays_missed_events(self):
+        user = User(id=6363, username='sseresume')
+        group = delivery.user_group(user.id)
+        first = await replay.record(group, notification_event(1))
+        for pk in (2, 3):
+            await replay.record(group, notification_event(pk))
+
+        communicator, _ = await open_stream(
+            user, headers=[(b'last-event-id', str(first['event_id']).encode())]
+        )
+        await read(communicator)
+        messages = parse(await read(communicator))
+        assert [json.loads(m['data'])['id'] for m in messages] == [2, 3]
+        assert messages[-1]['id'] == str(first['event_id'] + 2)
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=1)
+
+    async def test_unknown_event_id_asks_for_resync(self, settings):
+        settings.NOTIFICATIONS_REPLAY_BUFFER_SIZE = 1
+        user = User(id=6464, username='sseresync')
+        communicator, _ = await open_stream(user, query=b'last_event_id=999')
+        await read(communicator)
+        assert parse(await read(communicator)) == [{'event': 'resync', 'data': '{}'}]
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=1)
+
+    async def test_heartbeat_comments(self, settings):
+        settings.NOTIFICATIONS_SSE_HEARTBEAT = 0.05
+        communicator, _ = await open_stream(User(id=6565, username='ssebeat'))
+        await read(communicator)
+        assert await read(communicator) == b': keepalive\n\n'
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=1)
+
+    async def test_paused_transport_keeps_messages_buffered(self, settings, transport):
+        settings.NOTIFICATIONS_SSE_FLUSH_MS = 0
+        user = User(id=6666, username='ssepaused')
+        communicator, _ = await open_stream(user)
+        await read(communicator)
+
+        layer = get_channel_layer()
+        group = delivery.user_group(user.id)
+        transport.producer.pauseProducing()
+        for pk in (1, 2):
+            await layer.group_send(group, notification_event(pk, 'HIGH'))
+        assert await communicator.receive_nothing(timeout=0.1)
+
+        transport.producer.resumeProducing()
+        assert [json.loads(m['data'])['id'] for m in parse(await read(communicator))] == [1, 2]
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=1)
+        assert transport.producer is None
+
+    async def test_client_that_stops_reading_is_resynced(self, settings, transport):
+        settings.NOTIFICATIONS_SSE_FLUSH_MS = 0
+        settings.NOTIFICATIONS_OUTBOUND_QUEUE_SIZE = 3
+        user = User(id=6767, username='ssestalled')
+        communicator, _ = await open_stream(user)
+        await read(communicator)
+
+        transport.producer.pauseProducing()
+        layer = get_channel_layer()
+        for pk in range(5):
+            await layer.group_send(delivery.user_group(user.id), notification_event(pk))
+        message = await communicator.receive_output(timeout=1)
+        assert parse(message['body']) == [{'event': 'resync', 'data': '{}'}]
+        assert not message.get('more_body')
+        await communicator.wait(timeout=1)
+
+    async def test_resync_after_disconnect_cleans_up_once(self):
+        consumer = NotificationStreamConsumer()
+        consumer.closed = False
+        consumer.pending = [b'data: {}\n\n']
+        consumer.flush_task = consumer.keepalive_task = consumer.backpressure = None
+        calls = []
+
+        async def unsubscribe():
+            calls.append('unsubscribe')
+            # The client disconnected; the resync runs while the groups are left
+            await consumer.end_for_resync()
+
+        async def send_body(body, more_body=False):
+            calls.append('send_body')
+
+        consumer.unsubscribe = unsubscribe
+        consumer.send_body = send_body
+        await consumer.disconnect()
+        await consumer.disconnect()
+        assert calls == ['unsubscribe']
+        assert consumer.pending == []
+
+    async def test_anonymous_request_is_rejected(self):
+        communicator, start = await open_stream(AnonymousUser())
+        assert start['status'] == 401
+        assert json.loads(await read(communicator))['detail']
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_stream_is_served_by_asgi_application():
+    communicator = ApplicationCommunicator(application, {
+        'type': 'http', 'method': 'GET', 'path': '/api/notifications/stream/',
+        'headers': [], 'query_string': b'access_token=forged',
+    })
+    await communicator.send_input({'type': 'http.request', 'body': b''})
+    start = await communicator.receive_output(timeout=1)
+    assert start['status'] == 401
+    assert (b'Content-Type', b'application/json') in start['headers']
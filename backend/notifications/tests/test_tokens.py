@@ -0,0 +1,100 @@
+import pytest
+from channels.testing import WebsocketCommunicator
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory
+from django.contrib.auth.models import User
+from notifications.authentication import SignedTokenAuthentication
+from notifications.consumers import NotificationsConsumer
+from notifications.middleware import TokenAuthMiddlewareStack
+from notifications import tokens
+
+@pytest.fixture(autouse=True)
+def denylist(monkeypatch):
+    monkeypatch.setattr(tokens, 'denylist', tokens.Denylist())
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(username='signeduser', password='testpass', email='s@example.com')
+
+def obtain(username='signeduser', password='testpass'):
+    return APIClient().post(reverse('token-pair'), {'username': username, 'password': password})
+
+def bearer_client(access):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+    return client
+
+@pytest.mark.django_db
+class TestSignedTokens:
+    def test_obtain_and_use_access_token(self, user):
+        response = obtain()
+        assert response.status_code == status.HTTP_200_OK
+        client = bearer_client(response.data['access'])
+        assert client.get(reverse('notification-unread-count')).status_code == status.HTTP_200_OK
+
+        assert obtain(password='wrong').status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_verification_runs_no_queries(self, user, django_assert_num_queries):
+        access = tokens.issue_pair(user)['access']
+        tokens.denylist.load()
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        with django_assert_num_queries(0):
+            authenticated, claims = SignedTokenAuthentication().authenticate(request)
+        assert authenticated.id == user.id
+        assert authenticated.username == 'signeduser'
+
+    def test_expired_and_tampered_tokens_are_rejected(self, user, settings):
+        access = tokens.issue_pair(user)['access']
+        assert bearer_client(access[:-2] + 'xx').get(
+            reverse('notification-unread-count')
+        ).status_code == status.HTTP_401_UNAUTHORIZED
+
+        settings.NOTIFICATIONS_ACCESS_TOKEN_TTL = -1
+        assert bearer_client(access).get(
+            reverse('notification-unread-count')
+        ).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_refresh_token_works_once(self, user):
+        pair = obtain().data
+        response = APIClient().post(reverse('token-refresh'), {'refresh': pair['refresh']})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['access'] != pair['access']
+
+        response = APIClient().post(reverse('token-refresh'), {'refresh': pair['refresh']})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_revoked_access_token_is_rejected_after_reload(self, user):
+        access = obtain().data['access']
+        client = bearer_client(access)
+        response = client.post(reverse('token-revoke'), {'token': access})
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+        # Another worker picks the revocation up from the database
+        tokens.denylist = tokens.Denylist()
+        assert client.get(reverse('notification-unread-count')).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_deactivation_revokes_every_token(self, user):
+        pair = obtain().data
+        user.is_active = False
+        user.save()
+
+        assert bearer_client(pair['access']).get(
+            reverse('notification-unread-count')
+        ).status_code == status.HTTP_401_UNAUTHORIZED
+        response = APIClient().post(reverse('token-refresh'), {'refresh': pair['refresh']})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_websocket_accepts_access_token(user):
+    access = tokens.issue_pair(user)['access']
+    application = TokenAuthMiddlewareStack(NotificationsConsumer.as_asgi())
+    communicator = WebsocketCommunicator(application, f'/ws/notifications/?access_token={access}')
+    connected, _ = await communicator.connect()
+    assert connected
+    await communicator.disconnect()
+
+    communicator = WebsocketCommunicator(application, '/ws/notifications/?access_token=forged')
+    connected, _ = await communicator.connect()
+    assert not connected
@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from notifications.consumers import NotificationsConsumer
+from notifications.models import Announcement, NotificationType, UserPreferences
+from notifications import fanout
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+class TestTopicGroups:
+    @pytest.fixture
+    def data(self):
+        assigned = NotificationType.objects.create(name='TASK_ASSIGNED', description='Assigned')
+        completed = NotificationType.objects.create(name='TASK_COMPLETED', description='Completed')
+        subscriber = User.objects.create_user(username='subscriber', password='testpass')
+        other = User.objects.create_user(username='other', password='testpass')
+        UserPreferences.objects.create(user=subscriber).enabled_types.set([assigned])
+        UserPreferences.objects.create(user=other).enabled_types.set([completed])
+        return assigned, completed, subscriber, other
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(NotificationsConsumer.as_asgi(), '/ws/notifications/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        assert connected
+        return communicator
+
+    async def test_broadcast_reaches_topic_subscribers_only(self, data):
+        assigned, _, subscriber, other = data
+        subscribed = await self.connect(subscriber)
+        unsubscribed = await self.connect(other)
+
+        await sync_to_async(fanout.announce)(assigned, 'Release', 'Shipped today')
+
+        frame = await subscribed.receive_json_from()
+        assert frame['type'] == 'announcement'
+        assert frame['announcement']['title'] == 'Release'
+        assert await unsubscribed.receive_nothing()
+        assert await sync_to_async(Announcement.objects.count)() == 1
+
+        await subscribed.disconnect()
+        await unsubscribed.disconnect()
+
+    async def test_preference_change_moves_connection_to_new_topics(self, data):
+        _, completed, subscriber, _ = data
+        communicator = await self.connect(subscriber)
+
+        def change_preferences():
+            client = APIClient()
+            client.force_authenticate(user=subscriber)
+            response = client.post(reverse('preference-list'), {
+                'notification_types': [completed.id]
+            }, format='json')
+            assert response.status_code == status.HTTP_200_OK
+
+        await sync_to_async(change_preferences)()
+        # Let the consumer handle the subscription change
+        await asyncio.sleep(0.05)
+
+        await sync_to_async(fanout.announce)(completed, 'Done', 'All tasks completed')
+        frame = await communicator.receive_json_from()
+        assert frame['announcement']['title'] == 'Done'
+        await communicator.disconnect()
+
+@pytest.mark.django_db
+def test_announcements_lists_subscribed_types():
+    assigned = NotificationType.objects.create(name='TASK_ASSIGNED', description='Assigned')
+    completed = NotificationType.objects.create(name='TASK_COMPLETED', description='Completed')
+    user = User.objects.create_user(username='reader', password='testpass')
+    UserPreferences.objects.create(user=user).enabled_types.set([assigned])
+    first = fanout.announce(assigned, 'First', 'One')
+    fanout.announce(completed, 'Hidden', 'Not subscribed')
+    fanout.announce(assigned, 'Second', 'Two')
+
+    client = APIClient()
+    client.force_authenticate(user=user)
+    response = client.get(reverse('notification-announcements'))
+    assert [a['title'] for a in response.data] == ['Second', 'First']
+
+    response = client.get(reverse('notification-announcements'), {'since': first.id})
+    assert [a['title'] for a in response.data] == ['Second']
@@ -0,0 +1,97 @@
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from django.contrib.auth.models import User
+from notifications.models import Notifications, NotificationType, UnreadCounter
+from notifications import unread
+
+@pytest.mark.django_db
+class TestUnreadCounters:
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user(username='badgeuser', password='testpass')
+
+    @pytest.fixture
+    def client(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+    @pytest.fixture
+    def notification_type(self):
+        return NotificationType.objects.create(
+            name='TASK_ASSIGNED',
+            description='A task has been assigned'
+        )
+
+    def create_notification(self, client, notification_type):
+        response = client.post(reverse('notification-list'), {
+            'notification_type': notification_type.id,
+            'title': 'Test Notification',
+            'message': 'This is a test notification.'
+        })
+        assert response.status_code == status.HTTP_201_CREATED
+        return response.data['id']
+
+    def test_create_increments_counter(self, client, user, notification_type):
+        self.create_notification(client, notification_type)
+        self.create_notification(client, notification_type)
+
+        response = client.get(reverse('notification-unread-count'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'total': 2, 'by_type': {'TASK_ASSIGNED': 2}}
+
+    def test_mark_read_decrements_once(self, client, user, notification_type):
+        notification_id = self.create_notification(client, notification_type)
+        self.create_notification(client, notification_type)
+
+        for _ in range(2):
+            response = client.post(
+                reverse('notification-mark-read'),
+                {'notification_ids': [notification_id]},
+                format='json'
+            )
+            assert response.status_code == status.HTTP_200_OK
+
+        assert Notifications.objects.get(pk=notification_id).read is True
+        assert unread.get_unread_counts(user)['total'] == 1
+
+    def test_update_and_delete_adjust_counter(self, client, user, notification_type):
+        notification_id = self.create_notification(client, notification_type)
+        other_id = self.create_notification(client, notification_type)
+
+        response = client.patch(
+            reverse('notification-detail', args=[notification_id]),
+            {'read': True},
+            format='json'
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert unread.get_unread_counts(user)['total'] == 1
+
+        response = client.delete(reverse('notification-detail', args=[other_id]))
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert unread.get_unread_counts(user)['total'] == 0
+
+    def test_reconcile_command_repairs_drift(self, user, notification_type):
+        # Rows written behind the counters' back, e.g. by a bulk import
+        Notifications.objects.bulk_create([
+            Notifications(
+                recipient=user,
+                notification_type=notification_type,
+                title=f'Imported {i}',
+                message='Imported notification'
+            )
+            for i in range(3)
+        ])
+        assert unread.get_unread_counts(user)['total'] == 0
+
+        out = StringIO()
+        call_command('reconcile_unread_counters', '--dry-run', stdout=out)
+        assert 'found drift in 1 counters' in out.getvalue()
+        assert unread.get_unread_counts(user)['total'] == 0
+
+        call_command('reconcile_unread_counters', stdout=StringIO())
+        assert UnreadCounter.objects.get(user=user, notification_type=notification_type).count == 3
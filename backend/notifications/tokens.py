@@ -0,0 +1,204 @@
+"""
+Stateless signed access and refresh tokens.
+
+Tokens are ``django.core.signing`` payloads (HMAC-SHA256 over the
+``SECRET_KEY``, with an embedded timestamp), so checking one is pure CPU:
+no token table and no password hashing. Access tokens carry the few user
+fields requests need and live for ``NOTIFICATIONS_ACCESS_TOKEN_TTL``
+seconds. Refresh tokens live for ``NOTIFICATIONS_REFRESH_TOKEN_TTL`` and
+are exchanged, once each, for a new pair; that exchange is the only step
+that reads the database, to check the user is still active.
+
+Revocation goes through a denylist of ``RevokedToken`` rows that each
+worker holds in memory and reloads every ``NOTIFICATIONS_DENYLIST_REFRESH``
+seconds. Entries only live as long as the tokens they can match, so the
+list stays small.
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.utils import timezone
+
+from .models import RevokedToken
+
+ACCESS_SALT = 'notifications.tokens.access'
+REFRESH_SALT = 'notifications.tokens.refresh'
+
+
+class InvalidToken(Exception):
+    """Raised for a token that is malformed, forged, expired or revoked."""
+
+
+class Denylist:
+    """In-memory copy of the unexpired ``RevokedToken`` entries."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.loaded_at = None
+
+    def stale(self, margin=0):
+        return (self.loaded_at is None
+                or time.monotonic() - self.loaded_at
+                >= settings.NOTIFICATIONS_DENYLIST_REFRESH - margin)
+
+    def load(self):
+        entries = {
+            key: revoked_at.timestamp()
+            for key, revoked_at in RevokedToken.objects.filter(
+                expires_at__gt=timezone.now()
+            ).values_list('key', 'revoked_at')
+        }
+        with self.lock:
+            self.entries = entries
+            self.loaded_at = time.monotonic()
+
+    def add(self, key, revoked_at):
+        with self.lock:
+            self.entries[key] = revoked_at.timestamp()
+
+    def is_revoked(self, claims):
+        entries = self.entries
+        if f"jti:{claims['jti']}" in entries:
+            return True
+        revoked_at = entries.get(f"user:{claims['uid']}")
+        return revoked_at is not None and claims['iat'] < revoked_at
+
+
+denylist = Denylist()
+
+
+def _ttl(token_type):
+    if token_type == 'access':
+        return settings.NOTIFICATIONS_ACCESS_TOKEN_TTL
+    return settings.NOTIFICATIONS_REFRESH_TOKEN_TTL
+
+
+def issue_pair(user):
+    """
+    Issues a new access and refresh token for ``user``.
+
+    Returns:
+        A dict with ``access``, ``refresh`` and ``expires_in`` (seconds)
+    """
+    issued_at = time.time()
+    access = signing.dumps({
+        'typ': 'access', 'jti': uuid.uuid4().hex, 'iat': issued_at,
+        'uid': user.id, 'usr': user.username, 'eml': user.email, 'stf': user.is_staff,
+    }, salt=ACCESS_SALT)
+    refresh = signing.dumps({
+        'typ': 'refresh', 'jti': uuid.uuid4().hex, 'iat': issued_at, 'uid': user.id,
+    }, salt=REFRESH_SALT)
+    return {
+        'access': access,
+        'refresh': refresh,
+        'expires_in': settings.NOTIFICATIONS_ACCESS_TOKEN_TTL,
+    }
+
+
+def _verify(token, salt, token_type):
+    try:
+        claims = signing.loads(token, salt=salt, max_age=_ttl(token_type))
+    except signing.BadSignature:
+        raise InvalidToken()
+    if claims.get('typ') != token_type:
+        raise InvalidToken()
+    if denylist.stale():
+        denylist.load()
+    if denylist.is_revoked(claims):
+        raise InvalidToken()
+    return claims
+
+
+def verify_access(token):
+    """
+    Returns the claims of a valid access token.
+
+    Raises:
+        InvalidToken: If the token is not a valid, live access token
+    """
+    return _verify(token, ACCESS_SALT, 'access')
+
+
+def claims_user(claims):
+    """
+    Builds the request user from access token claims without a query.
+
+    Only ``id``, ``username``, ``email`` and ``is_staff`` are populated.
+    """
+    user = User(
+        id=claims['uid'], username=claims['usr'], email=claims['eml'],
+        is_staff=claims['stf'], is_active=True
+    )
+    user._state.adding = False
+    user._state.db = 'default'
+    return user
+
+
+def refresh(token):
+    """
+    Exchanges a refresh token for a new pair, revoking the old one.
+
+    Raises:
+        InvalidToken: If the token is invalid, already used or revoked, or
+            its user is no longer active
+    """
+    claims = _verify(token, REFRESH_SALT, 'refresh')
+    user = User.objects.filter(pk=claims['uid'], is_active=True).first()
+    if user is None:
+        raise InvalidToken()
+    if not revoke(claims):
+        # Lost a race with another exchange of the same token
+        raise InvalidToken()
+    return issue_pair(user)
+
+
+def _add_entry(key, expires_at):
+    now = timezone.now()
+    RevokedToken.objects.filter(expires_at__lte=now).delete()
+    entry, created = RevokedToken.objects.update_or_create(
+        key=key, defaults={'revoked_at': now, 'expires_at': expires_at}
+    )
+    denylist.add(key, now)
+    return created
+
+
+def revoke(claims):
+    """
+    Revokes the single token with ``claims``.
+
+    Returns:
+        False if it was already revoked
+    """
+    expires_at = datetime.fromtimestamp(
+        claims['iat'] + _ttl(claims['typ']), tz=dt_timezone.utc
+    )
+    return _add_entry(f"jti:{claims['jti']}", expires_at)
+
+
+def revoke_token(token, user_id):
+    """
+    Revokes an access or refresh token of ``user_id`` given in signed form.
+
+    Raises:
+        InvalidToken: If the token is not valid or belongs to another user
+    """
+    try:
+        claims = verify_access(token)
+    except InvalidToken:
+        claims = _verify(token, REFRESH_SALT, 'refresh')
+    if claims['uid'] != user_id:
+        raise InvalidToken()
+    revoke(claims)
+
+
+def revoke_user(user_id):
+    """Revokes every token issued to a user so far."""
+    ttl = max(settings.NOTIFICATIONS_ACCESS_TOKEN_TTL, settings.NOTIFICATIONS_REFRESH_TOKEN_TTL)
+    _add_entry(f'user:{user_id}', timezone.now() + timedelta(seconds=ttl))
@@ -0,0 +1,380 @@
+"""
+Unread notification bookkeeping.
+
+Badge counts are served from the denormalized ``UnreadCounter`` table rather
+than by counting ``Notifications`` rows. Every code path that changes a
+notification's read state (create, update, delete, mark read) goes through
+the helpers in this module so the counters move in the same transaction as
+the rows they describe.
+
+"Mark all read" does not touch notification rows at all: it advances a
+``ReadWatermark`` and zeroes the affected counters. A notification is
+therefore unread only when its ``read`` flag is clear *and* it is newer than
+every watermark covering its type; ``unread_filter`` and ``watermark_covers``
+express that rule for querysets and single rows respectively.
+
+The same helpers keep the ``read`` counts of the analytics rollups in step,
+except ``mark_all_read``, whose watermark moves the rollup command counts
+later (see ``notifications.rollups``).
+"""
+
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .models import Notifications, NotificationType, ReadWatermark, UnreadCounter
+from . import rollups
+
+# Upper bound on rows per counter upsert statement
+UPSERT_CHUNK_SIZE = 5000
+
+
+def _covering_watermarks():
+    return Exists(ReadWatermark.objects.filter(
+        Q(notification_type__isnull=True) | Q(notification_type=OuterRef('notification_type')),
+        user=OuterRef('recipient'),
+        read_before__gte=OuterRef('created_at'),
+    ))
+
+
+def unread_filter():
+    """
+    Returns a ``Q`` matching notifications that are effectively unread.
+
+    Usable on any ``Notifications`` queryset, including ones spanning many
+    recipients.
+    """
+    return Q(read=False) & ~_covering_watermarks()
+
+
+def with_watermark_read(queryset):
+    """
+    Annotates ``watermark_read`` on a notifications queryset.
+
+    The serializer reports rows with the annotation set as read, so pages
+    reflect "mark all read" without an extra query.
+    """
+    return queryset.annotate(watermark_read=_covering_watermarks())
+
+
+def get_watermarks(user_id):
+    """
+    Returns a user's read watermarks.
+
+    Returns:
+        A dict mapping notification type ID (None for the all-categories
+        watermark) to its ``read_before`` timestamp
+    """
+    return dict(
+        ReadWatermark.objects.filter(user_id=user_id)
+        .values_list('notification_type_id', 'read_before')
+    )
+
+
+def watermark_covers(watermarks, notification_type_id, created_at):
+    """
+    Returns True if a notification is marked read by one of ``watermarks``.
+
+    Args:
+        watermarks: A dict as returned by ``get_watermarks``
+        notification_type_id: Type of the notification
+        created_at: Creation time of the notification
+    """
+    return any(
+        watermarks.get(key) is not None and created_at <= watermarks[key]
+        for key in (None, notification_type_id)
+    )
+
+
+def _is_unread(notification, read, notification_type_id):
+    if read:
+        return False
+    return not watermark_covers(
+        get_watermarks(notification.recipient_id), notification_type_id, notification.created_at
+    )
+
+
+def adjust_counters(deltas):
+    """
+    Applies counter deltas with a single upsert per chunk.
+
+    Args:
+        deltas: Mapping of ``(user_id, notification_type_id)`` to the amount
+            the matching counter should move by
+    """
+    # Sorted so concurrent writers lock counter rows in the same order
+    rows = sorted((key, delta) for key, delta in deltas.items() if delta)
+    if not rows:
+        return
+
+    table = connection.ops.quote_name(UnreadCounter._meta.db_table)
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+        params = []
+        for (user_id, type_id), delta in chunk:
+            params.extend([user_id, type_id, delta])
+        values = ', '.join(['(%s, %s, %s)'] * len(chunk))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, notification_type_id, count) '
+                f'VALUES {values} '
+                f'ON CONFLICT (user_id, notification_type_id) '
+                f'DO UPDATE SET count = {table}.count + EXCLUDED.count',
+                params
+            )
+
+
+def record_created(notification):
+    """Counts a newly created notification if it is unread."""
+    record_created_many([notification])
+
+
+def record_created_many(notifications):
+    """
+    Counts the unread ones of many newly created notifications at once.
+
+    New rows are normally newer than every watermark, but a ``mark_all_read``
+    that locked the counters while they were being written commits a
+    watermark covering them before the upsert below gets the lock. The
+    watermarks are read once the upsert is through, so such rows are taken
+    back out.
+    """
+    unread = [notification for notification in notifications if not notification.read]
+    if not unread:
+        return
+    adjust_counters(Counter(
+        (notification.recipient_id, notification.notification_type_id) for notification in unread
+    ))
+
+    watermarks = {}
+    for user_id, type_id, read_before in ReadWatermark.objects.filter(
+        user_id__in={notification.recipient_id for notification in unread}
+    ).values_list('user_id', 'notification_type_id', 'read_before'):
+        watermarks.setdefault(user_id, {})[type_id] = read_before
+    adjust_counters(Counter({
+        key: -count for key, count in Counter(
+            (notification.recipient_id, notification.notification_type_id)
+            for notification in unread
+            if watermark_covers(
+                watermarks.get(notification.recipient_id, {}),
+                notification.notification_type_id,
+                notification.created_at
+            )
+        ).items()
+    }))
+
+
+def record_updated(notification, was_read, old_type_id, old_priority=None):
+    """
+    Moves counters after a notification was edited.
+
+    Args:
+        notification: The notification after the update was saved
+        was_read: Its ``read`` value before the update
+        old_type_id: Its ``notification_type_id`` before the update
+        old_priority: Its ``priority`` before the update, if it may have changed
+    """
+    was_unread = _is_unread(notification, was_read, old_type_id)
+    is_unread = _is_unread(notification, notification.read, notification.notification_type_id)
+    deltas = Counter()
+    if was_unread:
+        deltas[(notification.recipient_id, old_type_id)] -= 1
+    if is_unread:
+        deltas[(notification.recipient_id, notification.notification_type_id)] += 1
+    adjust_counters(deltas)
+    rollups.record_updated(
+        notification, old_type_id, old_priority or notification.priority, was_read
+    )
+
+
+def record_deleted(notification):
+    """Uncounts a deleted notification if it was unread."""
+    was_unread = _is_unread(notification, notification.read, notification.notification_type_id)
+    if was_unread:
+        adjust_counters({
+            (notification.recipient_id, notification.notification_type_id): -1
+        })
+    rollups.record_deleted(notification)
+
+
+def mark_read(user, notification_ids):
+    """
+    Marks a user's notifications as read and decrements their counters.
+
+    The affected rows are locked first so two concurrent requests marking
+    the same notification cannot both decrement its counter.
+
+    Args:
+        user: Owner of the notifications
+        notification_ids: IDs of the notifications to mark
+
+    Returns:
+        The IDs of the notifications that changed from unread to read
+    """
+    with transaction.atomic():
+        unread = list(
+            Notifications.objects.select_for_update()
+            .filter(unread_filter(), id__in=notification_ids, recipient=user)
+            .values_list('id', 'notification_type_id', 'priority', 'created_at')
+        )
+        if not unread:
+            return []
+
+        Notifications.objects.filter(
+            id__in=[row[0] for row in unread]
+        ).update(read=True)
+        per_type = Counter(row[1] for row in unread)
+        adjust_counters({
+            (user.id, type_id): -count for type_id, count in per_type.items()
+        })
+        rollups.record_read(user, unread)
+    return [row[0] for row in unread]
+
+
+def mark_all_read(user, notification_type=None):
+    """
+    Marks a user's whole inbox, or one category of it, as read.
+
+    Advances the matching watermark and resets the matching counters, so
+    the cost does not depend on how many notifications the user has. The
+    counter rows are created if missing and locked first, so a concurrent
+    ``mark_read`` cannot decrement them below zero and a concurrent create
+    either commits first or counts itself after the watermark (see
+    ``record_created_many``).
+
+    The watermark only ever moves forward and is taken from the database
+    clock once the locks are held. Notifications stamped after it, or
+    committed while the locks were being acquired, are counted again
+    rather than assumed away.
+
+    Args:
+        user: Owner of the inbox
+        notification_type: Limit to this category; None marks everything
+
+    Returns:
+        The new watermark timestamp
+    """
+    with transaction.atomic():
+        if notification_type is not None:
+            type_ids = [notification_type.id]
+        else:
+            type_ids = list(NotificationType.objects.order_by('id').values_list('id', flat=True))
+        UnreadCounter.objects.bulk_create(
+            [UnreadCounter(user=user, notification_type_id=type_id, count=0) for type_id in type_ids],
+            ignore_conflicts=True,
+        )
+        counters = UnreadCounter.objects.select_for_update().filter(user=user)
+        if notification_type is not None:
+            counters = counters.filter(notification_type=notification_type)
+        locked = dict(counters.order_by('id').values_list('notification_type_id', 'id'))
+
+        watermark = ReadWatermark.objects.select_for_update().filter(
+            user=user, notification_type=notification_type
+        ).first()
+        read_before = _database_now()
+        if watermark is not None:
+            read_before = max(read_before, watermark.read_before)
+        if watermark is not None:
+            watermark.read_before = read_before
+            watermark.save(update_fields=['read_before'])
+        else:
+            ReadWatermark.objects.create(
+                user=user, notification_type=notification_type, read_before=read_before
+            )
+
+        remaining = Counter(
+            Notifications.objects.filter(unread_filter(), recipient=user, created_at__gt=read_before)
+            .filter(notification_type_id__in=locked)
+            .values_list('notification_type_id', flat=True)
+        )
+        UnreadCounter.objects.filter(id__in=locked.values()).update(count=0)
+        for type_id, count in remaining.items():
+            UnreadCounter.objects.filter(id=locked[type_id]).update(count=count)
+    return read_before
+
+
+def _database_now():
+    # Current time of the database rather than the application server, read
+    # when called instead of at the start of the transaction
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT STATEMENT_TIMESTAMP()')
+        return cursor.fetchone()[0]
+
+
+def _unread_counts(user):
+    return (
+        UnreadCounter.objects.filter(user=user, count__gt=0)
+        .values_list('notification_type__name', 'count')
+    )
+
+
+def get_unread_counts(user):
+    """
+    Returns a user's unread counts from the counter table.
+
+    Returns:
+        A dict with the overall ``total`` and a ``by_type`` mapping of
+        notification type name to count
+    """
+    by_type = dict(_unread_counts(user))
+    return {
+        'total': sum(by_type.values()),
+        'by_type': by_type,
+    }
+
+
+async def aget_unread_counts(user):
+    """Async version of ``get_unread_counts``."""
+    by_type = {name: count async for name, count in _unread_counts(user)}
+    return {
+        'total': sum(by_type.values()),
+        'by_type': by_type,
+    }
+
+
+def reconcile(user_ids, repair=True):
+    """
+    Recomputes the counters of a batch of users from the notifications table.
+
+    Counter rows for the batch are locked before counting so a concurrent
+    write either lands before the count (and is included in it) or waits
+    and is applied on top of the repaired value.
+
+    Args:
+        user_ids: IDs of the users to check
+        repair: When False, only report drift without writing
+
+    Returns:
+        A list of ``(user_id, notification_type_id, stored, actual)`` tuples
+        for every counter that had drifted
+    """
+    with transaction.atomic():
+        stored = {
+            (c.user_id, c.notification_type_id): c.count
+            for c in UnreadCounter.objects.select_for_update().filter(user_id__in=user_ids)
+        }
+        actual = {
+            (row['recipient_id'], row['notification_type_id']): row['total']
+            for row in Notifications.objects.filter(unread_filter(), recipient_id__in=user_ids)
+            .values('recipient_id', 'notification_type_id')
+            .annotate(total=Count('id'))
+            .order_by()
+        }
+
+        drifted = [
+            (user_id, type_id, stored.get((user_id, type_id), 0), actual.get((user_id, type_id), 0))
+            for user_id, type_id in sorted(stored.keys() | actual.keys())
+            if stored.get((user_id, type_id), 0) != actual.get((user_id, type_id), 0)
+        ]
+        if drifted and repair:
+            UnreadCounter.objects.bulk_create(
+                [
+                    UnreadCounter(user_id=user_id, notification_type_id=type_id, count=count)
+                    for user_id, type_id, _, count in drifted
+                ],
+                update_conflicts=True,
+                unique_fields=['user', 'notification_type'],
+                update_fields=['count'],
+            )
+    return drifted
@@ -17,7 +17,25 @@ API Endpoints:
         - PUT/PATCH: Update a notification
         - DELETE: Delete a notification
     - /api/notifications/mark_all_read/
-        - POST: Mark all notifications as read
+        - POST: Mark all notifications (or one notification_type) as read
+    - /api/notifications/bulk/
+        - POST: Send one notification to many recipients (staff only)
+    - /api/notifications/broadcast/
+        - POST: Announce to every subscriber of a notification type (staff only)
+    - /api/notifications/announcements/?since=<id>
+        - GET: Newest announcements of the user's subscribed types
+    - /api/notifications/changes/?since=<seq>
+        - GET: Inbox changes after a change log sequence number
+    - /api/notifications/export/?output=ndjson|csv&gzip=true
+        - GET: Stream the user's notification history (list filters apply)
+    - /api/notifications/metrics/
+        - GET: Real-time delivery metrics of the serving worker (staff only)
+    - /api/notifications/stats/?group_by=day,type,priority,cohort
+        - GET: Daily notification counts from the rollup table (staff only)
+    - /api/notifications/unread_count/
+        - GET: Unread badge counts, overall and per notification type
+    - /api/notifications/stream/
+        - GET: Server-Sent Events stream (served by the ASGI router, see routing.py)
     - /api/preferences/
         - GET: Get user preferences
         - POST: Update user preferences
@@ -0,0 +1,162 @@
+"""
+Requests per second of one ASGI worker, sync versus async API handlers.
+
+Drives Django's ASGI handler in process with many concurrent requests
+authenticated by a signed access token, first against plain DRF views that
+serve the hot endpoints with the synchronous helpers (the way every
+endpoint was served before ``notifications.async_views``), then against
+the async handlers of ``NotificationsViewSet`` and
+``UserPreferencesViewSet``. Run it against a database and cache like the
+production ones; the benchmark user's inbox is created on first use.
+
+Django still runs the hooks of every ``MiddlewareMixin`` middleware in a
+thread, so ``--no-middleware`` is there to measure the handlers alone.
+
+Usage:
+    python notifications/utils/benchmark_async_views.py [--requests 2000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import django
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'notification_system.settings')
+django.setup()
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.test.utils import override_settings
+from django.urls import path
+from rest_framework import viewsets
+from rest_framework.response import Response
+from notifications.models import Notifications, NotificationType, UserPreferences
+from notifications.pagination import NotificationCursorPagination
+from notifications.serializers import UserPreferencesSerializer
+from notifications.views import NotificationsViewSet, UserPreferencesViewSet
+from notifications import etags, inbox_cache, tokens, unread
+
+
+class SyncBaselineViewSet(viewsets.ViewSet):
+    """The hot endpoints as synchronous DRF handlers doing the same work."""
+
+    def inbox(self, request):
+        generation = inbox_cache.get_generation(request.user.id)
+        etag = etags.make_etag(request, 'inbox', request.user.id, generation)
+        paginator = NotificationCursorPagination()
+        page = inbox_cache.get_inbox_page(request.user, generation=generation)
+        response = paginator.get_cached_paginated_response(request, page)
+        response['ETag'] = etag
+        return response
+
+    def unread_count(self, request):
+        return Response(unread.get_unread_counts(request.user))
+
+    def preferences(self, request):
+        etag = etags.make_etag(
+            request, 'preferences', request.user.id,
+            etags.get_preferences_version(request.user.id)
+        )
+        preferences, _ = UserPreferences.objects.get_or_create(user=request.user)
+        response = Response(UserPreferencesSerializer(preferences).data)
+        response['ETag'] = etag
+        return response
+
+
+ENDPOINTS = ('inbox', 'unread_count', 'preferences')
+
+urlpatterns = [
+    *[path(f'sync/{name}/', SyncBaselineViewSet.as_view({'get': name})) for name in ENDPOINTS],
+    path('async/inbox/', NotificationsViewSet.as_view({'get': 'list'})),
+    path('async/unread_count/', NotificationsViewSet.as_view({'get': 'unread_count'})),
+    path('async/preferences/', UserPreferencesViewSet.as_view({'get': 'list'})),
+]
+
+
+@sync_to_async
+def benchmark_user():
+    user, created = User.objects.get_or_create(
+        username='benchmark-async-views', defaults={'email': 'benchmark@example.com'}
+    )
+    if created:
+        notification_type, _ = NotificationType.objects.get_or_create(
+            name='TASK_ASSIGNED', defaults={'description': 'Assigned'}
+        )
+        for n in range(50):
+            Notifications.objects.create(
+                recipient=user, notification_type=notification_type,
+                title=f'Task #{n} was assigned to you', message='Please review the task.'
+            )
+    return user
+
+
+async def call(application, url, headers):
+    """Sends one GET through the ASGI application and returns its status."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': url, 'raw_path': url.encode(),
+        'query_string': b'', 'root_path': '', 'headers': headers,
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    status = None
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+async def measure(application, url, headers, requests, concurrency):
+    """Returns the requests per second served for ``url``."""
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            status = await call(application, url, headers)
+            assert status == 200, f'{url} answered {status}'
+
+    await call(application, url, headers)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and mode')
+    parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+    parser.add_argument('--no-middleware', action='store_true', help='Serve without MIDDLEWARE')
+    args = parser.parse_args()
+
+    user = await benchmark_user()
+    access = tokens.issue_pair(user)['access']
+    headers = [(b'host', b'testserver'), (b'authorization', f'Bearer {access}'.encode())]
+    overrides = {'ROOT_URLCONF': __name__, 'ALLOWED_HOSTS': ['testserver']}
+    if args.no_middleware:
+        overrides['MIDDLEWARE'] = []
+
+    print(f'{args.requests} requests per endpoint, {args.concurrency} concurrent, one worker'
+          f'{", no middleware" if args.no_middleware else ""}')
+    print(f'{"endpoint":<15}{"sync req/s":>12}{"async req/s":>13}{"speedup":>9}')
+    with override_settings(**overrides):
+        # Middleware is loaded when the handler is built
+        application = get_asgi_application()
+        for name in ENDPOINTS:
+            sync = await measure(application, f'/sync/{name}/', headers, args.requests, args.concurrency)
+            native = await measure(application, f'/async/{name}/', headers, args.requests, args.concurrency)
+            print(f'{name:<15}{sync:>12.0f}{native:>13.0f}{native / sync:>8.2f}x')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""
+Micro-benchmark of the JSON codecs in notifications.codec.
+
+Serializes realistic notifications once, then times how long each installed
+codec takes to encode (and decode) them one by one, as the WebSocket
+consumer does, and as a full inbox page, as the API renderer does. Also
+compares encoding a WebSocket frame per socket with splicing the text
+pre-encoded by ``delivery.wire_message``, which is what each socket pays.
+
+Usage:
+    python notifications/utils/benchmark_codec.py [--count 10000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import django
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'notification_system.settings')
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+from notifications import codec as configured_codec, delivery
+from notifications.codec import CODECS
+from notifications.models import Notifications
+from notifications.serializers import NotificationsSerializer
+
+
+def sample_notifications(count):
+    """Serialized notifications built in memory, without the database."""
+    recipient = User(id=42, username='benchmark', email='benchmark@example.com')
+    now = timezone.now()
+    notifications = [
+        Notifications(
+            id=i, recipient=recipient, notification_type_id=1 + i % 3,
+            title=f'Task #{i} was assigned to you',
+            message='Please review the attached task and update its status. ' * 3,
+            priority=('LOW', 'MEDIUM', 'HIGH')[i % 3], read=bool(i % 2), created_at=now
+        )
+        for i in range(count)
+    ]
+    return NotificationsSerializer(notifications, many=True).data
+
+
+def best_of(repeat, func):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=10000, help='Notifications to encode')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best is kept)')
+    args = parser.parse_args()
+
+    data = sample_notifications(args.count)
+    page = {'results': list(data[:settings.NOTIFICATIONS_PAGE_SIZE]), 'next_cursor': None}
+
+    print(f'{args.count} notifications, best of {args.repeat} runs')
+    print(f'{"codec":<10}{"encode/notif":>15}{"decode/notif":>15}{"encode/page":>15}{"bytes/notif":>13}')
+    for name, build in CODECS.items():
+        try:
+            codec = build()
+        except ImportError:
+            print(f'{name:<10}{"not installed":>15}')
+            continue
+
+        encoded = [codec.dumps(item) for item in data]
+        encode = best_of(args.repeat, lambda: [codec.dumps(item) for item in data])
+        decode = best_of(args.repeat, lambda: [codec.loads(item) for item in encoded])
+        encode_page = best_of(args.repeat, lambda: codec.dumps(page))
+        size = sum(len(item) for item in encoded) / len(encoded)
+        print(
+            f'{name:<10}'
+            f'{encode / args.count * 1e6:>13.2f}us'
+            f'{decode / args.count * 1e6:>13.2f}us'
+            f'{encode_page * 1e6:>13.1f}us'
+            f'{size:>13.0f}'
+        )
+
+    events = [
+        {'type': delivery.NOTIFICATION_EVENT, 'notification': item, 'event_id': i}
+        for i, item in enumerate(data)
+    ]
+    messages = [delivery.wire_message(event) for event in events]
+    encode = best_of(args.repeat, lambda: [
+        configured_codec.dumps({'type': 'notification', 'notification': e['notification'],
+                                'event_id': e['event_id']}) for e in events
+    ])
+    splice = best_of(args.repeat, lambda: [delivery.notification_frame(m) for m in messages])
+    print(f'\nPer socket with {configured_codec.get_codec().name}: '
+          f'{encode / args.count * 1e6:.2f}us encoding the frame, '
+          f'{splice / args.count * 1e6:.2f}us splicing the pre-encoded notification')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Per-connection memory of the WebSocket and Server-Sent Events consumers.
+
+Opens the same number of idle, authenticated connections to
+``NotificationsConsumer`` and ``NotificationStreamConsumer`` in process and
+reports the Python memory (measured with tracemalloc) each one holds once
+subscribed: the consumer, its tasks and queues, its channel layer groups and
+the ASGI plumbing of the in-process test communicators, which is the same
+for both. Socket buffers of the protocol server are not included.
+
+Usage:
+    python notifications/utils/benchmark_connections.py [--connections 500]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import tracemalloc
+
+import django
+
+# Setup Django environment
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'notification_system.settings')
+django.setup()
+
+from channels.testing import ApplicationCommunicator, WebsocketCommunicator
+from django.contrib.auth.models import User
+from notifications.consumers import NotificationsConsumer, NotificationStreamConsumer
+
+
+async def open_websocket(user):
+    communicator = WebsocketCommunicator(NotificationsConsumer.as_asgi(), '/ws/notifications/')
+    communicator.scope['user'] = user
+    connected, _ = await communicator.connect()
+    assert connected
+    return communicator
+
+
+async def close_websocket(communicator):
+    await communicator.disconnect()
+
+
+async def open_stream(user):
+    communicator = ApplicationCommunicator(NotificationStreamConsumer.as_asgi(), {
+        'type': 'http', 'method': 'GET', 'path': '/api/notifications/stream/',
+        'headers': [], 'query_string': b'', 'user': user,
+    })
+    await communicator.send_input({'type': 'http.request', 'body': b''})
+    start = await communicator.receive_output(timeout=5)
+    assert start['status'] == 200
+    await communicator.receive_output(timeout=5)
+    return communicator
+
+
+async def close_stream(communicator):
+    await communicator.send_input({'type': 'http.disconnect'})
+    await communicator.wait(timeout=5)
+
+
+async def measure(count, open_connection, close_connection):
+    """Returns the bytes held per open connection."""
+    users = [User(id=1_000_000 + i, username=f'benchmark{i}') for i in range(count)]
+    # Warm up imports, caches and the channel layer outside the measurement
+    await close_connection(await open_connection(users[0]))
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    connections = [await open_connection(user) for user in users]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    for connection in connections:
+        await close_connection(connection)
+    return (after - before) / count
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--connections', type=int, default=500, help='Connections to open per transport')
+    args = parser.parse_args()
+
+    print(f'{args.connections} idle connections per transport')
+    for name, open_connection, close_connection in (
+        ('websocket', open_websocket, close_websocket),
+        ('sse', open_stream, close_stream),
+    ):
+        per_connection = await measure(args.connections, open_connection, close_connection)
+        print(f'{name:<10}{per_connection / 1024:>10.1f} KiB/connection')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,11 +1,6 @@
 import os
 import django
 import sys
-import json
-import asyncio
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from datetime import datetime
 import random
 
 # Setup Django environment
@@ -30,7 +25,7 @@ def send_test_notification(username="Bret", notification_type=None):
         
         # Get random notification type if not specified
         if not notification_type:
-            notification_type = random.choice([choice[0] for choice in NotificationType.choices])
+            notification_type = random.choice(["TASK_UPDATED", "TASK_ASSIGNED", "TASK_COMPLETED"])
         
         # Create notification content based on type
         if notification_type == "TASK_UPDATED":
@@ -43,34 +38,20 @@ def send_test_notification(username="Bret", notification_type=None):
             title = "Task Completed: Documentation"
             message = "The documentation task has been marked as complete."
         
-        # Create notification in database
-        notification = Notifications.objects.create(
+        # Create notification in database; the post_save receiver in
+        # notifications.lifecycle counts it and publishes it to the user's
+        # connected clients
+        notification_type_obj, _ = NotificationType.objects.get_or_create(
+            name=notification_type,
+            defaults={'description': notification_type.replace('_', ' ').capitalize()}
+        )
+        Notifications.objects.create(
             recipient=user,
-            notification_type=notification_type,
+            notification_type=notification_type_obj,
             title=title,
             message=message
         )
         
-        # Prepare notification data
-        notification_data = {
-            'id': notification.id,
-            'title': notification.title,
-            'message': notification.message,
-            'notification_type': notification.notification_type,
-            'created_at': notification.created_at.isoformat(),
-            'read': notification.read
-        }
-        
-        # Get channel layer and send notification
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"user_{user.id}_notifications",
-            {
-                'type': 'notification_message',
-                'message': notification_data
-            }
-        )
-        
         print(f"\nNotification sent to {username}:")
         print(f"Type: {notification_type}")
         print(f"Title: {title}")
@@ -1,130 +1,422 @@
 from django.shortcuts import render
-from rest_framework import viewsets, status, filters
-from rest_framework.decorators import action
+from rest_framework import viewsets, status
+from rest_framework.decorators import (
+    action, api_view, authentication_classes, permission_classes
+)
+from rest_framework.authtoken.serializers import AuthTokenSerializer
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from django.shortcuts import get_object_or_404
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from .models import Notifications, UserPreferences, NotificationType
-from .serializers import NotificationsSerializer, UserPreferencesSerializer
-from django.utils.dateparse import parse_datetime
+from django.contrib.auth.models import User
+from .models import (
+    Announcement, Notifications, UserPreferences, NotificationType, RollupCheckpoint,
+    push_enabled_by_default
+)
+from .serializers import (
+    AnnouncementSerializer, NotificationsSerializer, UserPreferencesSerializer,
+    BulkNotificationSerializer
+)
+from .pagination import InvalidCursor, NotificationCursorPagination
+from django.utils.dateparse import parse_date, parse_datetime
 from django.db.models import Q
-from django.core.cache import cache
+from django.db import transaction
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from asgiref.sync import sync_to_async
+from .async_views import AsyncViewSetMixin
+from . import (
+    changelog, delivery, etags, export, fanout, inbox_cache, metrics, rollups, search, tokens,
+    unread
+)
+
+# Query parameters that narrow the inbox and so bypass the page cache
+FILTER_PARAMS = ('start_date', 'end_date', 'type', 'q')
 
 def get_user_notifications(user):
-    # Always fetch fresh data from the database
-    notifications = Notifications.objects.filter(recipient=user).order_by('-created_at')
-    # Cache the notifications for 5 minutes
-    cache.set(f'user_notifications_{user.id}', notifications, timeout=300)
-    return notifications
+    # Lazy queryset; cached reads of the plain inbox go through inbox_cache
+    return unread.with_watermark_read(
+        Notifications.objects.filter(recipient=user).select_related('recipient')
+    )
 
-class NotificationsViewSet(viewsets.ModelViewSet):
+class NotificationsViewSet(AsyncViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing user notifications.
+
+    Lists are keyset paginated on ``(created_at, id)``; pass the ``cursor``
+    returned with a page to fetch the next one. ``?q=`` searches titles and
+    messages and lists the matches by relevance, also keyset paginated.
+
+    The hot read paths (list, unread count, mark read) are async handlers,
+    see ``notifications.async_views``.
     """
     serializer_class = NotificationsSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.OrderingFilter]
-    ordering_fields = ['created_at', 'is_read']
-    ordering = ['-created_at']
+    pagination_class = NotificationCursorPagination
 
     def get_queryset(self):
         queryset = get_user_notifications(self.request.user)
         
-        # Date range filtering
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        if start_date and end_date:
-            queryset = queryset.filter(
-                created_at__range=[parse_datetime(start_date), parse_datetime(end_date)]
-            )
+        # Date range filtering; either bound alone also narrows the scan and
+        # lets PostgreSQL prune partitions when the table is partitioned
+        start_date = parse_datetime(self.request.query_params.get('start_date', ''))
+        end_date = parse_datetime(self.request.query_params.get('end_date', ''))
+        if start_date:
+            queryset = queryset.filter(created_at__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(created_at__lte=end_date)
 
         # Type filtering
         notif_type = self.request.query_params.get('type')
         if notif_type:
             queryset = queryset.filter(notification_type__name=notif_type)
 
+        # Full-text search, ranked; served by the search_vector GIN index
+        terms = self.request.query_params.get('q', '').strip()
+        if terms:
+            queryset = search.search(queryset, terms)
+
         return queryset
 
+    async def list(self, request, *args, **kwargs):
+        """
+        Lists the user's notifications, serving unfiltered pages from the
+        read-through inbox cache.
+
+        Every write bumps the inbox generation, so the ETag is derived from
+        it and a matching ``If-None-Match`` is answered with 304 before any
+        query runs.
+        """
+        generation = await inbox_cache.aget_generation(request.user.id)
+        etag = etags.make_etag(request, 'inbox', request.user.id, generation)
+        if etags.etag_matches(request, etag):
+            return etags.not_modified(etag)
+
+        if any(param in request.query_params for param in FILTER_PARAMS):
+            rows = await self.paginator.apaginate_queryset(
+                self.filter_queryset(self.get_queryset()), request, view=self
+            )
+            response = self.get_paginated_response(self.get_serializer(rows, many=True).data)
+        else:
+            try:
+                page = await inbox_cache.aget_inbox_page(
+                    request.user,
+                    cursor=request.query_params.get(self.paginator.cursor_query_param),
+                    page_size=self.paginator.get_page_size(request),
+                    generation=generation
+                )
+            except InvalidCursor:
+                raise NotFound(self.paginator.invalid_cursor_message)
+            response = self.paginator.get_cached_paginated_response(request, page)
+        response['ETag'] = etag
+        return response
+
     @action(detail=False, methods=['post'])
-    def mark_read(self, request):
+    async def mark_read(self, request):
+        """
+        Marks the given notifications as read.
+
+        The async ORM cannot join a transaction, so the rows, counters and
+        change log are updated together in one synchronous block.
+        """
         notification_ids = request.data.get('notification_ids', [])
         if not notification_ids:
             return Response({'error': 'No notification IDs provided'}, 
                           status=status.HTTP_400_BAD_REQUEST)
 
-        notifications = Notifications.objects.filter(
-            id__in=notification_ids,
-            recipient=request.user
+        await sync_to_async(self.record_read)(request.user, notification_ids)
+        return Response({'status': 'notifications marked as read'})
+
+    def record_read(self, user, notification_ids):
+        with transaction.atomic():
+            marked = unread.mark_read(user, notification_ids)
+            changelog.record_many(
+                (user.id, 'read', pk, None) for pk in marked
+            )
+            inbox_cache.bump_generation(user.id)
+
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        """
+        Marks every notification, or every notification of one
+        ``notification_type``, as read by advancing the user's watermark.
+        """
+        notification_type = None
+        type_id = request.data.get('notification_type')
+        if type_id is not None:
+            notification_type = NotificationType.objects.filter(pk=type_id).first()
+            if notification_type is None:
+                return Response({'error': 'Invalid notification type'},
+                              status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            read_before = unread.mark_all_read(request.user, notification_type)
+            changelog.record(request.user.id, 'read_all', data={
+                'notification_type': type_id,
+                'read_before': read_before.isoformat(),
+            })
+            inbox_cache.bump_generation(request.user.id)
+
+        return Response({'status': 'notifications marked as read', 'read_before': read_before})
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Returns the inbox changes after sequence number ``since``.
+
+        Clients keep the returned ``latest`` and pass it back as ``since``;
+        when ``resync`` is true they must re-download the inbox first.
+        """
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            return Response({'error': 'since must be an integer'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        return Response(changelog.changes_since(request.user, since))
+
+    @action(detail=False, methods=['get'])
+    async def unread_count(self, request):
+        """
+        Returns the user's unread badge counts from the counter table.
+        """
+        return Response(await unread.aget_unread_counts(request.user))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Streams the user's whole notification history, oldest first, as
+        NDJSON or as CSV with ``output=csv``, gzipped with ``gzip=true``.
+
+        The ``start_date``, ``end_date`` and ``type`` filters of the list
+        apply.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in export.FORMATS:
+            return Response({'error': f"output must be one of: {', '.join(export.FORMATS)}"},
+                          status=status.HTTP_400_BAD_REQUEST)
+        compress = request.query_params.get('gzip', '').lower() in ('1', 'true')
+        return export.export_response(
+            request._request, self.get_queryset(), output, compress
         )
-        notifications.update(is_read=True)
 
-        # Invalidate cache
-        cache.delete(f'user_notifications_{request.user.id}')
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def metrics(self, request):
+        """
+        Returns this worker's real-time delivery metrics (queue depth,
+        dropped and coalesced frames, overflow closes).
+        """
+        return Response(metrics.snapshot())
 
-        return Response({'status': 'notifications marked as read'})
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def stats(self, request):
+        """
+        Returns notification counts per day, type and priority from the
+        daily rollups, never from the notifications table.
 
-    def perform_create(self, serializer):
-        notification = serializer.save(recipient=self.request.user)
-        # Invalidate cache for the user
-        cache.delete(f'user_notifications_{notification.recipient.id}')
-        # Send real-time notification via WebSocket
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f'user_notifications_{notification.recipient.id}',
-            {
-                'type': 'new_notification',
-                'notification': NotificationsSerializer(notification).data,
-            }
+        ``group_by`` takes a comma separated subset of day, type, priority
+        and cohort; ``start_date``, ``end_date`` (days) and ``type`` narrow
+        the counts. ``as_of`` is when the rollups last advanced.
+
+        Totals count the notifications created up to ``as_of``, less those
+        deleted since; notifications removed with their partition for
+        retention stay counted. Reads through "mark all read" are counted
+        as of ``as_of`` too, other reads right away.
+        """
+        params = request.query_params
+        group_by = [d for d in params.get('group_by', ','.join(rollups.DEFAULT_GROUP_BY)).split(',') if d]
+        if not group_by or any(d not in rollups.DIMENSIONS for d in group_by):
+            return Response({'error': f"group_by must be a subset of: {', '.join(rollups.DIMENSIONS)}"},
+                          status=status.HTTP_400_BAD_REQUEST)
+        dates = {}
+        for param in ('start_date', 'end_date'):
+            value = params.get(param, '')
+            try:
+                dates[param] = parse_date(value)
+            except ValueError:
+                dates[param] = None
+            if value and dates[param] is None:
+                return Response({'error': f'{param} must be a date (YYYY-MM-DD)'},
+                              status=status.HTTP_400_BAD_REQUEST)
+
+        checkpoint = RollupCheckpoint.objects.filter(pk=1).first()
+        return Response({
+            'as_of': checkpoint.updated_at if checkpoint else None,
+            'results': rollups.get_stats(
+                group_by, dates['start_date'], dates['end_date'], params.get('type')
+            ),
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk(self, request):
+        """
+        Sends one notification to many users in a handful of statements.
+
+        Recipients are given either as a ``recipients`` ID list or as a
+        ``recipient_query``; users whose preferences exclude the type are
+        skipped.
+        """
+        serializer = BulkNotificationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        users = fanout.resolve_recipients(
+            data.get('recipients'), data.get('recipient_query')
         )
-        return notification
+        created = fanout.fan_out(
+            users,
+            data['notification_type'],
+            data['title'],
+            data['message'],
+            data['priority']
+        )
+        return Response({'created': created}, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def broadcast(self, request):
+        """
+        Announces something to every subscriber of a notification type with
+        a single stored row and a single real-time send.
+        """
+        serializer = AnnouncementSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        announcement = fanout.announce(**serializer.validated_data)
+        return Response(
+            AnnouncementSerializer(announcement).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=False, methods=['get'])
+    def announcements(self, request):
+        """
+        Returns the newest announcements of the user's subscribed types,
+        only those after announcement ID ``since`` when it is given.
+        """
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            return Response({'error': 'since must be an integer'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        announcements = Announcement.objects.filter(
+            notification_type_id__in=fanout.subscribed_type_ids(request.user.id),
+            id__gt=since
+        )[:settings.NOTIFICATIONS_PAGE_SIZE]
+        return Response(AnnouncementSerializer(announcements, many=True).data)
+
+    # Counters, inbox cache, change log and delivery are kept in step by the
+    # receivers in notifications.lifecycle, in the same transaction
+
+    def perform_create(self, serializer):
+        # request.user is rebuilt from the token's authorization fields
+        # only; the recipient's email and the rest are read from the row
+        recipient = User.objects.get(pk=self.request.user.pk)
+        with transaction.atomic():
+            return serializer.save(recipient=recipient)
 
     def perform_update(self, serializer):
-        notification = serializer.save()
-        # Invalidate cache for the user
-        cache.delete(f'user_notifications_{notification.recipient.id}')
-        return notification
+        with transaction.atomic():
+            return serializer.save()
 
     def perform_destroy(self, instance):
-        recipient = instance.recipient
-        instance.delete()
-        # Invalidate cache for the user
-        cache.delete(f'user_notifications_{recipient.id}')
+        with transaction.atomic():
+            instance.delete()
 
-class UserPreferencesViewSet(viewsets.ViewSet):
+class UserPreferencesViewSet(AsyncViewSetMixin, viewsets.ViewSet):
     """
     ViewSet for managing user notification preferences.
     """
     permission_classes = [IsAuthenticated]
     
-    def retrieve(self, request):
-        preferences, _ = UserPreferences.objects.get_or_create(
+    async def list(self, request):
+        """
+        Returns the user's preferences, or 304 when ``If-None-Match`` holds
+        the current preferences ETag.
+        """
+        etag = etags.make_etag(
+            request, 'preferences', request.user.id,
+            await etags.aget_preferences_version(request.user.id)
+        )
+        if etags.etag_matches(request, etag):
+            return etags.not_modified(etag)
+
+        preferences, created = await UserPreferences.objects.select_related(
+            'user'
+        ).prefetch_related('enabled_types').aget_or_create(
             user=request.user,
             defaults={
                 'email_notifications': True,
-                'push_notifications': True
+                'push_notifications': push_enabled_by_default()
             }
         )
-        return Response(UserPreferencesSerializer(preferences).data)
+        serializer = UserPreferencesSerializer(preferences)
+        # Fetched rows come with their types; a new row would query for them
+        if created:
+            data = await sync_to_async(lambda: serializer.data)()
+        else:
+            data = serializer.data
+        response = Response(data)
+        response['ETag'] = etag
+        return response
 
     def create(self, request):
-        preferences, _ = UserPreferences.objects.get_or_create(
-            user=request.user
-        )
-        
-        # Update preferences
-        preferences.email_notifications = request.data.get(
-            'email_notifications', preferences.email_notifications
-        )
-        preferences.push_notifications = request.data.get(
-            'push_notifications', preferences.push_notifications
-        )
-        
-        # Update notification types
-        notification_types = request.data.get('notification_types', [])
-        if notification_types:
-            preferences.enabled_types.set(NotificationType.objects.filter(id__in=notification_types))
-        
-        preferences.save()
+        with transaction.atomic():
+            preferences, _ = UserPreferences.objects.get_or_create(
+                user=request.user
+            )
+
+            # Update preferences
+            preferences.email_notifications = request.data.get(
+                'email_notifications', preferences.email_notifications
+            )
+            preferences.push_notifications = request.data.get(
+                'push_notifications', preferences.push_notifications
+            )
+
+            # Update notification types, moving open connections to the new topics
+            notification_types = request.data.get('notification_types', [])
+            if notification_types:
+                preferences.enabled_types.set(NotificationType.objects.filter(id__in=notification_types))
+                delivery.subscriptions_changed(
+                    request.user.id, fanout.subscribed_type_ids(request.user.id)
+                )
+
+            preferences.save()
+            etags.bump_preferences_version(request.user.id)
         return Response(UserPreferencesSerializer(preferences).data)
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def obtain_token_pair(request):
+    """
+    Exchanges a username and password for a signed access and refresh token.
+    """
+    serializer = AuthTokenSerializer(data=request.data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    return Response(tokens.issue_pair(serializer.validated_data['user']))
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def refresh_token_pair(request):
+    """
+    Exchanges a refresh token for a new pair; each refresh token works once.
+    """
+    try:
+        return Response(tokens.refresh(request.data.get('refresh', '')))
+    except tokens.InvalidToken:
+        return Response({'error': 'Invalid or expired refresh token'},
+                      status=status.HTTP_401_UNAUTHORIZED)
+
+@api_view(['POST'])
+def revoke_token(request):
+    """
+    Revokes the given access or refresh token of the current user, or every
+    signed token of the user when ``all`` is true.
+    """
+    if request.data.get('all'):
+        tokens.revoke_user(request.user.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    try:
+        tokens.revoke_token(request.data.get('token', ''), request.user.id)
+    except tokens.InvalidToken:
+        return Response({'error': 'Invalid token'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(status=status.HTTP_204_NO_CONTENT)
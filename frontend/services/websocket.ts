@@ -2,12 +2,18 @@ class NotificationWebSocket {
     private socket: WebSocket | null = null;
     private reconnectAttempts = 0;
     private maxReconnectAttempts = 5;
+    // ID of the last event received; sent on reconnect so the server replays the gap
+    private lastEventId: number | null = null;
 
     connect() {
         const token = localStorage.getItem('token');
         if (!token) return;
 
-        this.socket = new WebSocket(`ws://localhost:8000/ws/notifications/?token=${token}`);
+        let url = `ws://localhost:8000/ws/notifications/?token=${token}`;
+        if (this.lastEventId !== null) {
+            url += `&last_event_id=${this.lastEventId}`;
+        }
+        this.socket = new WebSocket(url);
 
         this.socket.onopen = () => {
             console.log('WebSocket connected');
@@ -15,8 +21,28 @@ class NotificationWebSocket {
         };
 
         this.socket.onmessage = (event) => {
-            const notification = JSON.parse(event.data);
-            this.handleNotification(notification);
+            const message = JSON.parse(event.data);
+            switch (message.type) {
+                case 'notification':
+                    this.trackEventId(message.event_id);
+                    this.handleNotification(message.notification);
+                    break;
+                case 'notifications_batch':
+                    this.trackEventId(message.last_event_id);
+                    message.notifications.forEach((notification: any) => this.handleNotification(notification));
+                    break;
+                case 'announcement':
+                    // Broadcast to everyone subscribed to its type
+                    this.handleNotification(message.announcement);
+                    break;
+                case 'resync':
+                    // Missed events are no longer buffered; reload the inbox
+                    this.lastEventId = null;
+                    this.handleResync();
+                    break;
+                default:
+                    this.handleNotification(message);
+            }
         };
 
         this.socket.onclose = () => {
@@ -44,6 +70,17 @@ class NotificationWebSocket {
         }
     }
 
+    private trackEventId(eventId?: number) {
+        if (typeof eventId === 'number') {
+            this.lastEventId = eventId;
+        }
+    }
+
+    private handleResync() {
+        // Implement inbox reload
+        console.log('Notification stream out of sync, reloading inbox');
+    }
+
     private handleNotification(notification: any) {
         // Implement notification handling
         console.log('New notification:', notification);